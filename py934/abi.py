@@ -0,0 +1,135 @@
+from typing import List
+
+from eth_utils import function_signature_to_4byte_selector
+
+from py934.mimblewimble import Transaction
+
+WORD_SIZE = 32
+SELECTOR_SIZE = 4
+# fee, metadata, (tag, root, proof) * 2, (output, range proof) * 2, sig salt, mimblewimble proof
+MW_TX_WORDS = 52
+PROOF_WORDS = 8
+ROLL_UP_SIZES = (1, 2, 4)
+OPTIMISTIC_ROLL_UP_SIZES = (4, 8, 16, 32)
+
+ROLL_UP_SELECTORS = {
+    qty: function_signature_to_4byte_selector(
+        'rollUp{}Mimblewimble(address,uint256,uint256,uint256[52][{}],uint256[8])'.format(qty, qty))
+    for qty in ROLL_UP_SIZES
+}
+OPTIMISTIC_ROLL_UP_SELECTOR = function_signature_to_4byte_selector(
+    'optimisticRollUpMimblewimble(address,uint256,uint256,uint256[52][],uint256[8])')
+
+_EMPTY_PROOF = [0] * PROOF_WORDS
+
+
+def proof_words(proof: dict) -> List[int]:
+    """
+    Flattens a ZoKrates proof.json into the uint[8] of the contract: a, b[0], b[1], c.
+    """
+    proof = proof['proof']
+    return [int(value, 16) for value in [*proof['a'], *proof['b'][0], *proof['b'][1], *proof['c']]]
+
+
+def mw_tx_words(tx: Transaction) -> List[int]:
+    """
+    Returns the uint[52] which `toMimblewimbleTx()` of Ethereum934.sol unpacks.
+    """
+    words = [int(tx.kernel.fee), int(tx.kernel.metadata)]
+    for tag, inclusion_proof in zip(tx.body.hh_input_tags, tx.inclusion_proofs):
+        if inclusion_proof is None:
+            # Dummy tag or coinbase does not have an inclusion proof
+            words += [int(tag), 1, *_EMPTY_PROOF]
+        else:
+            words += [int(tag), int(inclusion_proof['inputs'][0], 16), *proof_words(inclusion_proof)]
+    for output, range_proof in zip(tx.body.hh_outputs, tx.range_proofs):
+        words += [output.x.n, output.y.n, *proof_words(range_proof)]
+    sig_salt = tx.kernel.signature.R
+    words += [sig_salt.x.n, sig_salt.y.n, *proof_words(tx.mimblewimble_proof)]
+    assert len(words) == MW_TX_WORDS
+    return words
+
+
+def write_words(buffer: bytearray, offset: int, words: List[int]) -> int:
+    for word in words:
+        buffer[offset:offset + WORD_SIZE] = word.to_bytes(WORD_SIZE, 'big')
+        offset += WORD_SIZE
+    return offset
+
+
+def write_mw_txs(buffer: bytearray, offset: int, transactions: List[Transaction]) -> int:
+    for tx in transactions:
+        offset = write_words(buffer, offset, mw_tx_words(tx))
+    return offset
+
+
+def encode_mw_txs(transactions: List[Transaction]) -> bytes:
+    """
+    ABI encoding of uint[52][n] for the given transactions.
+    """
+    buffer = bytearray(len(transactions) * MW_TX_WORDS * WORD_SIZE)
+    write_mw_txs(buffer, 0, transactions)
+    return bytes(buffer)
+
+
+def roll_up_calldata_size(qty: int) -> int:
+    # selector | erc20 | root | new root | uint[52][qty] | uint[8]
+    return SELECTOR_SIZE + (3 + qty * MW_TX_WORDS + PROOF_WORDS) * WORD_SIZE
+
+
+def optimistic_roll_up_calldata_size(qty: int) -> int:
+    # selector | erc20 | root | new root | offset | uint[8] | length | uint[52][qty]
+    return SELECTOR_SIZE + (4 + PROOF_WORDS + 1 + qty * MW_TX_WORDS) * WORD_SIZE
+
+
+def _prepare_buffer(buffer: bytearray, size: int) -> bytearray:
+    if buffer is None:
+        return bytearray(size)
+    assert len(buffer) >= size, "Buffer should be larger than {} bytes".format(size)
+    return buffer
+
+
+def encode_roll_up(erc20: str,
+                   root: int,
+                   new_root: int,
+                   transactions: List[Transaction],
+                   roll_up_proof: dict,
+                   buffer: bytearray = None) -> memoryview:
+    """
+    Calldata of rollUp1Mimblewimble, rollUp2Mimblewimble or rollUp4Mimblewimble by the number of transactions.
+    When a buffer is given, the calldata is written into it and the returned memoryview refers to the buffer.
+    """
+    qty = len(transactions)
+    assert qty in ROLL_UP_SIZES, "Unsupported scale: {}".format(qty)
+    size = roll_up_calldata_size(qty)
+    buffer = _prepare_buffer(buffer, size)
+    buffer[0:SELECTOR_SIZE] = ROLL_UP_SELECTORS[qty]
+    offset = write_words(buffer, SELECTOR_SIZE, [int(erc20, 16), int(root), int(new_root)])
+    offset = write_mw_txs(buffer, offset, transactions)
+    offset = write_words(buffer, offset, proof_words(roll_up_proof))
+    assert offset == size
+    return memoryview(buffer)[:size]
+
+
+def encode_optimistic_roll_up(erc20: str,
+                              root: int,
+                              new_root: int,
+                              transactions: List[Transaction],
+                              roll_up_proof: dict,
+                              buffer: bytearray = None) -> memoryview:
+    """
+    Calldata of optimisticRollUpMimblewimble. uint[52][] is dynamic, so its data comes after the roll up proof.
+    """
+    qty = len(transactions)
+    assert qty in OPTIMISTIC_ROLL_UP_SIZES, "Unsupported scale: {}".format(qty)
+    size = optimistic_roll_up_calldata_size(qty)
+    buffer = _prepare_buffer(buffer, size)
+    buffer[0:SELECTOR_SIZE] = OPTIMISTIC_ROLL_UP_SELECTOR
+    # Offset of the dynamic array from the start of the arguments
+    array_offset = (4 + PROOF_WORDS) * WORD_SIZE
+    offset = write_words(buffer, SELECTOR_SIZE, [int(erc20, 16), int(root), int(new_root), array_offset])
+    offset = write_words(buffer, offset, proof_words(roll_up_proof))
+    offset = write_words(buffer, offset, [qty])
+    offset = write_mw_txs(buffer, offset, transactions)
+    assert offset == size
+    return memoryview(buffer)[:size]
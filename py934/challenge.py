@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from typing import List, Tuple
+
+from ethsnarks.jubjub import Point
+from ethsnarks.pedersen import pedersen_hash_basepoint
+
+from py934.jubjub import Field, to_etec, etec_add, etec_double, etec_neg, etec_infinity, from_etec
+
+# 4 field elements of 254 bits: metadata | fee | sig salt (y) | excess (y)
+CHALLENGE_BITS = 254 * 4
+# Pedersen hash uses 3 bit windows, and the last window has only 2 bits
+CHALLENGE_WINDOWS = (CHALLENGE_BITS + 2) // 3
+# Theorem 5.4.1 of the ZCash Sapling specification: a new base point for every 62 windows
+WINDOWS_PER_SEGMENT = 62
+
+
+def _reversed_bits(value: int, length=254) -> int:
+    return int(format(value, '0{}b'.format(length))[::-1], 2)
+
+
+class ChallengeHasher:
+    """
+    Pedersen hasher for the Ethereum934 transaction challenge.
+
+    It gives the same result with `pedersen_hash_bits(b'Ethereum934', bits)` where the bits are the reversed
+    concatenation of metadata, fee, sig salt and excess. The base points and the window lookup table are derived
+    only once, and the hashed challenges are cached by (excess, sig salt, fee, metadata).
+    """
+
+    def __init__(self, name=b'Ethereum934', cache_size=4096):
+        self.name = name
+        self.cache_size = cache_size
+        self._table = None
+        self._cache = OrderedDict()
+
+    @property
+    def table(self) -> List[List[tuple]]:
+        if self._table is None:
+            table = []
+            current = None
+            for j in range(CHALLENGE_WINDOWS):
+                if j % WINDOWS_PER_SEGMENT == 0:
+                    current = to_etec(pedersen_hash_basepoint(self.name, j // WINDOWS_PER_SEGMENT).as_point())
+                else:
+                    current = etec_double(etec_double(etec_double(etec_double(current))))
+                # Window value w: (w & 0b11) + 1 times the base point, negated when the 3rd bit is set
+                double = etec_double(current)
+                row = [current, double, etec_add(current, double), etec_double(double)]
+                table.append(row + [etec_neg(point) for point in row])
+            self._table = table
+        return self._table
+
+    @staticmethod
+    def pack(hh_excess: Point, hh_sig_salt: Point, fee: Field, metadata: Field) -> int:
+        # Circuit uses big-endian while the windows are read from the least significant bit
+        return _reversed_bits(hh_excess.y.n) | \
+               _reversed_bits(hh_sig_salt.y.n) << 254 | \
+               _reversed_bits(int(fee)) << 508 | \
+               _reversed_bits(int(metadata)) << 762
+
+    def hash_packed(self, packed: int) -> Field:
+        assert 0 <= packed < (1 << CHALLENGE_BITS)
+        table = self.table
+        result = etec_infinity()
+        for j in range(CHALLENGE_WINDOWS):
+            result = etec_add(result, table[j][packed & 0b111])
+            packed >>= 3
+        return Field(from_etec(result).y.n)
+
+    def challenge(self, hh_excess: Point, hh_sig_salt: Point, fee: Field, metadata: Field) -> Field:
+        key = (hh_excess.y.n, hh_sig_salt.y.n, int(fee), int(metadata))
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        hashed = self.hash_packed(ChallengeHasher.pack(hh_excess, hh_sig_salt, fee, metadata))
+        self._cache[key] = hashed
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return hashed
+
+    def challenges(self, items: List[Tuple[Point, Point, Field, Field]]) -> List[Field]:
+        return [self.challenge(*item) for item in items]
+
+    def kernel_challenges(self, kernels) -> List[Field]:
+        return self.challenges([(k.hh_excess, k.signature.R, k.fee, k.metadata) for k in kernels])
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
+challenge_hasher = ChallengeHasher()
@@ -0,0 +1,154 @@
+from functools import partial
+from typing import List
+
+from ethsnarks.field import FQ
+from ethsnarks.jubjub import Point
+
+from py934.jubjub import decompress_point
+
+# Wire format version and the kinds of the encoded objects
+VERSION = 1
+KIND_TRANSACTION = 1
+KIND_KERNEL = 2
+KIND_BODY = 3
+KIND_REQUEST = 4
+KIND_RESPONSE = 5
+KIND_REQUEST_BATCH = 6
+KIND_RESPONSE_BATCH = 7
+KIND_WALLET = 8
+KIND_MMR = 9
+KIND_TAGS = 10
+
+SCALAR_SIZE = 32
+POINT_SIZE = 32
+# Groth16 proof: a (G1), b (G2), c (G1) = 8 field elements
+PROOF_SIZE = 8 * SCALAR_SIZE
+
+
+def to_hex(value) -> str:
+    return format(int(value), "#066x")
+
+
+def encode_scalar(value) -> bytes:
+    return int(value).to_bytes(SCALAR_SIZE, 'little')
+
+
+def decode_scalar(data) -> int:
+    return int.from_bytes(data, 'little')
+
+
+def encode_point(point: Point) -> bytes:
+    return point.compress()
+
+
+def decode_point(data) -> Point:
+    return decompress_point(data)
+
+
+def compressed_y(data) -> int:
+    # y coordinate of a compressed point without decompression
+    return int.from_bytes(data, 'little') & ((1 << 255) - 1)
+
+
+def encode_proof(proof: dict) -> bytes:
+    """
+    Encodes only the Groth16 proof of the ZoKrates proof.json. Public inputs are not encoded.
+    """
+    proof = proof['proof']
+    values = [*proof['a'], *proof['b'][0], *proof['b'][1], *proof['c']]
+    assert len(values) == 8
+    return b''.join(encode_scalar(int(value, 16)) for value in values)
+
+
+def decode_proof(data, inputs: List) -> dict:
+    assert len(data) == PROOF_SIZE
+    values = [to_hex(decode_scalar(data[i:i + SCALAR_SIZE])) for i in range(0, PROOF_SIZE, SCALAR_SIZE)]
+    return {
+        "proof": {
+            "a": values[0:2],
+            "b": [values[2:4], values[4:6]],
+            "c": values[6:8]
+        },
+        "inputs": [to_hex(value) for value in inputs]
+    }
+
+
+def encode_header(kind: int) -> bytes:
+    return bytes([VERSION, kind])
+
+
+def encode_batch(kind: int, encoded: List[bytes]) -> bytes:
+    # header(2) | number of items(4) | items
+    return encode_header(kind) + len(encoded).to_bytes(4, 'little') + b''.join(encoded)
+
+
+class Reader:
+    """
+    Reads the encoded data through memoryview slices without copying.
+    """
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def read(self, size) -> memoryview:
+        assert self.offset + size <= len(self.view), "Unexpected end of data"
+        sliced = self.view[self.offset:self.offset + size]
+        self.offset += size
+        return sliced
+
+    def read_byte(self) -> int:
+        return self.read(1)[0]
+
+    def read_scalar(self) -> int:
+        return decode_scalar(self.read(SCALAR_SIZE))
+
+    def read_header(self, kind: int):
+        version, read_kind = self.read_byte(), self.read_byte()
+        assert version == VERSION, "Unsupported version: {}".format(version)
+        assert read_kind == kind, "Expected kind {} but got {}".format(kind, read_kind)
+
+    def read_batch_header(self, kind: int) -> int:
+        self.read_header(kind)
+        return int.from_bytes(self.read(4), 'little')
+
+    def finish(self):
+        assert self.offset == len(self.view), "{} bytes are left".format(len(self.view) - self.offset)
+
+
+class LazyDecoded:
+    """
+    Attributes registered with `lazy()` are decoded on their first access.
+    """
+
+    def __getattr__(self, name):
+        lazy = self.__dict__.get('_lazy')
+        if lazy is not None and name in lazy:
+            value = lazy.pop(name)()
+            setattr(self, name, value)
+            return value
+        raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+    def __getstate__(self):
+        # Memoryviews can't be pickled, so decode everything first
+        for name in list(self.__dict__.get('_lazy', {})):
+            getattr(self, name)
+        state = dict(self.__dict__)
+        state.pop('_lazy', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def lazy(self, name, decoder, *args):
+        if '_lazy' not in self.__dict__:
+            self._lazy = {}
+        self._lazy[name] = partial(decoder, *args)
+
+
+def point_to_hex(point: Point) -> List[str]:
+    return [to_hex(point.x), to_hex(point.y)]
+
+
+def point_from_hex(values: List[str]) -> Point:
+    return Point(FQ(int(values[0], 16)), FQ(int(values[1], 16)))
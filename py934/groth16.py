@@ -0,0 +1,165 @@
+import os
+import re
+import secrets
+from typing import List, Dict, Tuple
+
+from py_ecc.optimized_bn128 import FQ, FQ2, FQ12, Z1, add, multiply, neg, is_inf, is_on_curve, b, b2, curve_order, \
+    field_modulus
+from py_ecc.optimized_bn128.optimized_pairing import pairing, final_exponentiate
+
+GENERATED_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'contracts', 'generated')
+CIRCUITS = ('Deposit', 'RangeProof', 'MMRInclusion', 'Mimblewimble', 'Withdraw',
+            'RollUp1', 'RollUp2', 'RollUp4', 'RollUp8', 'RollUp16', 'RollUp32', 'RollUp64', 'RollUp128')
+
+_G1_PATTERN = r'Pairing\.G1Point\(uint256\((0x[0-9a-f]+)\), uint256\((0x[0-9a-f]+)\)\)'
+_G2_PATTERN = r'Pairing\.G2Point\(\[uint256\((0x[0-9a-f]+)\), uint256\((0x[0-9a-f]+)\)\], ' \
+              r'\[uint256\((0x[0-9a-f]+)\), uint256\((0x[0-9a-f]+)\)\]\)'
+
+
+def _int(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def g1(x, y) -> tuple:
+    point = (FQ(_int(x)), FQ(_int(y)), FQ.one())
+    assert _int(x) < field_modulus and _int(y) < field_modulus and is_on_curve(point, b), "Invalid G1 point"
+    return point
+
+
+def g2(x, y) -> tuple:
+    # The verifier contracts and ZoKrates put the imaginary part of FQ2 first
+    x_imag, x_real, y_imag, y_real = [_int(value) for value in (*x, *y)]
+    point = (FQ2([x_real, x_imag]), FQ2([y_real, y_imag]), FQ2.one())
+    assert all(value < field_modulus for value in (x_imag, x_real, y_imag, y_real)) and is_on_curve(point, b2), \
+        "Invalid G2 point"
+    # Unlike G1, the twist has points out of the prime order subgroup
+    assert is_inf(multiply(point, curve_order)), "G2 point is not in the subgroup"
+    return point
+
+
+class VerifyingKey:
+    def __init__(self, alpha: tuple, beta: tuple, gamma: tuple, delta: tuple, gamma_abc: List[tuple]):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.delta = delta
+        self.gamma_abc = gamma_abc
+
+    @classmethod
+    def from_solidity(cls, source: str) -> 'VerifyingKey':
+        """
+        Reads `verifyingKey()` of a verifier contract generated by ZoKrates.
+        """
+        def point(name):
+            g2_match = re.search(r'vk\.{} = {}'.format(name, _G2_PATTERN), source)
+            if g2_match:
+                values = g2_match.groups()
+                return g2(values[0:2], values[2:4])
+            return g1(*re.search(r'vk\.{} = {}'.format(name, _G1_PATTERN), source).groups())
+
+        size = int(re.search(r'vk\.gamma_abc = new Pairing\.G1Point\[\]\((\d+)\)', source).group(1))
+        return cls(point('a'), point('b'), point('gamma'), point('delta'),
+                   [point(r'gamma_abc\[{}\]'.format(i)) for i in range(size)])
+
+    def vk_x(self, inputs: List[int], weight=1) -> tuple:
+        """
+        weight * gamma_abc[0] + sum(inputs[i] * gamma_abc[i + 1])
+        """
+        assert len(inputs) + 1 == len(self.gamma_abc), "Wrong number of inputs"
+        vk_x = multiply(self.gamma_abc[0], weight)
+        for point, value in zip(self.gamma_abc[1:], inputs):
+            vk_x = add(vk_x, multiply(point, value))
+        return vk_x
+
+
+_verifying_keys: Dict[Tuple[str, str], VerifyingKey] = {}
+
+
+def verifying_key(circuit: str, path=GENERATED_PATH) -> VerifyingKey:
+    vk = _verifying_keys.get((path, circuit))
+    if vk is None:
+        with open(os.path.join(path, '{}Verifier.sol'.format(circuit))) as f:
+            vk = _verifying_keys[(path, circuit)] = VerifyingKey.from_solidity(f.read())
+    return vk
+
+
+def parse_proof(proof: dict) -> Tuple[tuple, tuple, tuple, List[int]]:
+    """
+    (A, B, C, inputs) of a proof.json of ZoKrates
+    """
+    inputs = [_int(value) for value in proof['inputs']]
+    assert all(value < curve_order for value in inputs), "Input is not in the scalar field"
+    return g1(*proof['proof']['a']), g2(*proof['proof']['b']), g1(*proof['proof']['c']), inputs
+
+
+class BatchVerifier:
+    """
+    Verifies many Groth16 proofs with one product of Miller loops and one final exponentiation.
+
+    Each proof satisfies e(A, B) = e(alpha, beta) * e(vk_x, gamma) * e(C, delta). With random weights z_i,
+        prod(e(z_i * A_i, B_i)) * e(-sum(z_i) * alpha, beta) * e(-sum(z_i * vk_x_i), gamma) * e(-sum(z_i * C_i), delta)
+    is 1 for valid proofs, and the last 3 pairings are shared by the proofs of the same circuit. sum(z_i * vk_x_i) is
+    computed from the weighted sums of the inputs, so it costs one vk_x. Proofs of different circuits are in the same
+    product, so a batch of range and inclusion proofs costs n + 3 * circuits Miller loops.
+    """
+
+    def __init__(self, path=GENERATED_PATH):
+        self.path = path
+        self._proofs: List[Tuple[str, dict]] = []
+
+    def __len__(self):
+        return len(self._proofs)
+
+    def add(self, circuit: str, proof: dict):
+        self._proofs.append((circuit, proof))
+
+    def _check(self, proofs: List[Tuple[str, dict]]) -> bool:
+        miller_loops = []
+        shared = {}  # circuit => [sum(z), sum(z * inputs), sum(z * C)]
+        for circuit, proof in proofs:
+            vk = verifying_key(circuit, self.path)
+            try:
+                a, b_, c, inputs = parse_proof(proof)
+            except (AssertionError, ValueError, KeyError):
+                return False
+            if len(inputs) + 1 != len(vk.gamma_abc):
+                return False
+            z = secrets.randbits(128) if len(proofs) > 1 else 1
+            miller_loops.append((b_, multiply(a, z)))
+            sums = shared.setdefault(circuit, [0, [0] * len(inputs), Z1])
+            sums[0] += z
+            sums[1] = [(total + z * value) % curve_order for total, value in zip(sums[1], inputs)]
+            sums[2] = add(sums[2], multiply(c, z))
+        for circuit, (weight, inputs, c) in shared.items():
+            vk = verifying_key(circuit, self.path)
+            miller_loops += [(vk.beta, neg(multiply(vk.alpha, weight % curve_order))),
+                             (vk.gamma, neg(vk.vk_x(inputs, weight % curve_order))),
+                             (vk.delta, neg(c))]
+        result = FQ12.one()
+        for q, p in miller_loops:
+            result = result * pairing(q, p, final_exponentiate=False)
+        return final_exponentiate(result) == FQ12.one()
+
+    def verify(self) -> List[bool]:
+        """
+        Returns the verdict of each added proof. When the batch fails, it checks each proof to find the bad ones.
+        """
+        proofs, self._proofs = self._proofs, []
+        if len(proofs) == 0:
+            return []
+        if self._check(proofs):
+            return [True] * len(proofs)
+        if len(proofs) == 1:
+            return [False]
+        return [self._check([proof]) for proof in proofs]
+
+
+def verify_proof(circuit: str, proof: dict, path=GENERATED_PATH) -> bool:
+    return verify_proofs(circuit, [proof], path) == [True]
+
+
+def verify_proofs(circuit: str, proofs: List[dict], path=GENERATED_PATH) -> List[bool]:
+    verifier = BatchVerifier(path)
+    for proof in proofs:
+        verifier.add(circuit, proof)
+    return verifier.verify()
@@ -0,0 +1,197 @@
+import json
+import os
+from typing import Dict, List, Tuple
+
+from eth_utils import keccak
+from ethsnarks.jubjub import Point
+
+from py934.abi import MW_TX_WORDS, SELECTOR_SIZE, WORD_SIZE, PROOF_WORDS
+from py934.codec import point_to_hex, point_from_hex, to_hex
+from py934.mmr import PedersenMMR
+from py934.tags import SpentTagStore
+
+try:
+    from eth_abi import decode_abi
+except ImportError:
+    # eth_abi >= 2.0 renamed decode_abi to decode
+    from eth_abi import decode as decode_abi
+
+ROLL_UP_TOPIC = keccak(text='RollUp(address,uint256,uint256,uint256)')
+OPTIMISTIC_ROLL_UP_TOPIC = keccak(text='OptimisticRollUp(bytes32,address,uint256,uint256,uint256)')
+MIMBLEWIMBLE_TOPIC = keccak(text='Mimblewimble(address,uint256)')
+
+# Word offsets of the outputs and the tags in the uint[52] of a Mimblewimble tx
+OUTPUT_OFFSETS = (22, 32)
+TAG_OFFSETS = (2, 12)
+DUMMY_TAG = 1
+
+
+def _to_bytes(value) -> bytes:
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    return bytes(value)
+
+
+def _erc20_key(address: str) -> int:
+    return int(address, 16)
+
+
+def _optimistic_mw_txs(calldata) -> list:
+    _, _, _, mw_txs, _ = decode_abi(['address', 'uint256', 'uint256', 'uint256[52][]', 'uint256[8]'],
+                                    _to_bytes(calldata)[SELECTOR_SIZE:])
+    assert all(len(mw_tx) == MW_TX_WORDS for mw_tx in mw_txs)
+    return mw_txs
+
+
+def _roll_up_mw_txs(calldata) -> list:
+    data = _to_bytes(calldata)[SELECTOR_SIZE:]
+    qty = (len(data) // WORD_SIZE - 3 - PROOF_WORDS) // MW_TX_WORDS
+    _, _, _, mw_txs, _ = decode_abi(['address', 'uint256', 'uint256', 'uint256[52][{}]'.format(qty), 'uint256[8]'],
+                                    data)
+    return mw_txs
+
+
+def _outputs(mw_txs) -> List[Point]:
+    return [point_from_hex([to_hex(mw_tx[i]), to_hex(mw_tx[i + 1])]) for mw_tx in mw_txs for i in OUTPUT_OFFSETS]
+
+
+def optimistic_roll_up_outputs(calldata) -> List[Point]:
+    """
+    Reads the outputs from the calldata of optimisticRollUpMimblewimble, because it does not emit Mimblewimble events.
+    """
+    return _outputs(_optimistic_mw_txs(calldata))
+
+
+def roll_up_outputs(calldata) -> List[Point]:
+    """
+    Reads the outputs from the calldata of rollUp1/2/4Mimblewimble, because the Mimblewimble events only have their
+    y coordinates.
+    """
+    return _outputs(_roll_up_mw_txs(calldata))
+
+
+def optimistic_roll_up_tags(calldata) -> List[int]:
+    # optimisticRollUpMimblewimble only marks the first tag of each tx as Spending
+    return [mw_tx[TAG_OFFSETS[0]] for mw_tx in _optimistic_mw_txs(calldata)]
+
+
+def roll_up_tags(calldata) -> List[int]:
+    """
+    Spent tags in the calldata of rollUp1/2/4Mimblewimble. Dummy tags are skipped like verifyMimblewimbleTx does.
+    """
+    return [mw_tx[i] for mw_tx in _roll_up_mw_txs(calldata) for i in TAG_OFFSETS if mw_tx[i] != DUMMY_TAG]
+
+
+class ChainIndexer:
+    """
+    Follows the Ethereum934 contract events and rebuilds the MMR of every ERC20 pool.
+
+    `Mimblewimble(erc20, txo)` only has the y coordinate of an output, so the outputs are read from the calldata of
+    the roll up and checked against the events. Every rebuilt root is checked against the `RollUp` event.
+
+    With a SpentTagStore, the tags in the roll up calldata are marked Spending and Spent like ERC20Pool.tags.
+    """
+
+    def __init__(self, web3, address: str, checkpoint_path=None, batch_size=10000, bits=16, tags: SpentTagStore = None):
+        self.web3 = web3
+        self.address = address
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.bits = bits
+        self.block = -1  # Last processed block
+        self.pools: Dict[int, PedersenMMR] = {}
+        self._pending: Dict[int, List[int]] = {}  # erc20 => y coordinates of the outputs waiting for a RollUp
+        self._optimistic: Dict[Tuple[int, int, int], List[Point]] = {}  # (erc20, root, new root) => outputs
+        self._spending: Dict[Tuple[int, int, int], List[int]] = {}  # (erc20, root, new root) => spending tags
+        self.tags = tags
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            self.load_checkpoint()
+
+    def pool(self, erc20: int) -> PedersenMMR:
+        mmr = self.pools.get(erc20)
+        if mmr is None:
+            mmr = self.pools[erc20] = PedersenMMR(self.bits)
+        return mmr
+
+    def sync(self, to_block: int = None) -> int:
+        """
+        Fetches the logs in ranges of `batch_size` blocks and saves the checkpoint after each range.
+        """
+        if to_block is None:
+            to_block = self.web3.eth.blockNumber
+        while self.block < to_block:
+            from_block = self.block + 1
+            end_block = min(to_block, from_block + self.batch_size - 1)
+            logs = self.web3.eth.getLogs({'address': self.address, 'fromBlock': from_block, 'toBlock': end_block})
+            self.process_logs(logs)
+            self.block = end_block
+            if self.checkpoint_path is not None:
+                self.save_checkpoint()
+        return self.block
+
+    def process_logs(self, logs):
+        for log in sorted(logs, key=lambda log: (log['blockNumber'], log['logIndex'])):
+            topic = _to_bytes(log['topics'][0])
+            data = _to_bytes(log['data'])
+            if topic == MIMBLEWIMBLE_TOPIC:
+                erc20, txo = decode_abi(['address', 'uint256'], data)
+                self._pending.setdefault(_erc20_key(erc20), []).append(txo)
+            elif topic == ROLL_UP_TOPIC:
+                erc20, root, new_root, _ = decode_abi(['address', 'uint256', 'uint256', 'uint256'], data)
+                erc20 = _erc20_key(erc20)
+                key = (erc20, root, new_root)
+                pending = self._pending.pop(erc20, None)
+                if pending:
+                    mw_txs = _roll_up_mw_txs(self.web3.eth.getTransaction(log['transactionHash'])['input'])
+                    items = _outputs(mw_txs)
+                    assert [item.y.n for item in items] == pending, "Mimblewimble events do not match the calldata"
+                    spent = [mw_tx[i] for mw_tx in mw_txs for i in TAG_OFFSETS if mw_tx[i] != DUMMY_TAG]
+                else:
+                    # Finalized optimistic roll up
+                    items = self._optimistic.pop(key)
+                    spent = self._spending.pop(key, [])
+                self._roll_up(erc20, root, new_root, items)
+                if self.tags is not None:
+                    self.tags.mark_spent(erc20, spent)
+            elif topic == OPTIMISTIC_ROLL_UP_TOPIC:
+                _, erc20, root, new_root, _ = decode_abi(['bytes32', 'address', 'uint256', 'uint256', 'uint256'], data)
+                key = (_erc20_key(erc20), root, new_root)
+                calldata = self.web3.eth.getTransaction(log['transactionHash'])['input']
+                self._optimistic[key] = optimistic_roll_up_outputs(calldata)
+                if self.tags is not None:
+                    self._spending[key] = optimistic_roll_up_tags(calldata)
+                    self.tags.mark_spending(key[0], self._spending[key])
+
+    def _roll_up(self, erc20: int, root: int, new_root: int, items: List[Point]):
+        mmr = self.pool(erc20)
+        assert mmr.root.n == root, "Unknown root {} of {}".format(root, hex(erc20))
+        mmr.append_batch(items)
+        assert mmr.root.n == new_root, "Rebuilt root does not match with the RollUp event"
+
+    def save_checkpoint(self):
+        checkpoint = {
+            'block': self.block,
+            'pools': {to_hex(erc20): [point_to_hex(peak) for peak in mmr.peaks] for erc20, mmr in self.pools.items()},
+            'pending': {to_hex(erc20): [to_hex(y) for y in ys] for erc20, ys in self._pending.items()},
+            'optimistic': [[to_hex(erc20), to_hex(root), to_hex(new_root), [point_to_hex(item) for item in items]]
+                           for (erc20, root, new_root), items in self._optimistic.items()],
+            'spending': [[to_hex(erc20), to_hex(root), to_hex(new_root), [to_hex(tag) for tag in tags]]
+                         for (erc20, root, new_root), tags in self._spending.items()]
+        }
+        # Writes to a temporary file first, so a crash does not leave a broken checkpoint
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def load_checkpoint(self):
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        self.block = checkpoint['block']
+        self.pools = {int(erc20, 16): PedersenMMR.from_peaks(self.bits, [point_from_hex(peak) for peak in peaks])
+                      for erc20, peaks in checkpoint['pools'].items()}
+        self._pending = {int(erc20, 16): [int(y, 16) for y in ys] for erc20, ys in checkpoint['pending'].items()}
+        self._optimistic = {(int(erc20, 16), int(root, 16), int(new_root, 16)): [point_from_hex(item) for item in items]
+                            for erc20, root, new_root, items in checkpoint['optimistic']}
+        self._spending = {(int(erc20, 16), int(root, 16), int(new_root, 16)): [int(tag, 16) for tag in tags]
+                          for erc20, root, new_root, tags in checkpoint.get('spending', [])}
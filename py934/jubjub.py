@@ -1,17 +1,75 @@
+import os
 import random
-from ethsnarks.field import SNARK_SCALAR_FIELD, FR, FQ
-from ethsnarks.jubjub import Point
+from typing import List
+
+from ethsnarks.field import SNARK_SCALAR_FIELD, FR_ORDER, FR, FQ
+from ethsnarks.jubjub import Point, JUBJUB_A, JUBJUB_D, JUBJUB_L
+
+try:
+    import gmpy2
+except ImportError:
+    gmpy2 = None
+
+
+class PythonBackend:
+    name = 'python'
+
+    @staticmethod
+    def mpz(n):
+        return int(n)
+
+    @staticmethod
+    def powmod(a, e, m):
+        return pow(a, e, m)
+
+    @staticmethod
+    def invert(a, m):
+        # Only for the prime modulus
+        return pow(a, m - 2, m)
+
+
+class Gmpy2Backend:
+    name = 'gmpy2'
+
+    @staticmethod
+    def mpz(n):
+        return gmpy2.mpz(int(n))
+
+    @staticmethod
+    def powmod(a, e, m):
+        return gmpy2.powmod(a, e, m)
+
+    @staticmethod
+    def invert(a, m):
+        return gmpy2.invert(a, m)
+
+
+BACKENDS = {'python': PythonBackend}
+if gmpy2 is not None:
+    BACKENDS['gmpy2'] = Gmpy2Backend
+
+backend = None
+_Q = _A = _D = _ZERO = _ONE = None
+
+
+def set_backend(name: str):
+    """
+    Selects the big integer backend for the curve arithmetic. Both backends give the same results.
+    The default is given by PY934_BACKEND environment variable, or gmpy2 when it is installed.
+    """
+    assert name in BACKENDS, "Unavailable backend: {}".format(name)
+    global backend, _Q, _A, _D, _ZERO, _ONE
+    backend = BACKENDS[name]
+    _Q, _A, _D, _ZERO, _ONE = map(backend.mpz, [SNARK_SCALAR_FIELD, JUBJUB_A, JUBJUB_D, 0, 1])
+
+
+set_backend(os.environ.get('PY934_BACKEND', 'gmpy2' if gmpy2 is not None else 'python'))
 
 
 class Field(FR):
     def __mul__(self, other):
         if isinstance(other, Point):
-            if self.n >= SNARK_SCALAR_FIELD:
-                a = other * (SNARK_SCALAR_FIELD - 1)
-                b = other * (self.n + 1 - SNARK_SCALAR_FIELD)
-                return a + b
-            else:
-                return other * self.n
+            return scalar_mul(other, self.n)
         else:
             return Field(FR.__mul__(self, other).n)
 
@@ -44,8 +102,276 @@ class Field(FR):
         assert 0 <= start and end <= SNARK_SCALAR_FIELD
         return cls(random.randint(start, end))
 
+    @classmethod
+    def random_batch(cls, count, start=1, end=SNARK_SCALAR_FIELD):
+        """
+        Draws `count` values in [start, end) from a CSPRNG byte buffer with rejection sampling.
+        """
+        assert 0 <= start < end <= SNARK_SCALAR_FIELD
+        mask = (1 << end.bit_length()) - 1
+        values = []
+        while len(values) < count:
+            buffer = os.urandom(32 * (count - len(values)) * 2)
+            for i in range(0, len(buffer), 32):
+                value = int.from_bytes(buffer[i:i + 32], 'little') & mask
+                if start <= value < end:
+                    values.append(cls(value))
+                    if len(values) == count:
+                        break
+        return values
+
     def to_fq2(self):
         if self.n > SNARK_SCALAR_FIELD:
             return [FQ(SNARK_SCALAR_FIELD), FQ(self.n)]
         else:
             return [FQ(self.n), FQ(0)]
+
+
+# Extended twisted Edwards coordinates (X, Y, T, Z) on backend integers. See ethsnarks.jubjub.EtecPoint.
+def to_etec(point: Point) -> tuple:
+    x = backend.mpz(point.x.n)
+    y = backend.mpz(point.y.n)
+    return x, y, x * y % _Q, _ONE
+
+
+def etec_infinity() -> tuple:
+    return _ZERO, _ONE, _ZERO, _ONE
+
+
+def etec_add(p: tuple, q: tuple) -> tuple:
+    # Unified addition, "Twisted Edwards Curves Revisited" 3.1
+    x1, y1, t1, z1 = p
+    x2, y2, t2, z2 = q
+    x1x2 = x1 * x2 % _Q
+    y1y2 = y1 * y2 % _Q
+    dt1t2 = _D * t1 * t2 % _Q
+    z1z2 = z1 * z2 % _Q
+    e = ((x1 + y1) * (x2 + y2) - x1x2 - y1y2) % _Q
+    f = z1z2 - dt1t2
+    g = z1z2 + dt1t2
+    h = y1y2 - _A * x1x2
+    return e * f % _Q, g * h % _Q, e * h % _Q, f * g % _Q
+
+
+def etec_double(p: tuple) -> tuple:
+    # dbl-2008-hwcd
+    x, y, _, z = p
+    a = x * x % _Q
+    b = y * y % _Q
+    c = 2 * z * z
+    d = _A * a
+    e = ((x + y) * (x + y) - a - b) % _Q
+    g = d + b
+    f = g - c
+    h = d - b
+    return e * f % _Q, g * h % _Q, e * h % _Q, f * g % _Q
+
+
+def etec_neg(p: tuple) -> tuple:
+    x, y, t, z = p
+    return -x % _Q, y, -t % _Q, z
+
+
+def from_etec(p: tuple) -> Point:
+    inv_z = backend.invert(p[3], _Q)
+    return Point(FQ(int(p[0] * inv_z % _Q)), FQ(int(p[1] * inv_z % _Q)))
+
+
+def batch_from_etec(points: List[tuple]) -> List[Point]:
+    """
+    Converts to affine points with a single inversion (Montgomery's trick).
+    """
+    if len(points) == 0:
+        return []
+    prefix = [_ONE]
+    for p in points:
+        prefix.append(prefix[-1] * p[3] % _Q)
+    inv = backend.invert(prefix[-1], _Q)
+    result = [None] * len(points)
+    for i in reversed(range(len(points))):
+        inv_z = prefix[i] * inv % _Q
+        inv = inv * points[i][3] % _Q
+        result[i] = Point(FQ(int(points[i][0] * inv_z % _Q)), FQ(int(points[i][1] * inv_z % _Q)))
+    return result
+
+
+def etec_mul(p: tuple, scalar: int, window=4) -> tuple:
+    table = [etec_infinity(), p]
+    for _ in range((1 << window) - 2):
+        table.append(etec_add(table[-1], p))
+    mask = (1 << window) - 1
+    result = etec_infinity()
+    for offset in reversed(range(0, scalar.bit_length(), window)):
+        for _ in range(window):
+            result = etec_double(result)
+        index = (scalar >> offset) & mask
+        if index != 0:
+            result = etec_add(result, table[index])
+    return result
+
+
+def scalar_mul(point: Point, scalar) -> Point:
+    """
+    Same with `point * scalar` of ethsnarks, but runs on the selected backend.
+    """
+    scalar = int(scalar) % FR_ORDER
+    if scalar == 0:
+        return Point.infinity()
+    return from_etec(etec_mul(to_etec(point), scalar))
+
+
+class FixedBaseTable:
+    """
+    Precomputed multiples of a fixed base point, j * 2^(window * i) * P for every window i,
+    so that a scalar multiplication needs only one addition per window and no doublings.
+    """
+
+    def __init__(self, point: Point, window=6, bits=254):
+        self.point = point
+        self.window = window
+        self.bits = bits
+        self._rows = None
+
+    @property
+    def rows(self) -> List[List[tuple]]:
+        if self._rows is None:
+            rows = []
+            base = to_etec(self.point)
+            for _ in range(0, self.bits, self.window):
+                row = [etec_infinity(), base]
+                for _ in range((1 << self.window) - 2):
+                    row.append(etec_add(row[-1], base))
+                rows.append(row)
+                base = etec_add(row[-1], base)
+            self._rows = rows
+        return self._rows
+
+    def mul_etec(self, scalar) -> tuple:
+        scalar = int(scalar) % FR_ORDER
+        assert scalar.bit_length() <= self.bits
+        mask = (1 << self.window) - 1
+        result = etec_infinity()
+        for row in self.rows:
+            index = scalar & mask
+            if index != 0:
+                result = etec_add(result, row[index])
+            scalar >>= self.window
+        return result
+
+    def mul(self, scalar) -> Point:
+        return from_etec(self.mul_etec(scalar))
+
+
+# Q - 1 = 2^S * T for the Tonelli-Shanks square root
+_S = ((SNARK_SCALAR_FIELD - 1) & -(SNARK_SCALAR_FIELD - 1)).bit_length() - 1
+_T = (SNARK_SCALAR_FIELD - 1) >> _S
+_NON_RESIDUE = next(z for z in range(2, 100) if pow(z, (SNARK_SCALAR_FIELD - 1) // 2, SNARK_SCALAR_FIELD) != 1)
+
+
+def sqrt_mod_q(n) -> int:
+    n = backend.mpz(n) % _Q
+    if n == 0:
+        return 0
+    if backend.powmod(n, (_Q - 1) // 2, _Q) != 1:
+        raise ValueError("Not a quadratic residue")
+    m = _S
+    c = backend.powmod(backend.mpz(_NON_RESIDUE), _T, _Q)
+    t = backend.powmod(n, _T, _Q)
+    r = backend.powmod(n, (_T + 1) // 2, _Q)
+    while t != 1:
+        i, t2 = 0, t
+        while t2 != 1:
+            t2 = t2 * t2 % _Q
+            i += 1
+        b = backend.powmod(c, 1 << (m - i - 1), _Q)
+        m, c = i, b * b % _Q
+        t, r = t * c % _Q, r * b % _Q
+    return int(r)
+
+
+def point_from_y(y, sign=None) -> Point:
+    """
+    Same with Point.from_y() using the backend: x^2 = (y^2 - 1) / (d * y^2 - a)
+    """
+    yy = backend.mpz(y) ** 2 % _Q
+    x = sqrt_mod_q((yy - _ONE) * backend.invert((_D * yy - _A) % _Q, _Q))
+    if sign is not None:
+        if (x & 1) != sign:
+            x = (SNARK_SCALAR_FIELD - x) % SNARK_SCALAR_FIELD
+    elif x < SNARK_SCALAR_FIELD - x:
+        x = SNARK_SCALAR_FIELD - x
+    return Point(FQ(x), FQ(int(y)))
+
+
+def decompress_point(data) -> Point:
+    """
+    Same with Point.decompress() but much faster with the Tonelli-Shanks square root of the backend.
+    """
+    if len(data) != 32:
+        raise ValueError("Invalid input length for decompression")
+    y = int.from_bytes(data, 'little')
+    return point_from_y(y & ((1 << 255) - 1), y >> 255)
+
+
+def in_subgroup(point: Point) -> bool:
+    """
+    Checks l * P == infinity, i.e. P has no small order component of the cofactor 8.
+    """
+    x, y, _, z = etec_mul(to_etec(point), JUBJUB_L)
+    return x % _Q == 0 and (y - z) % _Q == 0
+
+
+def valid_points(points: List[Point]) -> bool:
+    """
+    Checks a * x^2 + y^2 == 1 + d * x^2 * y^2 for all the points.
+    """
+    for point in points:
+        xx = backend.mpz(point.x.n) ** 2 % _Q
+        yy = backend.mpz(point.y.n) ** 2 % _Q
+        if (_A * xx + yy - _ONE - _D * xx * yy) % _Q != 0:
+            return False
+    return True
+
+
+def multi_scalar_mul(scalars: List, points: List[Point]) -> Point:
+    """
+    Computes sum(scalars[i] * points[i]) with the Pippenger bucket method.
+    Scalars are reduced by the curve order, so negative scalars can be used for subtractions.
+    """
+    assert len(scalars) == len(points)
+    pairs = [(int(s) % FR_ORDER, to_etec(p)) for s, p in zip(scalars, points)]
+    pairs = [(s, p) for s, p in pairs if s != 0]
+    if len(pairs) == 0:
+        return Point.infinity()
+
+    window = min(16, max(1, len(pairs).bit_length() - 2))
+    mask = (1 << window) - 1
+    max_bits = max(s.bit_length() for s, _ in pairs)
+    result = etec_infinity()
+    for offset in reversed(range(0, max_bits, window)):
+        for _ in range(window):
+            result = etec_double(result)
+        buckets = [None] * (1 << window)
+        for s, p in pairs:
+            index = (s >> offset) & mask
+            if index != 0:
+                buckets[index] = p if buckets[index] is None else etec_add(buckets[index], p)
+        # sum(i * buckets[i]) using running sums
+        running = etec_infinity()
+        window_sum = etec_infinity()
+        for bucket in reversed(buckets[1:]):
+            if bucket is not None:
+                running = etec_add(running, bucket)
+            window_sum = etec_add(window_sum, running)
+        result = etec_add(result, window_sum)
+    return from_etec(result)
+
+
+def sum_points(points: List[Point]) -> Point:
+    """
+    Adds up the points in extended coordinates, which needs only one inversion in total.
+    """
+    result = etec_infinity()
+    for point in points:
+        result = etec_add(result, to_etec(point))
+    return from_etec(result)
@@ -0,0 +1,179 @@
+import heapq
+from itertools import count
+from typing import List, Dict, Optional
+
+from py934.mimblewimble import Transaction
+from py934.tags import SpentTagStore
+
+# Ethereum934.sol skips the tag 1 which is used for the dummy input
+DUMMY_TAG = 1
+ERC20_MASK = (1 << 160) - 1
+# Ethereum934.sol reads the expiration as uint24
+EXPIRATION_MASK = (1 << 24) - 1
+
+
+def erc20_of(metadata) -> int:
+    return int(metadata) & ERC20_MASK
+
+
+def expiration_of(metadata) -> int:
+    return (int(metadata) >> 160) & EXPIRATION_MASK
+
+
+def is_expired(metadata, block_number: int) -> bool:
+    # verifyMimblewimbleTx compares uint24(expiration) > uint24(block.number)
+    return expiration_of(metadata) <= block_number & EXPIRATION_MASK
+
+
+def spending_tags(tx: Transaction) -> List[int]:
+    return [tag.n for tag in tx.body.hh_input_tags if tag.n != DUMMY_TAG]
+
+
+class MempoolEntry:
+    __slots__ = ('tx', 'tags', 'fee', 'erc20', 'expiration', 'sequence')
+
+    def __init__(self, tx: Transaction, tags: List[int], sequence: int):
+        self.tx = tx
+        self.tags = tags
+        self.fee = int(tx.kernel.fee)
+        metadata = int(tx.kernel.metadata)
+        self.erc20 = erc20_of(metadata)
+        self.expiration = expiration_of(metadata)
+        self.sequence = sequence
+
+
+class Mempool:
+    """
+    Pending transactions which are not rolled up yet.
+
+    Every transaction is indexed by its spending tags, so a double spending is rejected by a dictionary lookup. Each
+    ERC20 pool has its own fee heap, and one heap sorts all transactions by their expiration block. Removed entries
+    stay in the heaps and are skipped when they are popped. With a SpentTagStore, tags spent on chain are rejected too.
+    """
+
+    def __init__(self, spent: SpentTagStore = None):
+        self.spent = spent
+        self._entries: Dict[int, MempoolEntry] = {}  # first spending tag => entry
+        self._tags: Dict[int, int] = {}  # spending tag => first spending tag
+        self._fee_heaps: Dict[int, list] = {}  # erc20 => [(-fee, sequence, key)]
+        self._sizes: Dict[int, int] = {}
+        self._expirations = []  # [(expiration, sequence, key)]
+        self._sequence = count()
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, tag: int):
+        return int(tag) in self._tags
+
+    def get(self, tag: int) -> Optional[Transaction]:
+        key = self._tags.get(int(tag))
+        return None if key is None else self._entries[key].tx
+
+    def size(self, erc20: int) -> int:
+        return self._sizes.get(erc20, 0)
+
+    @property
+    def erc20s(self) -> List[int]:
+        return [erc20 for erc20, size in self._sizes.items() if size]
+
+    def add(self, tx: Transaction, block_number: int = None) -> bool:
+        """
+        Returns False when the transaction spends a tag of another pending transaction or on chain, spends the same
+        tag twice, or when it is expired.
+        """
+        tags = spending_tags(tx)
+        assert len(tags) != 0, "Tx should spend at least 1 TXO"
+        if len(set(tags)) != len(tags):
+            return False
+        tag_index = self._tags
+        for tag in tags:
+            if tag in tag_index:
+                return False
+        entry = MempoolEntry(tx, tags, next(self._sequence))
+        if block_number is not None and is_expired(tx.kernel.metadata, block_number):
+            return False
+        if self.spent is not None and self.spent.any_spent(entry.erc20, tags):
+            return False
+        key = tags[0]
+        self._entries[key] = entry
+        for tag in tags:
+            tag_index[tag] = key
+        heap = self._fee_heaps.get(entry.erc20)
+        if heap is None:
+            heap = self._fee_heaps[entry.erc20] = []
+        heapq.heappush(heap, (-entry.fee, entry.sequence, key))
+        self._sizes[entry.erc20] = self._sizes.get(entry.erc20, 0) + 1
+        heapq.heappush(self._expirations, (entry.expiration, entry.sequence, key))
+        return True
+
+    def remove(self, tx: Transaction) -> bool:
+        key = self._tags.get(spending_tags(tx)[0])
+        if key is None or self._entries[key].tx is not tx:
+            return False
+        self._remove(key)
+        return True
+
+    def remove_spent(self, tags: List[int]) -> List[Transaction]:
+        """
+        Drops the transactions which spend any of the tags spent on chain.
+        """
+        removed = []
+        for tag in tags:
+            key = self._tags.get(int(tag))
+            if key is not None:
+                removed.append(self._remove(key).tx)
+        return removed
+
+    def pop_best(self, erc20: int, qty: int) -> List[Transaction]:
+        """
+        Takes out up to `qty` transactions of the ERC20 pool with the highest fees first.
+        """
+        heap = self._fee_heaps.get(erc20, [])
+        popped = []
+        while heap and len(popped) < qty:
+            _, sequence, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            if entry is None or entry.sequence != sequence:
+                self._stale -= 1
+                continue
+            popped.append(self._remove(key, from_fee_heap=False).tx)
+        return popped
+
+    def evict_expired(self, block_number: int) -> List[Transaction]:
+        """
+        Evicts the transactions which can't be included after the given block.
+        """
+        evicted = []
+        expirations = self._expirations
+        while expirations and expirations[0][0] <= block_number:
+            _, sequence, key = heapq.heappop(expirations)
+            entry = self._entries.get(key)
+            if entry is None or entry.sequence != sequence:
+                self._stale -= 1
+                continue
+            evicted.append(self._remove(key, from_expirations=False).tx)
+        return evicted
+
+    def _remove(self, key: int, from_fee_heap=True, from_expirations=True) -> MempoolEntry:
+        entry = self._entries.pop(key)
+        for tag in entry.tags:
+            del self._tags[tag]
+        self._sizes[entry.erc20] -= 1
+        # Lazy deletion: the heap items are left behind and skipped later
+        self._stale += from_fee_heap + from_expirations
+        if self._stale > 2 * len(self._entries) + 1024:
+            self._compact()
+        return entry
+
+    def _compact(self):
+        entries = self._entries
+        for erc20, heap in self._fee_heaps.items():
+            heap[:] = [item for item in heap if item[2] in entries and entries[item[2]].sequence == item[1]]
+            heapq.heapify(heap)
+        # In place, so evict_expired keeps popping from the compacted heap
+        self._expirations[:] = [item for item in self._expirations
+                                if item[2] in entries and entries[item[2]].sequence == item[1]]
+        heapq.heapify(self._expirations)
+        self._stale = 0
@@ -1,19 +1,27 @@
+import copy
 import json
 import time
+from concurrent.futures import ProcessPoolExecutor
 from functools import reduce
 import docker
 import random
+import secrets
 from typing import List
 
 from ethsnarks.field import SNARK_SCALAR_FIELD, FQ
-from ethsnarks.pedersen import pedersen_hash_bits
 from ethsnarks.jubjub import Point
 
-from py934.jubjub import Field
+from py934.challenge import challenge_hasher
+from py934.codec import LazyDecoded, Reader, encode_header, encode_point, encode_proof, encode_scalar, decode_point, \
+    decode_proof, decode_scalar, compressed_y, encode_batch, to_hex, point_to_hex, point_from_hex, KIND_TRANSACTION, \
+    KIND_KERNEL, KIND_BODY, KIND_REQUEST, KIND_RESPONSE, KIND_REQUEST_BATCH, KIND_RESPONSE_BATCH, POINT_SIZE, \
+    PROOF_SIZE, SCALAR_SIZE
+from py934.jubjub import Field, FixedBaseTable, multi_scalar_mul, scalar_mul, sum_points, valid_points, etec_add, \
+    etec_mul, batch_from_etec, in_subgroup
 from .constant import G, H
 
 
-class Signature:
+class Signature(LazyDecoded):
     def __init__(self, s: Field, R: Point):
         self.s = s
         self.R = R
@@ -22,6 +30,28 @@ class Signature:
         assert isinstance(self, Signature)
         return Signature(self.s + other.s, self.R + other.R)
 
+    def to_dict(self):
+        return {'s': to_hex(self.s), 'R': point_to_hex(self.R)}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(Field(int(data['s'], 16)), point_from_hex(data['R']))
+
+
+_G_TABLE = FixedBaseTable(G)
+_H_TABLE = FixedBaseTable(H)
+
+
+def _derive_outputs(rs: List[int], vs: List[int]) -> List[tuple]:
+    # (r * G, r * G + v * H, r * (r * G + v * H)) for each output
+    derived = []
+    for r, v in zip(rs, vs):
+        public_key = _G_TABLE.mul_etec(r)
+        hh = etec_add(public_key, _H_TABLE.mul_etec(v))
+        derived += [public_key, hh, etec_mul(hh, r)]
+    points = batch_from_etec(derived)
+    return [tuple(points[i:i + 3]) for i in range(0, len(points), 3)]
+
 
 class Output:
     def __init__(self, r: Field, v: Field):
@@ -32,13 +62,17 @@ class Output:
         self.hh = hh
         self.r = r
         self.v = v
+        self._public_key = None
+        self._tag = None
         self._range_proof = None
         self._inclusion_proof = None
         self._deposit_proof = None  # Only for deposit TXO
 
     @property
     def public_key(self) -> Point:
-        return self.r * G
+        if self._public_key is None:
+            self._public_key = self.r * G
+        return self._public_key
 
     @property
     def private_key(self) -> Field:
@@ -71,10 +105,65 @@ class Output:
         txo = cls(r, v)
         return txo
 
+    @classmethod
+    def _from_trusted(cls, r: Field, v: Field, hh: Point, public_key: Point = None, tag: FQ = None) -> 'Output':
+        """
+        Skips computing the commitment. Only for the points derived from (r, v) by the caller.
+        """
+        txo = cls.__new__(cls)
+        txo.hh = hh
+        txo.r = r
+        txo.v = v
+        txo._public_key = public_key
+        txo._tag = tag
+        txo._range_proof = None
+        txo._inclusion_proof = None
+        txo._deposit_proof = None
+        return txo
+
+    @classmethod
+    def new_batch(cls, values: List, processes=None) -> List['Output']:
+        """
+        Creates outputs for the given values at once. Blinding factors come from a CSPRNG byte buffer, and
+        the commitments, public keys and tags are computed with fixed-base tables and a single inversion per
+        chunk. With `processes`, the chunks are computed in a process pool.
+        """
+        values = [v if isinstance(v, Field) else Field(v) for v in values]
+        blindings = Field.random_batch(len(values))
+        rs = [r.n for r in blindings]
+        vs = [v.n for v in values]
+        if processes is None or processes <= 1 or len(values) < 2 * processes:
+            derived = _derive_outputs(rs, vs)
+        else:
+            size = -(-len(values) // processes)
+            with ProcessPoolExecutor(processes) as executor:
+                chunks = executor.map(_derive_outputs,
+                                      [rs[i:i + size] for i in range(0, len(rs), size)],
+                                      [vs[i:i + size] for i in range(0, len(vs), size)])
+                derived = [item for chunk in chunks for item in chunk]
+        assert valid_points([point for item in derived for point in item])
+
+        return [cls._from_trusted(r, v, hh, public_key, tag_point.y)
+                for r, v, (public_key, hh, tag_point) in zip(blindings, values, derived)]
+
+    @classmethod
+    def open_batch(cls, rs: List[Field], vs: List[Field], hhs: List[Point]) -> List['Output']:
+        """
+        Outputs of stored openings. Every commitment is recomputed with the fixed-base tables and checked.
+        """
+        derived = _derive_outputs([r.n for r in rs], [v.n for v in vs])
+        outputs = []
+        for r, v, hh, (public_key, derived_hh, tag_point) in zip(rs, vs, hhs, derived):
+            assert derived_hh == hh, "Commitment does not match its opening"
+            outputs.append(cls._from_trusted(r, v, hh, public_key, tag_point.y))
+        return outputs
+
     @property
     def tag(self):
-        tag_point = self.hh * self.r
-        return tag_point.y
+        if self._tag is None:
+            tag_point = self.r * self.hh
+            self._tag = tag_point.y
+        return self._tag
 
     @property
     def deposit_proof(self):
@@ -118,7 +207,7 @@ class Output:
         return self.hh.compress()
 
 
-class Kernel:
+class Kernel(LazyDecoded):
     def __init__(self, hh_excess: Point, signature: Signature, fee, metadata):
         self.hh_excess = hh_excess
         self.signature = signature
@@ -139,8 +228,110 @@ class Kernel:
         {}
         """.format(self.hh_excess, self.signature.s.to_fq2(), self.signature.R, self.fee, self.metadata)
 
+    @property
+    def challenge(self) -> Field:
+        return challenge_hasher.challenge(self.hh_excess, self.signature.R, self.fee, self.metadata)
+
+    def verify_signature(self, challenge: Field = None) -> bool:
+        challenge = self.challenge if challenge is None else challenge
+        return self.signature.s * G == self.signature.R + challenge * self.hh_excess
 
-class Body:
+    def to_dict(self):
+        return {
+            'hh_excess': point_to_hex(self.hh_excess),
+            'signature': self.signature.to_dict(),
+            'fee': to_hex(self.fee),
+            'metadata': to_hex(self.metadata)
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(point_from_hex(data['hh_excess']),
+                   Signature.from_dict(data['signature']),
+                   Field(int(data['fee'], 16)),
+                   Field(int(data['metadata'], 16)))
+
+    def encode(self) -> bytes:
+        # excess(32) | sig point(32) | sig scalar(32) | fee(32) | metadata(32)
+        return encode_point(self.hh_excess) + \
+               encode_point(self.signature.R) + \
+               encode_scalar(self.signature.s) + \
+               encode_scalar(self.fee) + \
+               encode_scalar(self.metadata)
+
+    @classmethod
+    def decode(cls, reader: Reader) -> 'Kernel':
+        kernel = cls.__new__(cls)
+        signature = Signature.__new__(Signature)
+        kernel.lazy('hh_excess', decode_point, reader.read(POINT_SIZE))
+        signature.lazy('R', decode_point, reader.read(POINT_SIZE))
+        signature.s = Field(reader.read_scalar())
+        kernel.signature = signature
+        kernel.fee = Field(reader.read_scalar())
+        kernel.metadata = Field(reader.read_scalar())
+        return kernel
+
+    def to_bytes(self) -> bytes:
+        return encode_header(KIND_KERNEL) + self.encode()
+
+    @classmethod
+    def from_bytes(cls, data) -> 'Kernel':
+        reader = Reader(data)
+        reader.read_header(KIND_KERNEL)
+        kernel = cls.decode(reader)
+        reader.finish()
+        return kernel
+
+
+def verify_kernels(kernels: List[Kernel]) -> List[bool]:
+    """
+    Verifies the Schnorr signatures of the kernels with a randomized linear combination,
+        sum(z_i * s_i) * G - sum(z_i * R_i) - sum(z_i * c_i * X_i) == 0
+    which needs only one multi-scalar multiplication. An even weight cancels a small order component of R or X, so
+    the kernels with such points are rejected before batching, like the single check rejects them. When the batch
+    fails, it checks each kernel to find the bad ones. Returns the verdict of each kernel.
+    """
+    if len(kernels) == 0:
+        return []
+    challenges = challenge_hasher.kernel_challenges(kernels)
+    if len(kernels) == 1:
+        return [kernels[0].verify_signature(challenges[0])]
+    subgroup = [in_subgroup(kernel.signature.R) and in_subgroup(kernel.hh_excess) for kernel in kernels]
+    batch = [i for i in range(len(kernels)) if subgroup[i]]
+    weights = [secrets.randbits(128) for _ in batch]
+    scalars = [sum(z * int(kernels[i].signature.s) for z, i in zip(weights, batch))]
+    points = [G]
+    for z, i in zip(weights, batch):
+        scalars += [-z, -z * int(challenges[i])]
+        points += [kernels[i].signature.R, kernels[i].hh_excess]
+    if multi_scalar_mul(scalars, points) == Point.infinity():
+        return subgroup
+    return [valid and kernel.verify_signature(challenge)
+            for valid, kernel, challenge in zip(subgroup, kernels, challenges)]
+
+
+def verify_balances(kernels: List[Kernel], inputs: List[List[Point]], outputs: List[List[Point]]) -> List[bool]:
+    """
+    Verifies the Mimblewimble balance of a batch of transactions with the aggregated equation,
+        sum(inputs) + sum(hh_excess) == sum(outputs) + sum(fee) * H
+    It needs the input commitments which are hidden in the Transaction objects, so only the parties knowing them
+    (senders, or an aggregator collecting them) can use this. The aggregated equation guarantees that the batch
+    does not print money as a whole. When it fails, it checks each transaction to find the bad ones.
+    Returns the verdict of each transaction.
+    """
+    assert len(kernels) == len(inputs) == len(outputs)
+    if len(kernels) == 0:
+        return []
+    inflow = [hh for hidings in inputs for hh in hidings] + [kernel.hh_excess for kernel in kernels]
+    outflow = [hh for hidings in outputs for hh in hidings]
+    total_fee = sum(int(kernel.fee) for kernel in kernels)
+    if sum_points(inflow) == sum_points(outflow + [scalar_mul(H, total_fee)]):
+        return [True] * len(kernels)
+    return [sum_points([*hh_inputs, kernel.hh_excess]) == sum_points([*hh_outputs, kernel.fee * H])
+            for kernel, hh_inputs, hh_outputs in zip(kernels, inputs, outputs)]
+
+
+class Body(LazyDecoded):
     def __init__(self, hh_input_tags: List[FQ], hh_outputs: List[Point]):
         assert len(hh_input_tags) == 2
         self.hh_input_tags = hh_input_tags
@@ -154,8 +345,51 @@ class Body:
         {}
         """.format(self.hh_input_tags, self.hh_outputs)
 
+    def to_dict(self):
+        return {
+            'hh_input_tags': [to_hex(tag) for tag in self.hh_input_tags],
+            'hh_outputs': [point_to_hex(hh) for hh in self.hh_outputs]
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls([FQ(int(tag, 16)) for tag in data['hh_input_tags']],
+                   [point_from_hex(hh) for hh in data['hh_outputs']])
+
+    def encode(self) -> bytes:
+        # tags(2 * 32) | number of outputs(1) | outputs(n * 32)
+        return b''.join(encode_scalar(tag) for tag in self.hh_input_tags) + \
+               bytes([len(self.hh_outputs)]) + \
+               b''.join(encode_point(hh) for hh in self.hh_outputs)
+
+    @classmethod
+    def decode(cls, reader: Reader) -> 'Body':
+        body = cls.__new__(cls)
+        body.hh_input_tags = [FQ(reader.read_scalar()), FQ(reader.read_scalar())]
+        outputs = [reader.read(POINT_SIZE) for _ in range(reader.read_byte())]
+        body.lazy('hh_outputs', lambda: [decode_point(view) for view in outputs])
+        return body
+
+    def to_bytes(self) -> bytes:
+        return encode_header(KIND_BODY) + self.encode()
+
+    @classmethod
+    def from_bytes(cls, data) -> 'Body':
+        reader = Reader(data)
+        reader.read_header(KIND_BODY)
+        body = cls.decode(reader)
+        reader.finish()
+        return body
+
 
-class Transaction:
+def _decode_mimblewimble_proof(data, kernel: Kernel, body: Body) -> dict:
+    hh_outputs = body.hh_outputs
+    return decode_proof(data, [kernel.fee, kernel.metadata, *body.hh_input_tags,
+                               hh_outputs[0].x, hh_outputs[0].y, hh_outputs[1].x, hh_outputs[1].y,
+                               *kernel.signature.R, 1])
+
+
+class Transaction(LazyDecoded):
     def __init__(self, kernel: Kernel, body: Body, range_proofs, inclusion_proofs, mimblewimble_proof):
         self.kernel = kernel
         self.body = body
@@ -170,16 +404,12 @@ class Transaction:
 
     @staticmethod
     def create_challenge(hh_excess: Point, hh_sig_salt: Point, fee: Field, metadata: Field) -> Field:
-        # Circuit uses big-endian while ethsnarks lib uses little-endian
-        concatenated_source = \
-            metadata.bits() + \
-            fee.bits() + \
-            hh_sig_salt.y.bits() + \
-            hh_excess.y.bits()
-        concatenated_source.reverse()
-        assert len(concatenated_source) == 1016
-        hashed_point = pedersen_hash_bits(b'Ethereum934', concatenated_source)
-        return Field(hashed_point.y.n)
+        # Same with pedersen_hash_bits(b'Ethereum934', reversed(metadata | fee | hh_sig_salt.y | hh_excess.y))
+        return challenge_hasher.challenge(hh_excess, hh_sig_salt, fee, metadata)
+
+    @staticmethod
+    def create_challenges(transactions: List['Transaction']) -> List[Field]:
+        return challenge_hasher.kernel_challenges([tx.kernel for tx in transactions])
 
     @classmethod
     def new(cls,
@@ -192,19 +422,17 @@ class Transaction:
             range_proofs: List,
             inclusion_proofs: List
             ):
-        tags = [(item.r * item.hh).y for item in inputs]
+        tags = [item.tag for item in inputs]
+
+        kernel = Kernel(hh_excess, signature, fee, metadata)
 
         # check Mimblewimble
         # inputs[0].hh + inputs[1].hh + hh_excess = outputs[0] + outputs[1] + fee*H
-        inflow_hidings = reduce((lambda hidings, txo: hidings + txo.hh), inputs, hh_excess)
-        outflow_hidings = reduce((lambda hidings, hh: hidings + hh), outputs, fee * H)
-        assert inflow_hidings == outflow_hidings
+        assert verify_balances([kernel], [[txo.hh for txo in inputs]], [outputs]) == [True]
 
         # check Schnorr signature
-        challenge = Transaction.create_challenge(hh_excess, signature.R, fee, metadata)
-        assert signature.s * G == signature.R + challenge * hh_excess
+        assert kernel.verify_signature()
 
-        kernel = Kernel(hh_excess, signature, fee, metadata)
         body = Body(tags, outputs)
         range_proofs = range_proofs
         inclusion_proofs = inclusion_proofs
@@ -235,14 +463,73 @@ class Transaction:
         return cls(kernel, body, range_proofs, inclusion_proofs, mw_proof)
 
     def to_dict(self):
-        converted = json.dumps(self,
-                               default=lambda o: format(int(o), "#066x") if type(o) in [Field, FQ] else getattr(o,
-                                                                                                                '__dict__',
-                                                                                                                str(o)))
-        return json.loads(converted)
+        return {
+            'kernel': self.kernel.to_dict(),
+            'body': self.body.to_dict(),
+            'range_proofs': copy.deepcopy(self.range_proofs),
+            'inclusion_proofs': copy.deepcopy(self.inclusion_proofs),
+            'mimblewimble_proof': copy.deepcopy(self.mimblewimble_proof)
+        }
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(Kernel.from_dict(data['kernel']),
+                   Body.from_dict(data['body']),
+                   data['range_proofs'],
+                   data['inclusion_proofs'],
+                   data['mimblewimble_proof'])
+
+    def to_bytes(self) -> bytes:
+        """
+        Versioned binary encoding. Points are compressed and only the Groth16 proofs are stored, because the public
+        inputs of the proofs can be derived from the kernel and the body, except the roots of the inclusion proofs.
+
+        header(2) | kernel(160) | body(65 + n * 32) | range proofs(n * 256) |
+        inclusion proofs(2 * (1 + [32 + 256])) | mimblewimble proof(256)
+        """
+        encoded = [encode_header(KIND_TRANSACTION), self.kernel.encode(), self.body.encode()]
+        assert len(self.range_proofs) == len(self.body.hh_outputs)
+        encoded += [encode_proof(proof) for proof in self.range_proofs]
+        assert len(self.inclusion_proofs) == len(self.body.hh_input_tags)
+        for proof in self.inclusion_proofs:
+            if proof is None:
+                encoded.append(b'\x00')
+            else:
+                encoded += [b'\x01', encode_scalar(int(proof['inputs'][0], 16)), encode_proof(proof)]
+        encoded.append(encode_proof(self.mimblewimble_proof))
+        return b''.join(encoded)
 
-class Request:
+    @classmethod
+    def from_bytes(cls, data) -> 'Transaction':
+        """
+        Decodes the binary encoding. Points and proofs are decoded lazily on their first access.
+        """
+        reader = Reader(data)
+        reader.read_header(KIND_TRANSACTION)
+        tx = cls.__new__(cls)
+        tx.kernel = Kernel.decode(reader)
+        body_offset = reader.offset
+        tx.body = Body.decode(reader)
+        outputs = reader.view[body_offset + 2 * SCALAR_SIZE + 1:reader.offset]
+        range_proofs = [(reader.read(PROOF_SIZE), compressed_y(outputs[i:i + POINT_SIZE]))
+                        for i in range(0, len(outputs), POINT_SIZE)]
+        tx.lazy('range_proofs', lambda: [decode_proof(proof, [y, 1]) for proof, y in range_proofs])
+        inclusion_proofs = []
+        for tag in tx.body.hh_input_tags:
+            if reader.read_byte() == 0:
+                inclusion_proofs.append(None)
+            else:
+                inclusion_proofs.append((reader.read(SCALAR_SIZE), reader.read(PROOF_SIZE), tag))
+        tx.lazy('inclusion_proofs', lambda: [
+            None if item is None else decode_proof(item[1], [decode_scalar(item[0]), item[2], 1])
+            for item in inclusion_proofs
+        ])
+        tx.lazy('mimblewimble_proof', _decode_mimblewimble_proof, reader.read(PROOF_SIZE), tx.kernel, tx.body)
+        reader.finish()
+        return tx
+
+
+class Request(LazyDecoded):
     def __init__(self,
                  value: Field,
                  fee: Field,
@@ -267,28 +554,48 @@ class Request:
                    self.metadata)
         return str_to_print
 
-    def serialize(self):
-        serialized = b''
-        serialized += self.value.to_bytes('little')
-        serialized += self.fee.to_bytes('little')
-        serialized += self.hh_sig_salt.compress()
-        serialized += self.hh_excess.compress()
-        serialized += self.metadata.to_bytes('little')
-        return serialized
+    def encode(self) -> bytes:
+        # value(32) | fee(32) | sig salt point(32) | excess point(32) | metadata(32)
+        return encode_scalar(self.value) + \
+               encode_scalar(self.fee) + \
+               encode_point(self.hh_sig_salt) + \
+               encode_point(self.hh_excess) + \
+               encode_scalar(self.metadata)
 
     @classmethod
-    def deserialize(cls, serialized):
-        assert len(serialized) == 32 * 5
-        value = Field(int.from_bytes(serialized[0:32], 'little'))
-        fee = Field(int.from_bytes(serialized[32:64], 'little'))
-        sig_salt = Point.decompress(serialized[64:96])
-        excess = Point.decompress(serialized[96:128])
-        metadata = Field(int.from_bytes(serialized[128:160], 'little'))
-        instance = cls(value, fee, sig_salt, excess, metadata)
-        return instance
-
-
-class Response:
+    def decode(cls, reader: Reader) -> 'Request':
+        request = cls.__new__(cls)
+        request.value = Field(reader.read_scalar())
+        request.fee = Field(reader.read_scalar())
+        request.lazy('hh_sig_salt', decode_point, reader.read(POINT_SIZE))
+        request.lazy('hh_excess', decode_point, reader.read(POINT_SIZE))
+        request.metadata = Field(reader.read_scalar())
+        return request
+
+    def serialize(self) -> bytes:
+        return encode_header(KIND_REQUEST) + self.encode()
+
+    @classmethod
+    def deserialize(cls, serialized) -> 'Request':
+        reader = Reader(serialized)
+        reader.read_header(KIND_REQUEST)
+        request = cls.decode(reader)
+        reader.finish()
+        return request
+
+    @staticmethod
+    def serialize_batch(requests: List['Request']) -> bytes:
+        return encode_batch(KIND_REQUEST_BATCH, [request.encode() for request in requests])
+
+    @classmethod
+    def deserialize_batch(cls, serialized) -> List['Request']:
+        reader = Reader(serialized)
+        requests = [cls.decode(reader) for _ in range(reader.read_batch_header(KIND_REQUEST_BATCH))]
+        reader.finish()
+        return requests
+
+
+class Response(LazyDecoded):
     def __init__(self, hh_output: Point, hh_excess: Point, signature: Signature, range_proof):
         self.hh_output = hh_output
         self.hh_excess = hh_excess
@@ -304,27 +611,50 @@ class Response:
         """.format(self.hh_output, self.signature.R, self.signature)
         return str_to_print
 
-    def serialize(self):
-        serialized = b''
-        serialized += self.hh_output.compress()
-        serialized += self.hh_excess.compress()
-        serialized += self.signature.R.compress()
-        serialized += self.signature.s.to_bytes('little')
-        serialized += json.dumps(self.range_proof).encode('utf-8')
-        return serialized
+    def encode(self) -> bytes:
+        # output(32) | excess point(32) | sig point(32) | sig scalar(32) | range proof(256)
+        assert self.range_proof is not None, "Response should have the range proof of the output"
+        return b''.join([encode_point(self.hh_output),
+                         encode_point(self.hh_excess),
+                         encode_point(self.signature.R),
+                         encode_scalar(self.signature.s),
+                         encode_proof(self.range_proof)])
 
     @classmethod
-    def deserialize(cls, serialized):
-        assert len(serialized) == 32 * 3
-        hh_outputs = Point.decompress(serialized[0:32])
-        hh_excess = Point.decompress(serialized[32:64])
-        signature = Signature(
-            Field(int.from_bytes(serialized[96:128], 'little')),
-            Point.decompress(serialized[64:96])
-        )
-        range_proof = json.loads(serialized[96:].decode('utf-8'))
-        instance = cls(hh_outputs, hh_excess, signature, range_proof)
-        return instance
+    def decode(cls, reader: Reader) -> 'Response':
+        response = cls.__new__(cls)
+        hh_output = reader.read(POINT_SIZE)
+        response.lazy('hh_output', decode_point, hh_output)
+        response.lazy('hh_excess', decode_point, reader.read(POINT_SIZE))
+        signature = Signature.__new__(Signature)
+        signature.lazy('R', decode_point, reader.read(POINT_SIZE))
+        signature.s = Field(reader.read_scalar())
+        response.signature = signature
+        # Public inputs of the range proof: output's y coordinate and the result(1)
+        response.lazy('range_proof', decode_proof, reader.read(PROOF_SIZE), [compressed_y(hh_output), 1])
+        return response
+
+    def serialize(self) -> bytes:
+        return encode_header(KIND_RESPONSE) + self.encode()
+
+    @classmethod
+    def deserialize(cls, serialized) -> 'Response':
+        reader = Reader(serialized)
+        reader.read_header(KIND_RESPONSE)
+        response = cls.decode(reader)
+        reader.finish()
+        return response
+
+    @staticmethod
+    def serialize_batch(responses: List['Response']) -> bytes:
+        return encode_batch(KIND_RESPONSE_BATCH, [response.encode() for response in responses])
+
+    @classmethod
+    def deserialize_batch(cls, serialized) -> List['Response']:
+        reader = Reader(serialized)
+        responses = [cls.decode(reader) for _ in range(reader.read_batch_header(KIND_RESPONSE_BATCH))]
+        reader.finish()
+        return responses
 
 
 class SendTxBuilder:
@@ -420,6 +750,11 @@ class ReceiveTxBuilder:
 
 
 class TxSend:
+    REQUESTED = 'requested'
+    MERGED = 'merged'
+    SIGNED = 'signed'
+    PROVEN = 'proven'
+
     @classmethod
     def builder(cls):
         return SendTxBuilder()
@@ -443,6 +778,10 @@ class TxSend:
         self.sig_salt = sig_salt
         self._request = None
         self._response = None
+        self._challenge = None
+        self._signature = None
+        self._aggregated_signature = None
+        self._transaction = None
         self._builder = None
         inflow = reduce((lambda val, txo: val + txo.v), self.inputs, 0)
         assert inflow == value + fee + change.v.n, "Not enough input value"
@@ -475,9 +814,24 @@ class TxSend:
             )
         return self._request
 
-    def merge(self, response: Response):
+    @property
+    def stage(self) -> str:
+        if self._transaction is not None:
+            return TxSend.PROVEN
+        if self._aggregated_signature is not None:
+            return TxSend.SIGNED
+        if self._response is not None:
+            return TxSend.MERGED
+        return TxSend.REQUESTED
+
+    def merge(self, response: Response, prove=True):
+        """
+        Merges the recipient's response. It returns the proven transaction, or None when `prove` is False.
+        Every artifact of the later stages (challenge, signatures, zk proof) is computed only once.
+        """
+        assert self._response is None or self._response is response, "Another response is already merged"
         self._response = response
-        return self.transaction
+        return self.prove() if prove else None
 
     @property
     def response(self) -> Response:
@@ -486,34 +840,49 @@ class TxSend:
     @property
     def challenge(self):
         assert self._response is not None, "To get the challenge data, you should merge the recipient response first"
-        request = self.request
-        response = self.response
-        return Transaction.create_challenge(
-            request.hh_excess + response.hh_excess,
-            request.hh_sig_salt + response.signature.R,
-            request.fee, request.metadata
-        )
+        if self._challenge is None:
+            request = self.request
+            response = self.response
+            self._challenge = Transaction.create_challenge(
+                request.hh_excess + response.hh_excess,
+                request.hh_sig_salt + response.signature.R,
+                request.fee, request.metadata
+            )
+        return self._challenge
 
     @property
     def signature(self) -> Signature:
-        return Signature(self.sig_salt + self.challenge * self.excess, self.hh_sig_salt)
+        if self._signature is None:
+            self._signature = Signature(self.sig_salt + self.challenge * self.excess, self.hh_sig_salt)
+        return self._signature
+
+    def sign(self) -> Signature:
+        assert self.response is not None, "You should merge response from the recipient first"
+        if self._aggregated_signature is None:
+            self._aggregated_signature = self.signature + self.response.signature
+        return self._aggregated_signature
+
+    def prove(self) -> Transaction:
+        if self._transaction is None:
+            aggregated_signature = self.sign()
+            hh_excess = self.request.hh_excess + self.response.hh_excess
+            range_proofs = [self.response.range_proof, self.change.range_proof]
+            self._transaction = Transaction.new(
+                hh_excess,
+                aggregated_signature,
+                self.fee,
+                self.metadata,
+                [self.response.hh_output, self.change.hh],
+                self.inputs,
+                range_proofs,
+                self.inclusion_proofs
+            )
+        return self._transaction
 
     @property
     def transaction(self):
         assert self.response is not None, "You should merge response from the recipient first"
-        hh_excess = self.request.hh_excess + self.response.hh_excess
-        aggregated_signature = self.signature + self.response.signature
-        range_proofs = [self.response.range_proof, self.change.range_proof]
-        return Transaction.new(
-            hh_excess,
-            aggregated_signature,
-            self.fee,
-            self.metadata,
-            [self.response.hh_output, self.change.hh],
-            self.inputs,
-            range_proofs,
-            self.inclusion_proofs
-        )
+        return self.prove()
 
 
 class TxReceive:
@@ -525,20 +894,28 @@ class TxReceive:
         self.request = request
         self.output = output
         self.sig_salt = sig_salt
+        self._challenge = None
+        self._signature = None
+        self._response = None
 
     @property
     def challenge(self):
-        challenge = Transaction.create_challenge(
-            self.request.hh_excess + self.output.public_key,
-            self.request.hh_sig_salt + self.sig_salt * G,
-            self.request.fee, self.request.metadata
-        )
-        return challenge
+        if self._challenge is None:
+            self._challenge = Transaction.create_challenge(
+                self.request.hh_excess + self.output.public_key,
+                self.request.hh_sig_salt + self.sig_salt * G,
+                self.request.fee, self.request.metadata
+            )
+        return self._challenge
 
     @property
     def signature(self) -> Signature:
-        return Signature(self.sig_salt + self.challenge * self.output.r, self.sig_salt * G)
+        if self._signature is None:
+            self._signature = Signature(self.sig_salt + self.challenge * self.output.r, self.sig_salt * G)
+        return self._signature
 
     @property
     def response(self):
-        return Response(self.output.hh, self.output.public_key, self.signature, self.output.range_proof)
+        if self._response is None:
+            self._response = Response(self.output.hh, self.output.public_key, self.signature, self.output.range_proof)
+        return self._response
@@ -1,13 +1,20 @@
 import json
+import mmap
+import os
 import time
-from math import floor, log2
-from typing import List
+from collections.abc import MutableMapping
+from concurrent.futures import Executor, ProcessPoolExecutor
+from hashlib import blake2b
+from itertools import islice
+from typing import List, Iterable, Iterator, Dict
 
 import docker
 from ethsnarks.field import FQ
 from ethsnarks.jubjub import Point
 
-from py934.jubjub import Field
+from py934.codec import Reader, encode_header, encode_scalar, encode_point, decode_point, KIND_MMR, SCALAR_SIZE, \
+    POINT_SIZE
+from py934.jubjub import Field, scalar_mul
 from .constant import G, H
 
 
@@ -32,7 +39,8 @@ class MMR:
 
     @staticmethod
     def max_height(width):
-        return floor(log2(width)) + 1
+        # Exact for any width unlike floor(log2(width)) + 1
+        return width.bit_length()
 
     @staticmethod
     def sibling_map(width, position) -> str:
@@ -88,6 +96,159 @@ class PedersenMMRProof:
         return self.zkp
 
 
+class MMRSnapshot:
+    """
+    Immutable (width, peaks, root) of a PedersenMMR.
+
+    Nodes and items of an MMR are never overwritten once they are stored, so a snapshot shares them with the MMR.
+    Readers can build inclusion proofs against a pinned snapshot from many threads without locks while the writer
+    keeps appending.
+    """
+
+    def __init__(self, bits, width, peaks: tuple, nodes: dict, items: dict):
+        self.bits = bits
+        self.width = width
+        self.peaks = peaks
+        self._nodes = nodes
+        self._items = items
+        self._root = None
+
+    @property
+    def root(self) -> FQ:
+        if self._root is None:
+            self._root = PedersenMMR.peak_bagging(self.peaks)
+        return self._root
+
+    def witness_peaks(self, bits=None) -> List[Point]:
+        """
+        Peaks padded to `bits` for the circuits, e.g. bits=16 from a 32 bits MMR while the width fits.
+        Infinity peaks don't change the peak bagging, so the root stays the same.
+        """
+        bits = self.bits if bits is None else bits
+        assert self.width < (1 << bits), "Width {} does not fit in {} bits".format(self.width, bits)
+        if bits <= self.bits:
+            return list(self.peaks[self.bits - bits:])
+        return [Point.infinity()] * (bits - self.bits) + list(self.peaks)
+
+    def get_siblings(self, position, bits=None) -> List[Point]:
+        assert 0 < position <= self.width, "Position {} is out of the snapshot".format(position)
+        bits = self.bits if bits is None else bits
+        # variables to return
+        width = self.width
+        siblings = []
+
+        sibling_map = MMR.sibling_map(width, position)
+        my_peak_height = len(sibling_map) + 1
+
+        # Calculate the belonging peak with siblings
+        cursor_index = MMR.leaf_index(position)
+        for i in range(my_peak_height - 1):
+            has_right_sibling = sibling_map[i] == '1'
+            if has_right_sibling:
+                cursor_index = cursor_index + (2 << i)
+                right_sibling_index = cursor_index - 1
+                siblings.append(self._nodes[right_sibling_index])
+            else:
+                cursor_index += 1
+                left_sibling_index = cursor_index - (2 << i)
+                siblings.append(self._nodes[left_sibling_index])
+        siblings = siblings + [Point.infinity()] * (bits - len(siblings))
+        return siblings
+
+    def get_inclusion_proof(self, position, bits=None) -> PedersenMMRProof:
+        siblings = self.get_siblings(position, bits)
+        return PedersenMMRProof(self.root, position, self._items[position], self.witness_peaks(bits), siblings)
+
+
+# x(32) | y(32) of a leaf item. Points are not compressed because the decompression is slower than the rebuild.
+LEAF_RECORD_SIZE = 2 * SCALAR_SIZE
+
+
+def write_leaves(path, items: Iterable[Point]):
+    with open(path, 'wb') as f:
+        for item in items:
+            f.write(encode_scalar(item.x) + encode_scalar(item.y))
+
+
+def read_leaves(path, chunk_size=4096) -> Iterator[Point]:
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(LEAF_RECORD_SIZE * chunk_size)
+            assert len(data) % LEAF_RECORD_SIZE == 0, "Broken leaf file"
+            if not data:
+                break
+            for offset in range(0, len(data), LEAF_RECORD_SIZE):
+                yield Point(FQ(int.from_bytes(data[offset:offset + SCALAR_SIZE], 'little')),
+                            FQ(int.from_bytes(data[offset + SCALAR_SIZE:offset + LEAF_RECORD_SIZE], 'little')))
+
+
+# header(2) | bits(1) | width(8) | nodes(8) | roots(4) | root(32) | checksum(32)
+SNAPSHOT_HEADER_SIZE = 87
+_CHECKSUM_OFFSET = SNAPSHOT_HEADER_SIZE - 32
+# root(32) | width(8)
+ROOT_RECORD_SIZE = SCALAR_SIZE + 8
+_MISSING = encode_point(Point.infinity())
+
+
+class LazyPoints(MutableMapping):
+    """
+    Points compressed contiguously from the index 1, which are decompressed on their first access. Missing points
+    are stored as the infinity point. Points set later are only kept in memory.
+    """
+
+    def __init__(self, buffer, count: int):
+        self._buffer = buffer
+        self._count = count
+        self._points = {}
+
+    def __getitem__(self, index):
+        point = self._points.get(index)
+        if point is None:
+            if not 0 < index <= self._count:
+                raise KeyError(index)
+            data = self._buffer[(index - 1) * POINT_SIZE:index * POINT_SIZE]
+            if data == _MISSING:
+                raise KeyError(index)
+            point = self._points[index] = decode_point(data)
+        return point
+
+    def __setitem__(self, index, point: Point):
+        self._points[index] = point
+
+    def __delitem__(self, index):
+        raise TypeError("MMR points are append-only")
+
+    def __contains__(self, index):
+        if index in self._points:
+            return True
+        return 0 < index <= self._count and \
+            self._buffer[(index - 1) * POINT_SIZE:index * POINT_SIZE] != _MISSING
+
+    def __iter__(self):
+        for index in range(1, self._count + 1):
+            if index in self:
+                yield index
+        for index in self._points:
+            if index > self._count:
+                yield index
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def _encode_points(points: Dict[int, Point], count: int) -> bytes:
+    return b''.join(encode_point(points[index]) if index in points else _MISSING for index in range(1, count + 1))
+
+
+def _leaf_nodes(first_position: int, items: List[Point]) -> List[Point]:
+    return [scalar_mul(item, first_position + i) for i, item in enumerate(items)]
+
+
+def _parent_nodes(children: List[Point]) -> List[Point]:
+    # Same with append(): the right child multiplied by the y coordinate of the left child
+    return [scalar_mul(children[i + 1], children[i].y) for i in range(0, len(children), 2)]
+
+
 class PedersenMMR(MMR):
     def __init__(self, bits=16):
         self.bits = bits
@@ -95,6 +256,8 @@ class PedersenMMR(MMR):
         self.items = {}
         self.nodes = {}
         self.peaks = [Point.infinity()] * bits
+        self._snapshot = None
+        self._publish()
 
     @classmethod
     def from_peaks(cls, bits, peaks: List[Point]):
@@ -110,8 +273,142 @@ class PedersenMMR(MMR):
                 # Peak exists
                 index += (1 << peak_height) - 1
                 mmr.nodes[index] = peaks[i]
+        mmr._publish()
         return mmr
 
+    @classmethod
+    def from_leaves(cls, leaves, bits=16, processes=None, chunk_size=1024, executor: Executor = None):
+        """
+        Rebuilds every node from the leaf items, which is the same with appending them one by one.
+        `leaves` is an iterable of items or the path of a file written by `write_leaves`.
+
+        Leaf nodes are computed in chunks over a process pool while the items are streamed. Then every level of the
+        mountains is computed from the level below in chunks, because the nodes of a level don't depend on each
+        other. The node covering the leaves up to the position p * 2^h at the height h is at leaf_index(p * 2^h) + h.
+        """
+        if isinstance(leaves, (str, os.PathLike)):
+            leaves = read_leaves(leaves, chunk_size)
+        mmr = cls(bits)
+        pool = executor if executor is not None else ProcessPoolExecutor(processes)
+        try:
+            leaves = iter(leaves)
+            futures = []
+            while True:
+                chunk = list(islice(leaves, chunk_size))
+                if not chunk:
+                    break
+                futures.append(pool.submit(_leaf_nodes, mmr.width + 1, chunk))
+                for item in chunk:
+                    mmr.width += 1
+                    mmr.items[mmr.width] = item
+            assert mmr.width < (1 << bits), "{} bits MMR can't contain {} items".format(bits, mmr.width)
+            level = [node for future in futures for node in future.result()]
+            for position, node in enumerate(level, 1):
+                mmr.nodes[MMR.leaf_index(position)] = node
+            height = 0
+            while len(level) > 1:
+                height += 1
+                children = level[:len(level) & ~1]
+                futures = [pool.submit(_parent_nodes, children[i:i + 2 * chunk_size])
+                           for i in range(0, len(children), 2 * chunk_size)]
+                level = [node for future in futures for node in future.result()]
+                for i, node in enumerate(level, 1):
+                    mmr.nodes[MMR.leaf_index(i << height) + height] = node
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+        # Peaks from the left-most mountain
+        covered = 0
+        for height in reversed(range(bits)):
+            if mmr.width & (1 << height):
+                covered += 1 << height
+                mmr.peaks[bits - 1 - height] = mmr.nodes[MMR.leaf_index(covered) + height]
+        mmr._publish()
+        return mmr
+
+    def to_bytes(self, roots: Dict[int, int] = None) -> bytes:
+        """
+        header | peaks(32 * bits) | items(32 * width) | nodes(32 * nodes) | roots((32 + 8) * roots)
+        Points are compressed. Nodes which are not stored, e.g. the branches of an MMR from `from_peaks`, are written
+        as the infinity point. `roots` is an optional index of historical roots to their widths.
+        """
+        roots = roots or {}
+        node_count = MMR.peak_node_index(self.width) if self.width else 0
+        body = b''.join([
+            b''.join(encode_point(peak) for peak in self.peaks),
+            _encode_points(self.items, self.width),
+            _encode_points(self.nodes, node_count),
+            b''.join(encode_scalar(root) + width.to_bytes(8, 'little') for root, width in roots.items())
+        ])
+        header = encode_header(KIND_MMR) + bytes([self.bits]) + self.width.to_bytes(8, 'little') + \
+            node_count.to_bytes(8, 'little') + len(roots).to_bytes(4, 'little') + encode_scalar(self.root)
+        return header + blake2b(header + body, digest_size=32).digest() + body
+
+    def save(self, path, roots: Dict[int, int] = None):
+        # Writes to a temporary file first, so a crash does not leave a broken snapshot
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(self.to_bytes(roots))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def from_bytes(cls, data, verify=True) -> 'PedersenMMR':
+        """
+        Only the peaks are decompressed. Items and nodes are decompressed on their first access, and the root is read
+        from the header, so loading does not compute any curve operation.
+        """
+        view = memoryview(data)
+        reader = Reader(view)
+        reader.read_header(KIND_MMR)
+        bits = reader.read_byte()
+        width = int.from_bytes(reader.read(8), 'little')
+        node_count = int.from_bytes(reader.read(8), 'little')
+        root_count = int.from_bytes(reader.read(4), 'little')
+        root = FQ(reader.read_scalar())
+        checksum = bytes(reader.read(32))
+        if verify:
+            hasher = blake2b(view[:_CHECKSUM_OFFSET], digest_size=32)
+            hasher.update(view[SNAPSHOT_HEADER_SIZE:])
+            assert hasher.digest() == checksum, "Broken MMR snapshot"
+        mmr = cls(bits)
+        mmr.width = width
+        mmr.peaks = [decode_point(reader.read(POINT_SIZE)) for _ in range(bits)]
+        mmr.items = LazyPoints(reader.read(POINT_SIZE * width), width)
+        mmr.nodes = LazyPoints(reader.read(POINT_SIZE * node_count), node_count)
+        reader.read(ROOT_RECORD_SIZE * root_count)
+        reader.finish()
+        mmr._publish()
+        mmr._snapshot._root = root
+        return mmr
+
+    @classmethod
+    def load(cls, path, verify=True) -> 'PedersenMMR':
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_bytes(data, verify)
+
+    @staticmethod
+    def load_roots(path) -> Dict[int, int]:
+        """
+        Historical roots of a snapshot to their widths.
+        """
+        with open(path, 'rb') as f:
+            header = Reader(f.read(SNAPSHOT_HEADER_SIZE))
+            header.read_header(KIND_MMR)
+            bits = header.read_byte()
+            width = int.from_bytes(header.read(8), 'little')
+            node_count = int.from_bytes(header.read(8), 'little')
+            root_count = int.from_bytes(header.read(4), 'little')
+            f.seek(SNAPSHOT_HEADER_SIZE + POINT_SIZE * (bits + width + node_count))
+            reader = Reader(f.read(ROOT_RECORD_SIZE * root_count))
+        roots = {}
+        for _ in range(root_count):
+            root = reader.read_scalar()
+            roots[root] = int.from_bytes(reader.read(8), 'little')
+        reader.finish()
+        return roots
+
     @staticmethod
     def width_from_peaks(peaks: List[Point]) -> int:
         width = 0
@@ -131,15 +428,16 @@ class PedersenMMR(MMR):
             peak = peaks[i]
             # With the mountain map, check the peak exists or not correctly
             assert (peak == Point.infinity()) is (False if MMR.peak_existence(width, peak_height) else True)
-            # Update root point
-            root_point = root_point * peak.y
-        root_point = root_point * width
+            # Update root point. The y coordinate of the infinity point is 1, so only the existing peaks are multiplied
+            if peak != Point.infinity():
+                root_point = scalar_mul(root_point, peak.y)
+        root_point = scalar_mul(root_point, width)
         return root_point.y
 
     @staticmethod
     def peak_update(prev_width, peaks: List[Point], item: Point) -> List[Point]:
         new_width = prev_width + 1
-        leaf_node = item * new_width
+        leaf_node = scalar_mul(item, new_width)
         cursor = leaf_node
         new_peaks = peaks
         new_peak = None
@@ -149,9 +447,11 @@ class PedersenMMR(MMR):
             prev_peak = peaks[i]
             # With the mountain map, check the peak exists or not correctly
             assert (prev_peak == Point.infinity()) is \
-                   (True if MMR.peak_existence(prev_width, peak_height) else False)
-            # Move cursor to the next peak.
-            cursor = cursor * prev_peak.y
+                   (False if MMR.peak_existence(prev_width, peak_height) else True)
+            # Move cursor to the next peak. Multiplying by the infinity point's y = 1 or after the new peak is found
+            # does not change the new peak
+            if new_peak is None and prev_peak != Point.infinity():
+                cursor = scalar_mul(cursor, prev_peak.y)
             # Update new peak
             if not MMR.peak_existence(new_width, peak_height):
                 # Peak should be zero
@@ -178,21 +478,21 @@ class PedersenMMR(MMR):
         my_peak = peaks[len(peaks) - my_peak_height]
 
         # Calculate the belonging peak with siblings
-        leaf_node = item * position
+        leaf_node = scalar_mul(item, position)
         cursor = leaf_node
         for i in range(len(sibling_map)):
             is_right_sibling = sibling_map[i] == '1'
             right_node = siblings[i] if is_right_sibling else cursor
             left_node = cursor if is_right_sibling else siblings[i]
-            cursor = right_node * left_node.y
+            cursor = scalar_mul(right_node, left_node.y)
 
         assert cursor == my_peak
         return True
 
     @staticmethod
     def zk_inclusion_proof(root: FQ, position, r: Field, v: Field, peaks: List[Point], siblings: List[Point]):
-        item = G * r + H * v
-        tag_point = item * r
+        item = scalar_mul(G, r) + scalar_mul(H, v)
+        tag_point = scalar_mul(item, r)
         tag = tag_point.y
         if item.x == 0:
             return None
@@ -221,8 +521,8 @@ class PedersenMMR(MMR):
 
     @staticmethod
     def zk_withdraw_proof(root: FQ, position, r: Field, v: Field, peaks: List[Point], siblings: List[Point]):
-        item = G * r + H * v
-        tag_point = item * r
+        item = scalar_mul(G, r) + scalar_mul(H, v)
+        tag_point = scalar_mul(item, r)
         tag = tag_point.y
         if item.x == 0:
             return None
@@ -274,49 +574,51 @@ class PedersenMMR(MMR):
 
     @property
     def root(self) -> FQ:
-        return PedersenMMR.peak_bagging(self.peaks)
+        return self._snapshot.root
 
-    def get_siblings(self, position) -> List[Point]:
-        # variables to return
-        width = self.width
-        siblings = []
+    def snapshot(self) -> MMRSnapshot:
+        # Published atomically by a single assignment after every append or batch
+        return self._snapshot
 
-        sibling_map = MMR.sibling_map(width, position)
-        my_peak_height = len(sibling_map) + 1
+    def _publish(self):
+        self._snapshot = MMRSnapshot(self.bits, self.width, tuple(self.peaks), self.nodes, self.items)
 
-        # Calculate the belonging peak with siblings
-        cursor_index = MMR.leaf_index(position)
-        for i in range(my_peak_height - 1):
-            has_right_sibling = sibling_map[i] == '1'
-            if has_right_sibling:
-                cursor_index = cursor_index + (2 << i)
-                right_sibling_index = cursor_index - 1
-                siblings.append(self.nodes[right_sibling_index])
-            else:
-                cursor_index += 1
-                left_sibling_index = cursor_index - (2 << i)
-                siblings.append(self.nodes[left_sibling_index])
-        siblings = siblings + [Point.infinity()] * (self.bits - len(siblings))
-        return siblings
+    def witness_peaks(self, bits=None) -> List[Point]:
+        return self._snapshot.witness_peaks(bits)
+
+    def get_siblings(self, position, bits=None) -> List[Point]:
+        return self._snapshot.get_siblings(position, bits)
 
-    def get_inclusion_proof(self, position) -> PedersenMMRProof:
-        siblings = self.get_siblings(position)
-        return PedersenMMRProof(self.root, position, self.items[position], self.peaks, siblings)
+    def get_inclusion_proof(self, position, bits=None) -> PedersenMMRProof:
+        return self._snapshot.get_inclusion_proof(position, bits)
 
     def append(self, item: Point):
+        self._append(item)
+        self._publish()
+
+    def append_batch(self, items: List[Point]):
+        """
+        Appends the items and publishes only one snapshot.
+        """
+        for item in items:
+            self._append(item)
+        self._publish()
+
+    def _append(self, item: Point):
         new_width = self.width + 1
+        assert new_width < (1 << self.bits), "{} bits MMR can't contain {} items".format(self.bits, new_width)
 
         # Store leaf node
         # leaf_node = item * new_width
-        leaf_node = item * new_width
+        leaf_node = scalar_mul(item, new_width)
         leaf_index = MMR.leaf_index(new_width)
         self.items[new_width] = item
         self.nodes[leaf_index] = leaf_node
 
         # When it is an odd leaf
         if new_width & 1:
-            new_peaks = self.peaks
-            new_peaks[len(new_peaks) - 1] = leaf_node
+            # Copies the peaks so the published snapshot is not changed
+            new_peaks = self.peaks[:-1] + [leaf_node]
         # When it is an even leaf
         else:
             cursor = leaf_node
@@ -329,7 +631,7 @@ class PedersenMMR(MMR):
                 #
                 left_node_index = cursor_index - (1 << (height - 1))
                 left_node = self.nodes[left_node_index]
-                cursor = cursor * left_node.y
+                cursor = scalar_mul(cursor, left_node.y)
                 self.nodes[cursor_index] = cursor
 
             new_peaks = self.peaks[:-height] + [cursor] + [Point.infinity()] * (height - 1)
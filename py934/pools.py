@@ -0,0 +1,115 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, List
+
+from ethsnarks.jubjub import Point
+
+from py934.mempool import erc20_of
+from py934.mimblewimble import Transaction
+from py934.mmr import PedersenMMR, PedersenMMRProof
+from py934.rollup import appended_mmr
+
+# MMRs of the ERC20 pools which belong to the shard of the current worker process
+_shard_pools: Dict[int, PedersenMMR] = {}
+_shard_bits = 16
+
+
+def _init_shard(bits: int):
+    global _shard_bits
+    _shard_bits = bits
+    _shard_pools.clear()
+
+
+def _pool(erc20: int) -> PedersenMMR:
+    mmr = _shard_pools.get(erc20)
+    if mmr is None:
+        mmr = _shard_pools[erc20] = PedersenMMR(_shard_bits)
+    return mmr
+
+
+def _append(erc20: int, items: List[Point]) -> tuple:
+    mmr = _pool(erc20)
+    mmr.append_batch(items)
+    return mmr.root, mmr.width
+
+
+def _state(erc20: int) -> tuple:
+    mmr = _pool(erc20)
+    return mmr.root, mmr.width, list(mmr.peaks)
+
+
+def _inclusion_proof(erc20: int, position: int) -> PedersenMMRProof:
+    return _pool(erc20).get_inclusion_proof(position)
+
+
+def _plan_roll_up(erc20: int, items: List[Point]) -> tuple:
+    mmr = _pool(erc20)
+    pending = appended_mmr(mmr, items)
+    return mmr.root, mmr.width, list(mmr.peaks), pending.root, pending.width
+
+
+class PoolManager:
+    """
+    Owns one PedersenMMR for every ERC20 pool like the ERC20Pool of Ethereum934.sol.
+
+    Pools are sharded by the ERC20 address over worker processes. Every shard is a single worker process, so its
+    MMRs stay in the worker's memory and the requests for a pool are executed in order. Requests for the pools of
+    different shards run in parallel, and every method returns a Future.
+    """
+
+    def __init__(self, processes=None, bits=16):
+        self.processes = processes if processes is not None else os.cpu_count()
+        assert self.processes > 0
+        self.bits = bits
+        self.shards = [ProcessPoolExecutor(1, initializer=_init_shard, initargs=(bits,))
+                       for _ in range(self.processes)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def shard(self, erc20: int) -> ProcessPoolExecutor:
+        return self.shards[erc20 % self.processes]
+
+    @staticmethod
+    def route(metadata) -> int:
+        # The ERC20 address is in the low 160 bits of the metadata
+        return erc20_of(metadata)
+
+    def append(self, erc20: int, items: List[Point]) -> Future:
+        """
+        Future of the (root, width) after appending the items.
+        """
+        return self.shard(erc20).submit(_append, erc20, items)
+
+    def append_transactions(self, transactions: List[Transaction]) -> Dict[int, Future]:
+        """
+        Appends the outputs of the rolled up transactions to the pools of their ERC20s.
+        """
+        items = defaultdict(list)
+        for tx in transactions:
+            items[PoolManager.route(tx.kernel.metadata)] += tx.body.hh_outputs
+        return {erc20: self.append(erc20, outputs) for erc20, outputs in items.items()}
+
+    def state(self, erc20: int) -> Future:
+        """
+        Future of the (root, width, peaks) of the pool.
+        """
+        return self.shard(erc20).submit(_state, erc20)
+
+    def inclusion_proof(self, erc20: int, position: int) -> Future:
+        return self.shard(erc20).submit(_inclusion_proof, erc20, position)
+
+    def plan_roll_up(self, erc20: int, items: List[Point]) -> Future:
+        """
+        Future of the (root, width, peaks, new root, new width) for PedersenMMR.zk_roll_up_proof without changing
+        the pool.
+        """
+        return self.shard(erc20).submit(_plan_roll_up, erc20, items)
+
+    def shutdown(self):
+        for shard in self.shards:
+            shard.shutdown()
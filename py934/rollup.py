@@ -0,0 +1,273 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional, Iterable
+
+from ethsnarks.field import FQ
+from ethsnarks.jubjub import Point
+
+from py934.abi import encode_roll_up, encode_optimistic_roll_up, ROLL_UP_SIZES, OPTIMISTIC_ROLL_UP_SIZES
+from py934.constant import H
+from py934.mempool import Mempool, spending_tags, erc20_of, is_expired
+from py934.jubjub import sum_points, scalar_mul
+from py934.mimblewimble import Transaction, Output, Kernel, verify_kernels, verify_balances
+from py934.mmr import PedersenMMR
+
+# Every transaction appends 2 outputs and the roll up circuits take 1, 2, 4, ..., 64 items
+OUTPUTS_PER_TX = 2
+ROLL_UP_ITEMS = (1, 2, 4, 8, 16, 32, 64)
+# Sizes with a circuit and a roll up function of Ethereum934.sol
+ROLL_UP_TXS = tuple(sorted(qty for qty in set(ROLL_UP_SIZES) | set(OPTIMISTIC_ROLL_UP_SIZES)
+                           if qty * OUTPUTS_PER_TX in ROLL_UP_ITEMS))
+
+
+def roll_up_size(pending: int, max_txs=ROLL_UP_TXS[-1]) -> int:
+    """
+    The largest number of transactions which fills a roll up circuit.
+    """
+    fitting = [qty for qty in ROLL_UP_TXS if qty <= min(pending, max_txs)]
+    return fitting[-1] if fitting else 0
+
+
+def appended_mmr(mmr: PedersenMMR, items: List[Point]) -> PedersenMMR:
+    """
+    Appends the items to a copied MMR which only has the peak nodes, so the given MMR stays the same.
+    """
+    pending = PedersenMMR.from_peaks(mmr.bits, list(mmr.peaks))
+    pending.append_batch(items)
+    return pending
+
+
+class RollUpBlock:
+    def __init__(self, erc20: int, mmr: PedersenMMR, transactions: List[Transaction]):
+        assert len(transactions) in ROLL_UP_TXS, "Unsupported roll up size: {}".format(len(transactions))
+        self.erc20 = erc20
+        self.transactions = transactions
+        self.items: List[Point] = [output for tx in transactions for output in tx.body.hh_outputs]
+        self.root = mmr.root
+        self.width = mmr.width
+        self.peaks = list(mmr.peaks)
+        pending = appended_mmr(mmr, self.items)
+        self.new_root = pending.root
+        self.new_width = pending.width
+        self.new_peaks = pending.peaks
+        self.proof = None
+
+    def prove(self) -> dict:
+        if self.proof is None:
+            self.proof = PedersenMMR.zk_roll_up_proof(self.root, self.width, self.peaks, self.items, self.new_root)
+        return self.proof
+
+    def calldata(self, optimistic: bool = None, buffer: bytearray = None) -> memoryview:
+        """
+        rollUpN when the size has one, otherwise optimisticRollUpMimblewimble.
+        """
+        if optimistic is None:
+            optimistic = len(self.transactions) not in ROLL_UP_SIZES
+        encode = encode_optimistic_roll_up if optimistic else encode_roll_up
+        return encode(format(self.erc20, '#042x'), self.root.n, self.new_root.n, self.transactions, self.prove(),
+                      buffer)
+
+    def apply(self, mmr: PedersenMMR):
+        """
+        Appends the rolled up items to the canonical MMR after the roll up is accepted.
+        """
+        assert mmr.root == self.root and mmr.width == self.width, "MMR has been changed"
+        for item in self.items:
+            mmr.append(item)
+        assert mmr.root == self.new_root
+
+
+class RollUpBuilder:
+    def __init__(self, mmr: PedersenMMR, erc20: int, max_txs=ROLL_UP_TXS[-1]):
+        assert max_txs in ROLL_UP_TXS
+        self.mmr = mmr
+        self.erc20 = erc20
+        self.max_txs = max_txs
+
+    def select(self, candidates: Iterable[Transaction], spent_tags=(), block_number: int = None) -> List[Transaction]:
+        """
+        Picks transactions in the given order skipping the ones which spend an already picked or spent tag, belong to
+        another ERC20 pool, or are expired at `block_number`.
+        """
+        used = set(int(tag) for tag in spent_tags)
+        selected = []
+        for tx in candidates:
+            metadata = int(tx.kernel.metadata)
+            if erc20_of(metadata) != self.erc20:
+                continue
+            if block_number is not None and is_expired(metadata, block_number):
+                continue
+            tags = spending_tags(tx)
+            if used.isdisjoint(tags):
+                used.update(tags)
+                selected.append(tx)
+        return selected
+
+    def build(self, candidates: Iterable[Transaction], spent_tags=(), block_number: int = None) -> Optional[RollUpBlock]:
+        selected = self.select(candidates, spent_tags, block_number)
+        size = roll_up_size(len(selected), self.max_txs)
+        if size == 0:
+            return None
+        return RollUpBlock(self.erc20, self.mmr, selected[:size])
+
+    def build_from_mempool(self, mempool: Mempool) -> Optional[RollUpBlock]:
+        """
+        Takes the highest fee transactions as many as the largest circuit can be filled. Mempool has no conflicts.
+        """
+        size = roll_up_size(mempool.size(self.erc20), self.max_txs)
+        if size == 0:
+            return None
+        return RollUpBlock(self.erc20, self.mmr, mempool.pop_best(self.erc20, size))
+
+
+class CutThrough:
+    """
+    Removes the outputs which are created and spent in the same batch. Only the kernels of those transactions remain.
+
+    A spent tag is r * (r * G + v * H), so it can't be linked to an output without the output's opening. The
+    aggregator should know the openings of the outputs it wants to cut, e.g. the outputs of its own wallet. Because
+    the roll up functions of Ethereum934.sol append both outputs of every rolled up transaction, the cut-through set
+    is for an MMR kept by the aggregator and not for the calldata of RollUpBlock.
+    """
+
+    def __init__(self, transactions: List[Transaction], openings: Iterable[Output] = ()):
+        self.transactions = transactions
+        self.kernels: List[Kernel] = [tx.kernel for tx in transactions]
+        spent_in_batch = set(tag for tx in transactions for tag in spending_tags(tx))
+        created_in_batch = set(hh for tx in transactions for hh in tx.body.hh_outputs)
+        self.cut: List[Output] = [opening for opening in openings
+                                  if opening.hh in created_in_batch and opening.tag.n in spent_in_batch]
+        cut_outputs = set(opening.hh for opening in self.cut)
+        cut_tags = set(opening.tag.n for opening in self.cut)
+        self.items: List[Point] = [hh for tx in transactions for hh in tx.body.hh_outputs if hh not in cut_outputs]
+        self.spent_tags: List[int] = [tag for tx in transactions for tag in spending_tags(tx) if tag not in cut_tags]
+
+    @property
+    def fee(self) -> int:
+        return sum(int(kernel.fee) for kernel in self.kernels)
+
+    @property
+    def excess(self) -> Point:
+        return sum_points([kernel.hh_excess for kernel in self.kernels])
+
+    def verify_balance(self, hh_inputs: List[Point]) -> bool:
+        """
+        sum(inputs spent from outside the batch) + sum(excess) == sum(remaining outputs) + sum(fee) * H
+        The cut outputs are on both sides of the aggregated equation, so removing them keeps it balanced.
+        """
+        assert len(hh_inputs) == len(self.spent_tags)
+        return sum_points([*hh_inputs, self.excess]) == sum_points([*self.items, scalar_mul(H, self.fee)])
+
+    def new_root(self, mmr: PedersenMMR):
+        return appended_mmr(mmr, self.items).root
+
+    def apply(self, mmr: PedersenMMR):
+        for item in self.items:
+            mmr.append(item)
+
+
+class TransactionVerdict:
+    __slots__ = ('signature', 'balance', 'outputs', 'unique_tags')
+
+    def __init__(self, signature: bool, balance: Optional[bool], outputs: bool, unique_tags: bool):
+        self.signature = signature
+        self.balance = balance  # None when the input commitments are not given
+        self.outputs = outputs
+        self.unique_tags = unique_tags
+
+    @property
+    def valid(self) -> bool:
+        return self.signature and self.balance is not False and self.outputs and self.unique_tags
+
+
+class RollUpVerdict:
+    def __init__(self, roots: bool, new_root: Optional[FQ], verdicts: List[TransactionVerdict]):
+        self.roots = roots  # root == peak_bagging(peaks) and new root == recomputed root
+        self.new_root = new_root
+        self.verdicts = verdicts
+
+    @property
+    def valid(self) -> bool:
+        return self.roots and all(verdict.valid for verdict in self.verdicts)
+
+    @property
+    def invalid_transactions(self) -> List[int]:
+        return [i for i, verdict in enumerate(self.verdicts) if not verdict.valid]
+
+
+def _verify_chunk(kernels: List[Kernel], outputs: List[List[Point]], inputs: Optional[List[List[Point]]]) -> tuple:
+    signatures = verify_kernels(kernels)
+    balances = [None] * len(kernels) if inputs is None else verify_balances(kernels, inputs, outputs)
+    valid_outputs = [all(hh.valid() for hh in hh_outputs) for hh_outputs in outputs]
+    return signatures, balances, valid_outputs
+
+
+def roll_up_root(width: int, peaks: List[Point], items: List[Point]):
+    """
+    Recomputes the new root with `peak_update` like the roll up circuit does.
+    """
+    peaks = list(peaks)
+    for item in items:
+        PedersenMMR.peak_update(width, peaks, item)
+        width += 1
+    return PedersenMMR.peak_bagging(peaks)
+
+
+class RollUpValidator:
+    """
+    Checks a whole roll up before the challenge period of optimisticRollUpMimblewimble ends.
+
+    Signatures and output points are checked in chunks over a process pool while the main process checks the spent
+    tag uniqueness and recomputes the new root. The batched signature check rejects R and excess points with a small
+    order component, so its verdicts are the same as Kernel.verify_signature. Balances need the input commitments
+    which are hidden behind the spent tags, so they are only checked when `inputs` is given.
+    """
+
+    def __init__(self, processes=None, chunk_size=8, executor: Executor = None):
+        self.chunk_size = chunk_size
+        self.executor = executor if executor is not None else ProcessPoolExecutor(processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    def validate(self,
+                 root,
+                 width: int,
+                 peaks: List[Point],
+                 transactions: List[Transaction],
+                 new_root,
+                 spent_tags=(),
+                 inputs: List[List[Point]] = None) -> RollUpVerdict:
+        assert inputs is None or len(inputs) == len(transactions)
+        futures = []
+        for i in range(0, len(transactions), self.chunk_size):
+            chunk = transactions[i:i + self.chunk_size]
+            futures.append(self.executor.submit(_verify_chunk,
+                                                [tx.kernel for tx in chunk],
+                                                [tx.body.hh_outputs for tx in chunk],
+                                                None if inputs is None else inputs[i:i + self.chunk_size]))
+
+        # A tag should not be spent twice in the batch or spent before
+        used = set(int(tag) for tag in spent_tags)
+        unique_tags = []
+        for tx in transactions:
+            tags = spending_tags(tx)
+            unique_tags.append(used.isdisjoint(tags) and len(set(tags)) == len(tags))
+            used.update(tags)
+
+        computed_root = None
+        roots = width == PedersenMMR.width_from_peaks(peaks) and PedersenMMR.peak_bagging(peaks) == root
+        if roots:
+            computed_root = roll_up_root(width, peaks, [hh for tx in transactions for hh in tx.body.hh_outputs])
+            roots = computed_root == new_root
+
+        verdicts = []
+        for future in futures:
+            for signature, balance, outputs in zip(*future.result()):
+                verdicts.append(TransactionVerdict(signature, balance, outputs, unique_tags[len(verdicts)]))
+        return RollUpVerdict(roots, computed_root, verdicts)
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, Future
+from typing import Dict, List, Optional
+
+from py934.codec import point_to_hex, to_hex
+from py934.mimblewimble import Field
+from py934.mmr import PedersenMMR, MMRSnapshot
+from py934.session import read_frame, write_frame, serve_frames, SESSION_ID_SIZE, STATUS_OK
+
+# Frames are the same as the session frames, and the 16 bytes id is the request id. Payloads are JSON objects:
+# {"method": ..., "erc20": "0x..", ...}
+MAX_POSITIONS = 1024
+
+
+def encode_inclusion_proof(snapshot: MMRSnapshot, position: int) -> dict:
+    proof = snapshot.get_inclusion_proof(position)
+    return {
+        'root': to_hex(proof.root),
+        'position': position,
+        'item': point_to_hex(proof.item),
+        'peaks': [point_to_hex(peak) for peak in proof.peaks],
+        'siblings': [point_to_hex(sibling) for sibling in proof.siblings]
+    }
+
+
+class ProofCache:
+    """
+    LRU cache of the encoded inclusion proofs. A proof is keyed by the root it is built against, so a cached proof
+    never becomes wrong and old roots are only evicted by the LRU order.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._proofs = OrderedDict()  # (erc20, root, position) => encoded proof
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._proofs)
+
+    def cached(self, erc20: int, snapshot: MMRSnapshot, position: int) -> Optional[dict]:
+        key = (erc20, snapshot.root.n, position)
+        proof = self._proofs.get(key)
+        if proof is None:
+            self.misses += 1
+            return None
+        self._proofs.move_to_end(key)
+        self.hits += 1
+        return proof
+
+    def put(self, erc20: int, snapshot: MMRSnapshot, position: int, proof: dict):
+        self._proofs[(erc20, snapshot.root.n, position)] = proof
+        while len(self._proofs) > self.max_entries:
+            self._proofs.popitem(last=False)
+
+    def get(self, erc20: int, snapshot: MMRSnapshot, position: int) -> dict:
+        proof = self.cached(erc20, snapshot, position)
+        if proof is None:
+            proof = encode_inclusion_proof(snapshot, position)
+            self.put(erc20, snapshot, position, proof)
+        return proof
+
+
+def _encode_inclusion_proofs(snapshot: MMRSnapshot, positions: List[int]) -> List[dict]:
+    return [encode_inclusion_proof(snapshot, position) for position in positions]
+
+
+def _encode_siblings(snapshot: MMRSnapshot, positions: List[int]) -> List[List[List[str]]]:
+    return [[point_to_hex(sibling) for sibling in snapshot.get_siblings(position)] for position in positions]
+
+
+def _zk_inclusion_proof(snapshot: MMRSnapshot, position: int, r: Field, v: Field) -> dict:
+    return snapshot.get_inclusion_proof(position).zk_proof(r, v)
+
+
+class ProofService:
+    """
+    Serves the MMRs of an indexer to light clients, so they don't keep their own trees.
+
+    - state: root, width and peaks
+    - siblings / inclusion_proof: batched over `positions`
+    - zk_inclusion_proof: starts a proving job in the executor and returns its id. `job` polls it.
+
+    Every query reads a snapshot of the pool, so the indexer can keep appending in another thread. Siblings and the
+    cache misses are computed in `query_executor`, so a large batch does not block the other clients, and zk proving
+    jobs run in `executor`.
+    """
+
+    def __init__(self, pools: Dict[int, PedersenMMR], cache_size=4096, executor: Executor = None, max_jobs=64,
+                 query_executor: Executor = None):
+        self.pools = pools
+        self.cache = ProofCache(cache_size)
+        self.executor = executor if executor is not None else ThreadPoolExecutor(1)
+        self.query_executor = query_executor if query_executor is not None else ThreadPoolExecutor()
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, Future] = OrderedDict()
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._server = await asyncio.start_server(self.handle, host, port)
+        return self._server.sockets[0].getsockname()
+
+    async def start_unix(self, path):
+        self._server = await asyncio.start_unix_server(self.handle, path)
+        return path
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=False)
+        self.query_executor.shutdown(wait=False)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await serve_frames(reader, writer, self.dispatch)
+
+    async def dispatch(self, request_id: bytes, payload: bytes) -> bytes:
+        request = json.loads(payload)
+        assert isinstance(request, dict), "Request should be a JSON object"
+        return json.dumps(await self.query(request)).encode('utf-8')
+
+    def snapshot(self, erc20) -> MMRSnapshot:
+        mmr = self.pools.get(int(erc20, 16))
+        assert mmr is not None, "Unknown pool {}".format(erc20)
+        return mmr.snapshot()
+
+    async def query(self, request: dict):
+        method = request['method']
+        snapshot = self.snapshot(request['erc20']) if method != 'job' else None
+        if method == 'state':
+            return {'root': to_hex(snapshot.root), 'width': snapshot.width,
+                    'peaks': [point_to_hex(peak) for peak in snapshot.peaks]}
+        if method in ('siblings', 'inclusion_proof'):
+            positions = request['positions']
+            assert isinstance(positions, list) and all(isinstance(position, int) for position in positions), \
+                "Positions should be a list of integers"
+            assert 0 < len(positions) <= MAX_POSITIONS, "Too many positions"
+            loop = asyncio.get_running_loop()
+            if method == 'siblings':
+                return {'root': to_hex(snapshot.root),
+                        'siblings': await loop.run_in_executor(self.query_executor, _encode_siblings, snapshot,
+                                                               positions)}
+            erc20 = int(request['erc20'], 16)
+            proofs = [self.cache.cached(erc20, snapshot, position) for position in positions]
+            missing = [position for position, proof in zip(positions, proofs) if proof is None]
+            if missing:
+                encoded = await loop.run_in_executor(self.query_executor, _encode_inclusion_proofs, snapshot, missing)
+                computed = dict(zip(missing, encoded))
+                for position, proof in computed.items():
+                    self.cache.put(erc20, snapshot, position, proof)
+                proofs = [computed[position] if proof is None else proof for position, proof in zip(positions, proofs)]
+            return proofs
+        if method == 'zk_inclusion_proof':
+            return {'job': self.submit(snapshot, request['position'], Field(int(request['r'], 16)),
+                                       Field(int(request['v'], 16)))}
+        if method == 'job':
+            return self.job(request['job'])
+        raise ValueError("Unknown method: {}".format(method))
+
+    def submit(self, snapshot: MMRSnapshot, position: int, r: Field, v: Field) -> str:
+        # Checks the position before queueing the job
+        assert 0 < position <= snapshot.width, "Position {} is out of the snapshot".format(position)
+        while len(self._jobs) >= self.max_jobs:
+            job_id, future = next(iter(self._jobs.items()))
+            assert future.done(), "Too many pending jobs"
+            del self._jobs[job_id]
+        job_id = os.urandom(SESSION_ID_SIZE).hex()
+        self._jobs[job_id] = self.executor.submit(_zk_inclusion_proof, snapshot, position, r, v)
+        return job_id
+
+    def job(self, job_id: str) -> dict:
+        future = self._jobs.get(job_id)
+        assert future is not None, "Unknown job"
+        if not future.done():
+            return {'status': 'pending'}
+        del self._jobs[job_id]
+        error = future.exception()
+        if error is not None:
+            return {'status': 'error', 'error': repr(error)}
+        return {'status': 'done', 'proof': future.result()}
+
+
+class ProofClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port))
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path))
+
+    async def call(self, request: dict):
+        request_id = os.urandom(SESSION_ID_SIZE)
+        write_frame(self.writer, request_id, json.dumps(request).encode('utf-8'))
+        await self.writer.drain()
+        replied_id, reply = await read_frame(self.reader)
+        assert replied_id == request_id
+        assert reply[0] == STATUS_OK, reply[1:].decode('utf-8')
+        return json.loads(reply[1:])
+
+    async def state(self, erc20: int) -> dict:
+        return await self.call({'method': 'state', 'erc20': to_hex(erc20)})
+
+    async def siblings(self, erc20: int, positions: List[int]) -> dict:
+        return await self.call({'method': 'siblings', 'erc20': to_hex(erc20), 'positions': positions})
+
+    async def inclusion_proofs(self, erc20: int, positions: List[int]) -> List[dict]:
+        return await self.call({'method': 'inclusion_proof', 'erc20': to_hex(erc20), 'positions': positions})
+
+    async def zk_inclusion_proof(self, erc20: int, position: int, r: Field, v: Field) -> str:
+        reply = await self.call({'method': 'zk_inclusion_proof', 'erc20': to_hex(erc20), 'position': position,
+                                 'r': to_hex(r), 'v': to_hex(v)})
+        return reply['job']
+
+    async def job(self, job_id: str) -> dict:
+        return await self.call({'method': 'job', 'job': job_id})
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
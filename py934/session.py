@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, Tuple
+
+from py934.codec import VERSION, KIND_REQUEST, KIND_RESPONSE
+from py934.mimblewimble import TxSend, TxReceive, Request, Response, Transaction
+
+SESSION_ID_SIZE = 16
+# length(4) | session id(16) | payload
+FRAME_HEADER_SIZE = 4 + SESSION_ID_SIZE
+MAX_FRAME_SIZE = 1 << 20
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    header = await reader.readexactly(FRAME_HEADER_SIZE)
+    length = int.from_bytes(header[:4], 'little')
+    assert length <= MAX_FRAME_SIZE, "Too large frame: {}".format(length)
+    return header[4:], await reader.readexactly(length)
+
+
+def write_frame(writer: asyncio.StreamWriter, session_id: bytes, payload: bytes):
+    assert len(session_id) == SESSION_ID_SIZE
+    writer.write(len(payload).to_bytes(4, 'little') + session_id + payload)
+
+
+async def serve_frames(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                       handler: Callable[[bytes, bytes], Awaitable[bytes]]):
+    """
+    Replies to every frame with a status byte and the result of `handler`. Errors are replied with STATUS_ERROR, and
+    a too large frame also closes the connection, because its payload is left unread.
+    """
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(FRAME_HEADER_SIZE)
+                session_id, length = header[4:], int.from_bytes(header[:4], 'little')
+                if length > MAX_FRAME_SIZE:
+                    write_frame(writer, session_id, bytes([STATUS_ERROR]) + b'Too large frame')
+                    await writer.drain()
+                    break
+                payload = await reader.readexactly(length)
+            except asyncio.IncompleteReadError:
+                break
+            try:
+                reply = bytes([STATUS_OK]) + await handler(session_id, payload)
+            except (AssertionError, ValueError) as error:
+                reply = bytes([STATUS_ERROR]) + str(error).encode('utf-8')
+            except Exception as error:
+                reply = bytes([STATUS_ERROR]) + repr(error).encode('utf-8')
+            write_frame(writer, session_id, reply)
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+class SessionStore:
+    """
+    Pending TxSend objects keyed by the session id. Every session has the same TTL, so the insertion order is also
+    the expiration order and the eviction only looks at the oldest sessions.
+    """
+
+    def __init__(self, ttl=600, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._sessions = OrderedDict()  # session id => (deadline, TxSend)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def open(self, tx_send: TxSend) -> bytes:
+        self.evict()
+        session_id = os.urandom(SESSION_ID_SIZE)
+        self._sessions[session_id] = (self.clock() + self.ttl, tx_send)
+        return session_id
+
+    def get(self, session_id: bytes) -> Optional[TxSend]:
+        self.evict()
+        session = self._sessions.get(session_id)
+        return None if session is None else session[1]
+
+    def close(self, session_id: bytes) -> Optional[TxSend]:
+        session = self._sessions.pop(session_id, None)
+        return None if session is None else session[1]
+
+    def evict(self) -> int:
+        now = self.clock()
+        evicted = 0
+        while self._sessions:
+            session_id, (deadline, _) = next(iter(self._sessions.items()))
+            if deadline > now:
+                break
+            del self._sessions[session_id]
+            evicted += 1
+        return evicted
+
+
+def _merge(tx_send: TxSend, response: Response) -> bytes:
+    return tx_send.merge(response).to_bytes()
+
+
+def _respond(tx_receive: TxReceive) -> bytes:
+    return tx_receive.response.serialize()
+
+
+class SessionServer:
+    """
+    Relays the interactive transfers.
+
+    - Sender side: `open(tx_send)` stores the TxSend and returns the session id with the serialized request. When the
+      recipient sends back the serialized Response with the session id, the server merges it and replies with the
+      proven transaction.
+    - Recipient side: a serialized Request is handed to `receiver`, which returns the TxReceive of the recipient's
+      output. The server replies with its serialized Response.
+
+    Range proofs and Mimblewimble proofs run in the executor, so the event loop keeps serving other sessions.
+    """
+
+    def __init__(self,
+                 receiver: Callable[[Request], TxReceive] = None,
+                 ttl=600,
+                 executor: Executor = None):
+        self.receiver = receiver
+        self.sessions = SessionStore(ttl)
+        self.executor = executor if executor is not None else ThreadPoolExecutor()
+        self._server = None
+
+    def open(self, tx_send: TxSend) -> Tuple[bytes, bytes]:
+        return self.sessions.open(tx_send), tx_send.request.serialize()
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._server = await asyncio.start_server(self.handle, host, port)
+        return self._server.sockets[0].getsockname()
+
+    async def start_unix(self, path):
+        self._server = await asyncio.start_unix_server(self.handle, path)
+        return path
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await serve_frames(reader, writer, self.dispatch)
+
+    async def dispatch(self, session_id: bytes, payload: bytes) -> bytes:
+        assert len(payload) >= 2 and payload[0] == VERSION, "Unsupported message"
+        loop = asyncio.get_running_loop()
+        if payload[1] == KIND_RESPONSE:
+            response = Response.deserialize(payload)
+            # Claims the session before merging, so a concurrent response can't merge the same TxSend
+            self.sessions.evict()
+            tx_send = self.sessions.close(session_id)
+            assert tx_send is not None, "Unknown or expired session"
+            return await loop.run_in_executor(self.executor, _merge, tx_send, response)
+        if payload[1] == KIND_REQUEST:
+            assert self.receiver is not None, "This server does not receive transfers"
+            tx_receive = self.receiver(Request.deserialize(payload))
+            return await loop.run_in_executor(self.executor, _respond, tx_receive)
+        raise ValueError("Unsupported message kind: {}".format(payload[1]))
+
+
+class SessionClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port):
+        return cls(*await asyncio.open_connection(host, port))
+
+    @classmethod
+    async def connect_unix(cls, path):
+        return cls(*await asyncio.open_unix_connection(path))
+
+    async def call(self, session_id: bytes, payload: bytes) -> bytes:
+        write_frame(self.writer, session_id, payload)
+        await self.writer.drain()
+        replied_id, reply = await read_frame(self.reader)
+        assert replied_id == session_id
+        assert reply[0] == STATUS_OK, reply[1:].decode('utf-8')
+        return reply[1:]
+
+    async def request(self, session_id: bytes, request: Request) -> Response:
+        return Response.deserialize(await self.call(session_id, request.serialize()))
+
+    async def respond(self, session_id: bytes, response: Response) -> Transaction:
+        return Transaction.from_bytes(await self.call(session_id, response.serialize()))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
@@ -0,0 +1,132 @@
+from typing import List, Iterator, Tuple
+
+from ethsnarks.field import FQ
+from ethsnarks.jubjub import Point
+
+from py934.codec import Reader, encode_scalar, encode_point, decode_point, encode_proof, decode_proof, POINT_SIZE, \
+    PROOF_SIZE
+from py934.mimblewimble import Transaction
+
+# Kinds of the records in the log
+RECORD_TRANSACTION = 1
+RECORD_ROLL_UP = 2
+RECORD_MMR_DELTA = 3
+
+# kind(1) | payload length(4)
+RECORD_HEADER_SIZE = 5
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+
+class MMRDelta:
+    """
+    Items appended to the MMR by a roll up.
+    """
+
+    def __init__(self, root: FQ, width: int, items: List[Point], new_root: FQ):
+        self.root = root
+        self.width = width
+        self.items = items
+        self.new_root = new_root
+
+    def encode(self) -> bytes:
+        # root(32) | width(4) | n(2) | items(32 * n) | new root(32)
+        return encode_scalar(self.root) + \
+               self.width.to_bytes(4, 'little') + \
+               len(self.items).to_bytes(2, 'little') + \
+               b''.join(encode_point(item) for item in self.items) + \
+               encode_scalar(self.new_root)
+
+    @classmethod
+    def decode(cls, data) -> 'MMRDelta':
+        reader = Reader(data)
+        root = FQ(reader.read_scalar())
+        width = int.from_bytes(reader.read(4), 'little')
+        items = [decode_point(reader.read(POINT_SIZE)) for _ in range(int.from_bytes(reader.read(2), 'little'))]
+        delta = cls(root, width, items, FQ(reader.read_scalar()))
+        reader.finish()
+        return delta
+
+
+def encode_roll_up(roll_up_proof: dict) -> bytes:
+    # proof(256) | n(2) | inputs(32 * n)
+    inputs = roll_up_proof['inputs']
+    return b''.join([encode_proof(roll_up_proof),
+                     len(inputs).to_bytes(2, 'little'),
+                     b''.join(encode_scalar(int(value, 16)) for value in inputs)])
+
+
+def decode_roll_up(data) -> dict:
+    reader = Reader(data)
+    proof = reader.read(PROOF_SIZE)
+    inputs = [reader.read_scalar() for _ in range(int.from_bytes(reader.read(2), 'little'))]
+    reader.finish()
+    return decode_proof(proof, inputs)
+
+
+_DECODERS = {
+    RECORD_TRANSACTION: Transaction.from_bytes,
+    RECORD_ROLL_UP: decode_roll_up,
+    RECORD_MMR_DELTA: MMRDelta.decode
+}
+
+
+class RecordWriter:
+    """
+    Appends length-prefixed records to a single log file through a write buffer.
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.file = open(path, 'ab', buffering=buffer_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def append(self, kind: int, payload: bytes):
+        assert kind in _DECODERS, "Unknown record kind: {}".format(kind)
+        self.file.write(bytes([kind]) + len(payload).to_bytes(4, 'little'))
+        self.file.write(payload)
+
+    def append_transaction(self, tx: Transaction):
+        self.append(RECORD_TRANSACTION, tx.to_bytes())
+
+    def append_roll_up(self, roll_up_proof: dict):
+        self.append(RECORD_ROLL_UP, encode_roll_up(roll_up_proof))
+
+    def append_mmr_delta(self, delta: MMRDelta):
+        self.append(RECORD_MMR_DELTA, delta.encode())
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_raw_records(path, buffer_size=DEFAULT_BUFFER_SIZE) -> Iterator[Tuple[int, bytes]]:
+    with open(path, 'rb', buffering=buffer_size) as f:
+        while True:
+            header = f.read(RECORD_HEADER_SIZE)
+            if not header:
+                return
+            assert len(header) == RECORD_HEADER_SIZE, "Truncated record header"
+            length = int.from_bytes(header[1:], 'little')
+            payload = f.read(length)
+            assert len(payload) == length, "Truncated record"
+            yield header[0], payload
+
+
+def read_records(path, kinds=None, buffer_size=DEFAULT_BUFFER_SIZE) -> Iterator[Tuple[int, object]]:
+    """
+    Replays the log sequentially. Records of which kind is not in `kinds` are skipped without decoding.
+    """
+    for kind, payload in read_raw_records(path, buffer_size):
+        if kinds is None or kind in kinds:
+            yield kind, _DECODERS[kind](payload)
+
+
+def read_transactions(path, buffer_size=DEFAULT_BUFFER_SIZE) -> Iterator[Transaction]:
+    for _, tx in read_records(path, (RECORD_TRANSACTION,), buffer_size):
+        yield tx
@@ -0,0 +1,197 @@
+import math
+import mmap
+import os
+from hashlib import blake2b
+from typing import Dict, List, Iterable
+
+from py934.codec import Reader, encode_header, KIND_TAGS
+
+# Tag states of ERC20Pool.tags in Ethereum934.sol
+UNSPENT = 0
+SPENDING = 1
+SPENT = 2
+
+# Slot of the tag table: erc20(20) | tag(32) | state(1). An Unspent state marks an empty slot.
+TAG_RECORD_SIZE = 53
+_STATE_OFFSET = TAG_RECORD_SIZE - 1
+# header(2) | key(16) | slots(8)
+TAG_TABLE_HEADER_SIZE = 26
+
+
+class BloomFilter:
+    """
+    Bit array with k indexes from the double hashing of one keyed blake2b digest. The key is random per filter, so the
+    false positives can't be targeted by chosen tags.
+    """
+
+    def __init__(self, capacity=1 << 20, error_rate=0.001, key: bytes = None):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.key = key if key is not None else os.urandom(16)
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _indexes(self, tag: int):
+        digest = blake2b(tag.to_bytes(32, 'little'), digest_size=16, key=self.key).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, tag: int):
+        bits = self._bits
+        for index in self._indexes(tag):
+            bits[index >> 3] |= 1 << (index & 7)
+
+    def __contains__(self, tag: int):
+        bits = self._bits
+        return all(bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(tag))
+
+
+class SpentTagStore:
+    """
+    Spending and spent tags of every ERC20 pool, mirroring ERC20Pool.tags of Ethereum934.sol.
+
+    Tags are stored in an open addressing hash table of fixed size slots in a memory mapped file, or in anonymous
+    memory without a path. A tag only moves forward from Unspent to Spending to Spent, so a slot is only written once
+    and then its state byte is raised. The erc20 and the tag are written before the state byte, so a slot cut by a
+    crash stays empty. When the table is half full, it is rebuilt into a twice larger file which replaces the old one.
+
+    Each pool has a Bloom filter in memory, which is filled by one scan of the table on start up. Queries for unspent
+    tags are mostly answered by the filter without reading the table.
+    """
+
+    def __init__(self, path=None, capacity=1 << 20, error_rate=0.001, slots=1024):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._blooms: Dict[int, BloomFilter] = {}
+        self._count = 0
+        if path is not None and os.path.exists(path):
+            self._open()
+        else:
+            self.key = os.urandom(16)
+            self.slots = slots
+            self._table = self._new_table(slots)
+            self._commit_table()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._table is not None:
+            if self.path is not None:
+                self._table.flush()
+            self._table.close()
+            self._table = None
+
+    def __len__(self):
+        return self._count
+
+    def _new_table(self, slots: int) -> mmap.mmap:
+        size = TAG_TABLE_HEADER_SIZE + TAG_RECORD_SIZE * slots
+        if self.path is None:
+            table = mmap.mmap(-1, size)
+        else:
+            # Written to a temporary file first and replaces the table in `_commit_table`
+            with open(self.path + '.tmp', 'w+b') as f:
+                f.truncate(size)
+                table = mmap.mmap(f.fileno(), size)
+        table[:TAG_TABLE_HEADER_SIZE] = encode_header(KIND_TAGS) + self.key + slots.to_bytes(8, 'little')
+        return table
+
+    def _commit_table(self):
+        if self.path is not None:
+            self._table.flush()
+            os.replace(self.path + '.tmp', self.path)
+
+    def _open(self):
+        with open(self.path, 'r+b') as f:
+            table = mmap.mmap(f.fileno(), 0)
+        reader = Reader(table[:TAG_TABLE_HEADER_SIZE])
+        reader.read_header(KIND_TAGS)
+        self.key = bytes(reader.read(16))
+        self.slots = int.from_bytes(reader.read(8), 'little')
+        assert len(table) == TAG_TABLE_HEADER_SIZE + TAG_RECORD_SIZE * self.slots, "Broken tag table"
+        self._table = table
+        for offset in range(TAG_TABLE_HEADER_SIZE, len(table), TAG_RECORD_SIZE):
+            if table[offset + _STATE_OFFSET] != UNSPENT:
+                self._bloom(int.from_bytes(table[offset:offset + 20], 'big')).add(
+                    int.from_bytes(table[offset + 20:offset + 52], 'little'))
+                self._count += 1
+
+    def _bloom(self, erc20: int) -> BloomFilter:
+        bloom = self._blooms.get(erc20)
+        if bloom is None:
+            bloom = self._blooms[erc20] = BloomFilter(self.capacity, self.error_rate)
+        return bloom
+
+    def _find(self, record_key: bytes) -> int:
+        """
+        Offset of the slot of the key, or of the empty slot where it would be inserted.
+        """
+        table = self._table
+        index = int.from_bytes(blake2b(record_key, digest_size=8, key=self.key).digest(), 'little') % self.slots
+        while True:
+            offset = TAG_TABLE_HEADER_SIZE + TAG_RECORD_SIZE * index
+            if table[offset + _STATE_OFFSET] == UNSPENT or table[offset:offset + _STATE_OFFSET] == record_key:
+                return offset
+            index = (index + 1) % self.slots
+
+    def _grow(self):
+        old = self._table
+        self.slots *= 2
+        self._table = self._new_table(self.slots)
+        for offset in range(TAG_TABLE_HEADER_SIZE, len(old), TAG_RECORD_SIZE):
+            if old[offset + _STATE_OFFSET] != UNSPENT:
+                new_offset = self._find(old[offset:offset + _STATE_OFFSET])
+                self._table[new_offset:new_offset + TAG_RECORD_SIZE] = old[offset:offset + TAG_RECORD_SIZE]
+        self._commit_table()
+        old.close()
+
+    def _set(self, erc20: int, tag: int, state: int) -> bool:
+        record_key = erc20.to_bytes(20, 'big') + tag.to_bytes(32, 'little')
+        offset = self._find(record_key)
+        current = self._table[offset + _STATE_OFFSET]
+        if current >= state:
+            return False
+        if current == UNSPENT:
+            if 2 * (self._count + 1) > self.slots:
+                self._grow()
+                offset = self._find(record_key)
+            self._table[offset:offset + _STATE_OFFSET] = record_key
+            self._count += 1
+            self._bloom(erc20).add(tag)
+        self._table[offset + _STATE_OFFSET] = state
+        return True
+
+    def mark(self, erc20: int, tags: Iterable[int], state: int):
+        assert state in (SPENDING, SPENT)
+        for tag in tags:
+            self._set(erc20, int(tag), state)
+
+    def mark_spending(self, erc20: int, tags: Iterable[int]):
+        self.mark(erc20, tags, SPENDING)
+
+    def mark_spent(self, erc20: int, tags: Iterable[int]):
+        self.mark(erc20, tags, SPENT)
+
+    def state(self, erc20: int, tag: int) -> int:
+        bloom = self._blooms.get(erc20)
+        if bloom is None or int(tag) not in bloom:
+            return UNSPENT
+        offset = self._find(erc20.to_bytes(20, 'big') + int(tag).to_bytes(32, 'little'))
+        return self._table[offset + _STATE_OFFSET]
+
+    def states(self, erc20: int, tags: Iterable[int]) -> List[int]:
+        return [self.state(erc20, tag) for tag in tags]
+
+    def is_spent(self, erc20: int, tags: Iterable[int]) -> List[bool]:
+        """
+        Spending tags are also reported, because the contract rejects them as well.
+        """
+        return [self.state(erc20, tag) != UNSPENT for tag in tags]
+
+    def any_spent(self, erc20: int, tags: Iterable[int]) -> bool:
+        return any(self.state(erc20, tag) != UNSPENT for tag in tags)
@@ -0,0 +1,164 @@
+import os
+from bisect import bisect_left, insort
+from typing import List, Optional, Dict
+
+from ethsnarks.field import FQ
+from ethsnarks.jubjub import Point
+
+from py934.codec import Reader, encode_header, encode_scalar, encode_proof, decode_proof, KIND_WALLET, PROOF_SIZE
+from py934.mimblewimble import Output, Field
+
+# Number of the largest TXOs tried as the first input when no single TXO covers the amount
+PAIR_CANDIDATES = 8
+
+
+class WalletEntry:
+    __slots__ = ('output', 'tag', 'position', 'inclusion_proof')
+
+    def __init__(self, output: Output, tag: int, position: Optional[int], inclusion_proof: Optional[dict]):
+        self.output = output
+        self.tag = tag
+        self.position = position  # MMR position. None for deposits which are not rolled up yet
+        self.inclusion_proof = inclusion_proof  # zk inclusion proof for the SendTxBuilder
+
+    @property
+    def value(self) -> int:
+        return self.output.v.n
+
+
+class Wallet:
+    """
+    Owned TXOs keyed by their spent tags with an index sorted by value, so the coin selection is a binary search.
+    """
+
+    def __init__(self):
+        self._entries: Dict[int, WalletEntry] = {}
+        self._index = []  # [(value, tag)] sorted
+        self.balance = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, tag):
+        return int(tag) in self._entries
+
+    def __iter__(self):
+        return (self._entries[tag] for _, tag in self._index)
+
+    def get(self, tag) -> Optional[WalletEntry]:
+        return self._entries.get(int(tag))
+
+    def add(self, output: Output, position: int = None, inclusion_proof: dict = None) -> WalletEntry:
+        tag = output.tag.n
+        assert tag not in self._entries, "Already exists"
+        entry = WalletEntry(output, tag, position, inclusion_proof)
+        self._entries[tag] = entry
+        insort(self._index, (entry.value, tag))
+        self.balance += entry.value
+        return entry
+
+    def remove(self, tag) -> Optional[WalletEntry]:
+        entry = self._entries.pop(int(tag), None)
+        if entry is not None:
+            i = bisect_left(self._index, (entry.value, entry.tag))
+            del self._index[i]
+            self.balance -= entry.value
+        return entry
+
+    def spend(self, tags) -> List[WalletEntry]:
+        """
+        Removes the TXOs of which tags are spent on chain.
+        """
+        return [entry for entry in (self.remove(tag) for tag in tags) if entry is not None]
+
+    def update(self, tag, position: int = None, inclusion_proof: dict = None):
+        entry = self._entries[int(tag)]
+        if position is not None:
+            entry.position = position
+        if inclusion_proof is not None:
+            entry.inclusion_proof = inclusion_proof
+
+    def select(self, value: int, fee: int = 0) -> Optional[List[WalletEntry]]:
+        """
+        Picks 1 or 2 TXOs for the SendTxBuilder which cover value + fee with the smallest change.
+        A single TXO is preferred. Returns None when the wallet can't afford it.
+        """
+        target = int(value) + int(fee)
+        index = self._index
+        # The smallest TXO covering the target
+        i = bisect_left(index, (target,))
+        if i < len(index):
+            return [self._entries[index[i][1]]]
+        best = None
+        for first in range(len(index) - 1, max(-1, len(index) - 1 - PAIR_CANDIDATES), -1):
+            first_value = index[first][0]
+            j = bisect_left(index, (target - first_value,))
+            if j == first:
+                j += 1
+            if j == len(index):
+                continue
+            total = first_value + index[j][0]
+            if best is None or total < best[0]:
+                best = (total, first, j)
+        if best is None:
+            return None
+        return [self._entries[index[best[1]][1]], self._entries[index[best[2]][1]]]
+
+    def to_bytes(self) -> bytes:
+        """
+        header(2) | n(4) | entries
+        entry: r(32) | v(32) | hh.x(32) | hh.y(32) | tag(32) | position(4, 0 if none) | flag(1) | [root(32) | proof(256)]
+        Points are not compressed because the decompression is much slower than reading the coordinates.
+        """
+        encoded = [encode_header(KIND_WALLET), len(self._entries).to_bytes(4, 'little')]
+        for entry in self:
+            output = entry.output
+            encoded += [encode_scalar(output.r), encode_scalar(output.v), encode_scalar(output.hh.x),
+                        encode_scalar(output.hh.y), encode_scalar(entry.tag), (entry.position or 0).to_bytes(4, 'little')]
+            if entry.inclusion_proof is None:
+                encoded.append(b'\x00')
+            else:
+                encoded += [b'\x01', encode_scalar(int(entry.inclusion_proof['inputs'][0], 16)),
+                            encode_proof(entry.inclusion_proof)]
+        return b''.join(encoded)
+
+    @classmethod
+    def from_bytes(cls, data) -> 'Wallet':
+        """
+        Commitments and tags are recomputed from the openings, so a tampered wallet file is rejected.
+        """
+        reader = Reader(data)
+        count = reader.read_batch_header(KIND_WALLET)
+        wallet = cls()
+        records = []
+        for _ in range(count):
+            r, v, x, y, tag = [reader.read_scalar() for _ in range(5)]
+            position = int.from_bytes(reader.read(4), 'little') or None
+            inclusion_proof = None
+            if reader.read_byte():
+                root = reader.read_scalar()
+                inclusion_proof = decode_proof(reader.read(PROOF_SIZE), [root, tag, 1])
+            records.append((Field(r), Field(v), Point(FQ(x), FQ(y)), tag, position, inclusion_proof))
+        reader.finish()
+        rs, vs, hhs = [[record[i] for record in records] for i in range(3)]
+        outputs = Output.open_batch(rs, vs, hhs)
+        assert all(output.tag.n == record[3] for output, record in zip(outputs, records)), "Wrong tag"
+        entries = [WalletEntry(output, tag, position, inclusion_proof)
+                   for output, (_, _, _, tag, position, inclusion_proof) in zip(outputs, records)]
+        # Entries are stored in the value order
+        wallet._entries = {entry.tag: entry for entry in entries}
+        wallet._index = [(entry.value, entry.tag) for entry in entries]
+        wallet.balance = sum(entry.value for entry in entries)
+        return wallet
+
+    def save(self, path):
+        # Writes to a temporary file first, so a crash does not leave a broken wallet
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path) -> 'Wallet':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
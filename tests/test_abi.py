@@ -0,0 +1,89 @@
+import json
+import os
+import unittest
+
+import eth_abi
+
+from py934.abi import mw_tx_words, encode_mw_txs, encode_roll_up, encode_optimistic_roll_up, ROLL_UP_SELECTORS, \
+    OPTIMISTIC_ROLL_UP_SELECTOR, roll_up_calldata_size
+from py934.mimblewimble import Transaction
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+ERC20 = '0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c'
+# eth_abi >= 2.0 renamed encode_abi to encode
+encode = getattr(eth_abi, 'encode', None) or eth_abi.encode_abi
+
+
+def load(name):
+    with open(os.path.join(DATASET_PATH, name + '.json')) as f:
+        return json.load(f)
+
+
+def flatten_proof(proof):
+    return [int(val, 16) for val in [*proof['a'], *proof['b'][0], *proof['b'][1], *proof['c']]]
+
+
+def flatten_tx(tx):
+    # Same with flattenTx() of Ethereum934.test.js
+    words = [int(tx['kernel']['fee'], 16), int(tx['kernel']['metadata'], 16)]
+    for tag, inclusion_proof in zip(tx['body']['hh_input_tags'], tx['inclusion_proofs']):
+        if inclusion_proof is None:
+            words += [int(tag, 16), 1] + [0] * 8
+        else:
+            words += [int(tag, 16), int(inclusion_proof['inputs'][0], 16)] + flatten_proof(inclusion_proof['proof'])
+    for output, range_proof in zip(tx['body']['hh_outputs'], tx['range_proofs']):
+        words += [int(val, 16) for val in output] + flatten_proof(range_proof['proof'])
+    words += [int(val, 16) for val in tx['kernel']['signature']['R']] + flatten_proof(tx['mimblewimble_proof']['proof'])
+    return words
+
+
+class TestCalldata(unittest.TestCase):
+    def setUp(self):
+        self.dataset = [load('tx{}'.format(i)) for i in range(1, 9)]
+        self.transactions = [Transaction.from_dict(data) for data in self.dataset]
+        self.roll_up = load('rollUp1')
+        self.root = int(self.roll_up['inputs'][0], 16)
+        self.new_root = int(self.roll_up['inputs'][-2], 16)
+
+    def args(self, qty):
+        return [ERC20, self.root, self.new_root, [flatten_tx(data) for data in self.dataset[:qty]],
+                flatten_proof(self.roll_up['proof'])]
+
+    def test_mw_tx_words(self):
+        for data, tx in zip(self.dataset, self.transactions):
+            self.assertEqual(mw_tx_words(tx), flatten_tx(data))
+            self.assertEqual(mw_tx_words(Transaction.from_bytes(tx.to_bytes())), flatten_tx(data))
+        self.assertEqual(encode_mw_txs(self.transactions[:2]),
+                         encode(['uint256[52][2]'], [[flatten_tx(data) for data in self.dataset[:2]]]))
+
+    def test_roll_up(self):
+        for qty in [1, 2, 4]:
+            calldata = encode_roll_up(ERC20, self.root, self.new_root, self.transactions[:qty], self.roll_up)
+            expected = ROLL_UP_SELECTORS[qty] + encode(
+                ['address', 'uint256', 'uint256', 'uint256[52][{}]'.format(qty), 'uint256[8]'], self.args(qty))
+            self.assertEqual(bytes(calldata), expected)
+        with self.assertRaises(AssertionError):
+            encode_roll_up(ERC20, self.root, self.new_root, self.transactions[:3], self.roll_up)
+
+    def test_optimistic_roll_up(self):
+        for qty in [4, 8]:
+            calldata = encode_optimistic_roll_up(ERC20, self.root, self.new_root, self.transactions[:qty],
+                                                 self.roll_up)
+            expected = OPTIMISTIC_ROLL_UP_SELECTOR + encode(
+                ['address', 'uint256', 'uint256', 'uint256[52][]', 'uint256[8]'], self.args(qty))
+            self.assertEqual(bytes(calldata), expected)
+
+    def test_preallocated_buffer(self):
+        buffer = bytearray(roll_up_calldata_size(4))
+        for qty in [4, 1]:
+            calldata = encode_roll_up(ERC20, self.root, self.new_root, self.transactions[:qty], self.roll_up, buffer)
+            self.assertIs(calldata.obj, buffer)
+            self.assertEqual(bytes(calldata),
+                             bytes(encode_roll_up(ERC20, self.root, self.new_root, self.transactions[:qty],
+                                                  self.roll_up)))
+        with self.assertRaises(AssertionError):
+            encode_roll_up(ERC20, self.root, self.new_root, self.transactions[:4], self.roll_up, bytearray(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import os
+import unittest
+
+from ethsnarks.field import FQ
+from ethsnarks.jubjub import Point
+from ethsnarks.pedersen import pedersen_hash_bits
+
+from py934.challenge import ChallengeHasher
+from py934.constant import G
+from py934.mimblewimble import Field, Transaction
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+
+
+def reference_challenge(hh_excess: Point, hh_sig_salt: Point, fee: Field, metadata: Field) -> Field:
+    concatenated_source = metadata.bits() + fee.bits() + hh_sig_salt.y.bits() + hh_excess.y.bits()
+    concatenated_source.reverse()
+    return Field(pedersen_hash_bits(b'Ethereum934', concatenated_source).y.n)
+
+
+class TestChallenge(unittest.TestCase):
+    def setUp(self):
+        self.hasher = ChallengeHasher()
+
+    def test_same_with_pedersen_hash_bits(self):
+        for _ in range(3):
+            hh_excess = Field.random() * G
+            hh_sig_salt = Field.random() * G
+            fee = Field.random(1, 100)
+            metadata = Field.random()
+            self.assertEqual(self.hasher.challenge(hh_excess, hh_sig_salt, fee, metadata),
+                             reference_challenge(hh_excess, hh_sig_salt, fee, metadata))
+
+    def test_dataset_signatures(self):
+        items = []
+        signatures = []
+        for i in [1, 4, 30]:
+            with open(os.path.join(DATASET_PATH, 'tx{}.json'.format(i))) as f:
+                kernel = json.load(f)['kernel']
+            hh_excess = Point(*[FQ(int(val, 16)) for val in kernel['hh_excess']])
+            hh_sig_salt = Point(*[FQ(int(val, 16)) for val in kernel['signature']['R']])
+            items.append((hh_excess, hh_sig_salt, Field(int(kernel['fee'], 16)), Field(int(kernel['metadata'], 16))))
+            signatures.append(Field(int(kernel['signature']['s'], 16)))
+        challenges = self.hasher.challenges(items)
+        for (hh_excess, hh_sig_salt, _, _), s, challenge in zip(items, signatures, challenges):
+            self.assertEqual(s * G, hh_sig_salt + challenge * hh_excess)
+
+    def test_cache(self):
+        hasher = ChallengeHasher(cache_size=1)
+        args = (Field(3) * G, Field(4) * G, Field(5), Field(6))
+        challenge = hasher.challenge(*args)
+        self.assertEqual(hasher.challenge(*args), challenge)
+        self.assertEqual(len(hasher._cache), 1)
+        hasher.challenge(Field(7) * G, Field(4) * G, Field(5), Field(6))
+        self.assertEqual(len(hasher._cache), 1)
+        self.assertEqual(Transaction.create_challenge(*args), challenge)
+
+
+if __name__ == '__main__':
+    unittest.main()
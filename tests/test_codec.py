@@ -0,0 +1,95 @@
+import glob
+import json
+import os
+import pickle
+import unittest
+
+from py934.constant import G
+from py934.mimblewimble import Transaction, Kernel, Body, Request, Response, Field
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+
+
+class TestTransactionCodec(unittest.TestCase):
+    def setUp(self):
+        self.dataset = []
+        for path in sorted(glob.glob(os.path.join(DATASET_PATH, 'tx*.json'))):
+            with open(path) as f:
+                self.dataset.append(json.load(f))
+
+    def test_dict_round_trip(self):
+        for data in self.dataset:
+            self.assertEqual(Transaction.from_dict(data).to_dict(), data)
+
+    def test_bytes_round_trip(self):
+        for data in self.dataset:
+            encoded = Transaction.from_dict(data).to_bytes()
+            self.assertLess(len(encoded) * 3, len(json.dumps(data)))
+            decoded = Transaction.from_bytes(encoded)
+            self.assertEqual(decoded.to_dict(), data)
+            self.assertEqual(decoded.to_bytes(), encoded)
+
+    def test_lazy_decompression(self):
+        tx = Transaction.from_dict(self.dataset[0])
+        decoded = Transaction.from_bytes(tx.to_bytes())
+        self.assertIn('hh_excess', decoded.kernel._lazy)
+        self.assertIn('hh_outputs', decoded.body._lazy)
+        self.assertEqual(decoded.kernel.hh_excess, tx.kernel.hh_excess)
+        self.assertNotIn('hh_excess', decoded.kernel._lazy)
+        self.assertEqual(pickle.loads(pickle.dumps(decoded)).to_dict(), self.dataset[0])
+
+    def test_kernel_and_body(self):
+        tx = Transaction.from_dict(self.dataset[1])
+        kernel = Kernel.from_bytes(tx.kernel.to_bytes())
+        self.assertEqual(kernel.to_dict(), tx.kernel.to_dict())
+        self.assertTrue(kernel.verify_signature())
+        body = Body.from_bytes(tx.body.to_bytes())
+        self.assertEqual(body.to_dict(), tx.body.to_dict())
+        with self.assertRaises(AssertionError):
+            Body.from_bytes(tx.kernel.to_bytes())
+
+
+class TestSessionCodec(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(DATASET_PATH, 'tx1.json')) as f:
+            data = json.load(f)
+        tx = Transaction.from_dict(data)
+        self.request = Request(Field(30), tx.kernel.fee, Field(3) * G, Field(4) * G, tx.kernel.metadata)
+        self.response = Response(tx.body.hh_outputs[0], Field(5) * G, tx.kernel.signature, data['range_proofs'][0])
+
+    def test_request_round_trip(self):
+        serialized = self.request.serialize()
+        self.assertEqual(len(serialized), 2 + 32 * 5)
+        decoded = Request.deserialize(serialized)
+        self.assertEqual(str(decoded), str(self.request))
+        self.assertEqual(decoded.serialize(), serialized)
+
+    def test_response_round_trip(self):
+        serialized = self.response.serialize()
+        self.assertEqual(len(serialized), 2 + 32 * 4 + 256)
+        decoded = Response.deserialize(serialized)
+        self.assertIn('range_proof', decoded._lazy)
+        self.assertEqual(decoded.range_proof, self.response.range_proof)
+        self.assertEqual(decoded.hh_output, self.response.hh_output)
+        self.assertEqual(decoded.signature.to_dict(), self.response.signature.to_dict())
+        self.assertEqual(decoded.serialize(), serialized)
+        self.assertEqual(pickle.loads(pickle.dumps(decoded)).serialize(), serialized)
+        with self.assertRaises(AssertionError):
+            Request.deserialize(serialized)
+        with self.assertRaises(AssertionError):
+            Response(self.response.hh_output, self.response.hh_excess, self.response.signature, None).serialize()
+
+    def test_batch(self):
+        requests = Request.deserialize_batch(Request.serialize_batch([self.request] * 3))
+        self.assertEqual([str(request) for request in requests], [str(self.request)] * 3)
+        serialized = Response.serialize_batch([self.response] * 3)
+        self.assertEqual(len(serialized), 6 + 3 * (32 * 4 + 256))
+        responses = Response.deserialize_batch(serialized)
+        self.assertEqual([response.serialize() for response in responses], [self.response.serialize()] * 3)
+        self.assertEqual(Response.deserialize_batch(Response.serialize_batch([])), [])
+        with self.assertRaises(AssertionError):
+            Response.deserialize_batch(serialized[:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
 import unittest
 
 from ethsnarks.field import FR_ORDER
+from ethsnarks.jubjub import Point
 
-from py934.constant import G
+from py934 import jubjub
+from py934.constant import G, H
+from py934.jubjub import multi_scalar_mul, scalar_mul, sum_points, set_backend, BACKENDS
 from py934.mimblewimble import Field
 
 
@@ -20,6 +23,57 @@ class TestField(unittest.TestCase):
         b = Field(3)
         self.assertEqual((a+b)*G, a*G + b*G, msg="Pedersen Commitment test")
 
+    def test_multi_scalar_mul(self):
+        scalars = [Field.random(), Field(0) - 1, Field(7), Field.random()]
+        points = [G, H, G * 3, H * 5]
+        expected = scalars[0] * points[0] + scalars[1] * points[1] + scalars[2] * points[2] + scalars[3] * points[3]
+        self.assertEqual(multi_scalar_mul(scalars, points), expected, msg="Multi scalar multiplication test")
+        self.assertEqual(multi_scalar_mul([3, -3], [G, G]), Point.infinity(), msg="Negative scalar test")
+
+
+class TestBackend(unittest.TestCase):
+    def setUp(self):
+        self.default_backend = jubjub.backend.name
+        self.scalars = [Field.random() for _ in range(3)] + [Field(0) - 1, Field(0), Field(1)]
+        self.points = [Point.mult(G, 11), Point.mult(H, 13), Point.infinity()]
+
+    def tearDown(self):
+        set_backend(self.default_backend)
+
+    def test_scalar_mul(self):
+        for name in BACKENDS:
+            set_backend(name)
+            for scalar in self.scalars:
+                for point in self.points:
+                    self.assertEqual(scalar_mul(point, scalar), Point.mult(point, scalar.n), msg=name)
+
+    def test_point_operations(self):
+        expected_sum = self.points[0].add(self.points[1]).add(self.points[2])
+        expected_msm = Point.mult(self.points[0], self.scalars[0].n).add(Point.mult(self.points[1], self.scalars[1].n))
+        for name in BACKENDS:
+            set_backend(name)
+            self.assertEqual(sum_points(self.points), expected_sum, msg=name)
+            self.assertEqual(multi_scalar_mul(self.scalars[:2], self.points[:2]), expected_msm, msg=name)
+            affine = jubjub.batch_from_etec([jubjub.etec_double(jubjub.to_etec(point)) for point in self.points])
+            self.assertEqual(affine, [point.double() for point in self.points], msg=name)
+
+    def test_decompression(self):
+        points = self.points + [Point.mult(G, scalar.n) for scalar in self.scalars[:3]]
+        for name in BACKENDS:
+            set_backend(name)
+            for point in points:
+                self.assertEqual(jubjub.decompress_point(point.compress()), point, msg=name)
+                self.assertEqual(jubjub.point_from_y(point.y.n), Point.from_y(point.y), msg=name)
+            with self.assertRaises(ValueError):
+                jubjub.sqrt_mod_q(5)
+
+    def test_backends_are_identical(self):
+        results = {}
+        for name in BACKENDS:
+            set_backend(name)
+            results[name] = [scalar_mul(G, scalar) for scalar in self.scalars]
+        self.assertEqual(len(set(tuple(result) for result in results.values())), 1)
+
 
 if __name__ == '__main__':
     unittest.main()
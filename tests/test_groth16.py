@@ -0,0 +1,91 @@
+import copy
+import json
+import os
+import unittest
+
+from py_ecc.optimized_bn128 import FQ2, b2, field_modulus, is_on_curve
+
+from py934.groth16 import BatchVerifier, CIRCUITS, g2, verifying_key, verify_proof, verify_proofs
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+
+
+def load(name):
+    with open(os.path.join(DATASET_PATH, name + '.json')) as f:
+        return json.load(f)
+
+
+def twist_point_out_of_subgroup() -> tuple:
+    """
+    A point of the twist found by trying x = i, i + 1, ... and taking the square root of x^3 + b2 in FQ2.
+    """
+    for real in range(100):
+        x = FQ2([real, 1])
+        a = x ** 3 + b2
+        a1 = a ** ((field_modulus - 3) // 4)
+        alpha = a1 * a1 * a
+        if alpha ** field_modulus * alpha == FQ2([-1, 0]):
+            continue
+        if alpha == FQ2([-1, 0]):
+            y = FQ2([0, 1]) * a1 * a
+        else:
+            y = (alpha + FQ2.one()) ** ((field_modulus - 1) // 2) * a1 * a
+        point = (x, y, FQ2.one())
+        assert is_on_curve(point, b2)
+        # Imaginary parts first like the verifier contracts
+        return [hex(x.coeffs[1]), hex(x.coeffs[0])], [hex(y.coeffs[1]), hex(y.coeffs[0])]
+
+
+class TestGroth16(unittest.TestCase):
+    def setUp(self):
+        self.tx1 = load('tx1')
+        self.tx2 = load('tx2')
+
+    def test_verifying_keys(self):
+        for circuit in CIRCUITS:
+            vk = verifying_key(circuit)
+            self.assertGreater(len(vk.gamma_abc), 1)
+        # RangeProof has 2 public inputs: the hiding y coordinate and the output 1
+        self.assertEqual(len(verifying_key('RangeProof').gamma_abc), 3)
+
+    def test_verify_proof(self):
+        self.assertTrue(verify_proof('Mimblewimble', self.tx1['mimblewimble_proof']))
+        # Round 1 of sample.py rolls up 4 items
+        self.assertTrue(verify_proof('RollUp4', load('rollUp1')))
+        self.assertFalse(verify_proof('RollUp2', load('rollUp1')))
+
+    def test_batch(self):
+        verifier = BatchVerifier()
+        for tx in (self.tx1, self.tx2):
+            for proof in tx['range_proofs']:
+                verifier.add('RangeProof', proof)
+        verifier.add('MMRInclusion', load('inclusion'))
+        self.assertEqual(len(verifier), 5)
+        self.assertEqual(verifier.verify(), [True] * 5)
+        self.assertEqual(len(verifier), 0)
+
+    def test_bad_proofs(self):
+        wrong_input = copy.deepcopy(self.tx1['range_proofs'][0])
+        wrong_input['inputs'][0] = self.tx2['range_proofs'][0]['inputs'][0]
+        not_on_curve = copy.deepcopy(self.tx1['range_proofs'][1])
+        not_on_curve['proof']['a'][0] = '0x01'
+        verdicts = verify_proofs('RangeProof', [self.tx2['range_proofs'][1], wrong_input, not_on_curve])
+        self.assertEqual(verdicts, [True, False, False])
+
+    def test_g2_checks(self):
+        proof = self.tx1['range_proofs'][0]
+        b = proof['proof']['b']
+        g2(*b)
+        # Same point with a coordinate which is not reduced
+        with self.assertRaises(AssertionError):
+            g2([hex(int(b[0][0], 16) + field_modulus), b[0][1]], b[1])
+        out_of_subgroup = twist_point_out_of_subgroup()
+        with self.assertRaises(AssertionError):
+            g2(*out_of_subgroup)
+        bad_b = copy.deepcopy(proof)
+        bad_b['proof']['b'] = list(out_of_subgroup)
+        self.assertEqual(verify_proofs('RangeProof', [proof, bad_b]), [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
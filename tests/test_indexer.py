@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+import unittest
+
+import eth_abi
+
+from py934.abi import encode_optimistic_roll_up, encode_roll_up
+from py934.indexer import ChainIndexer, ROLL_UP_TOPIC, OPTIMISTIC_ROLL_UP_TOPIC, MIMBLEWIMBLE_TOPIC
+from py934.mimblewimble import Transaction
+from py934.mmr import PedersenMMR
+from py934.tags import SpentTagStore, SPENDING, SPENT, UNSPENT
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+ERC20 = '0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c'
+CONTRACT = '0x0000000000000000000000000000000000000934'
+# eth_abi >= 2.0 renamed encode_abi to encode
+encode = getattr(eth_abi, 'encode', None) or eth_abi.encode_abi
+# Transactions of the roll up rounds in sample.py
+ROUNDS = [(1, 3), (3, 5), (5, 7), (7, 8), (8, 9), (9, 13), (13, 21)]
+
+
+def load(name):
+    with open(os.path.join(DATASET_PATH, name + '.json')) as f:
+        return json.load(f)
+
+
+class FakeEth:
+    """
+    Serves the logs of the dataset in the same format with web3.eth
+    """
+
+    def __init__(self):
+        self.logs = []
+        self.transactions = {}
+        self.blockNumber = 0
+        self.requested = []
+
+    def emit(self, topic, types, values, tx_hash=b'\x00' * 32):
+        self.logs.append({'topics': [topic], 'data': '0x' + encode(types, values).hex(), 'blockNumber': self.blockNumber,
+                          'logIndex': len(self.logs), 'transactionHash': tx_hash})
+
+    def getLogs(self, params):
+        self.requested.append((params['fromBlock'], params['toBlock']))
+        return [log for log in self.logs if params['fromBlock'] <= log['blockNumber'] <= params['toBlock']]
+
+    def getTransaction(self, tx_hash):
+        return {'input': self.transactions[tx_hash]}
+
+
+class FakeWeb3:
+    def __init__(self):
+        self.eth = FakeEth()
+
+
+class TestChainIndexer(unittest.TestCase):
+    def setUp(self):
+        self.web3 = FakeWeb3()
+        eth = self.web3.eth
+        for i, (start, end) in enumerate(ROUNDS, 1):
+            eth.blockNumber += 7
+            roll_up = load('rollUp{}'.format(i))
+            root, new_root = int(roll_up['inputs'][0], 16), int(roll_up['inputs'][-2], 16)
+            transactions = [Transaction.from_dict(load('tx{}'.format(j))) for j in range(start, end)]
+            tx_hash = bytes([i]) * 32
+            if len(transactions) < 8:
+                calldata = encode_roll_up(ERC20, root, new_root, transactions, roll_up)
+                eth.transactions[tx_hash] = '0x' + bytes(calldata).hex()
+                for tx in transactions:
+                    for output in tx.body.hh_outputs:
+                        eth.emit(MIMBLEWIMBLE_TOPIC, ['address', 'uint256'], [ERC20, output.y.n], tx_hash)
+                eth.emit(ROLL_UP_TOPIC, ['address', 'uint256', 'uint256', 'uint256'],
+                         [ERC20, root, new_root, len(transactions)], tx_hash)
+            else:
+                calldata = encode_optimistic_roll_up(ERC20, root, new_root, transactions, roll_up)
+                eth.transactions[tx_hash] = '0x' + bytes(calldata).hex()
+                eth.emit(OPTIMISTIC_ROLL_UP_TOPIC, ['bytes32', 'address', 'uint256', 'uint256', 'uint256'],
+                         [tx_hash, ERC20, root, new_root, len(transactions)], tx_hash)
+                # finalizeRollUp() after the challenge period
+                eth.blockNumber += 100
+                eth.emit(ROLL_UP_TOPIC, ['address', 'uint256', 'uint256', 'uint256'], [ERC20, root, new_root, 1])
+        self.final_root = int(load('rollUp7')['inputs'][-2], 16)
+        self.optimistic_tags = [Transaction.from_dict(load('tx{}'.format(j))).body.hh_input_tags[0].n
+                                for j in range(13, 21)]
+
+    def test_sync(self):
+        indexer = ChainIndexer(self.web3, CONTRACT, batch_size=20)
+        self.assertEqual(indexer.sync(), self.web3.eth.blockNumber)
+        mmr = indexer.pools[int(ERC20, 16)]
+        self.assertEqual(mmr.root.n, self.final_root)
+        self.assertEqual(mmr.width, 40)
+        self.assertEqual(self.web3.eth.requested[:2], [(0, 19), (20, 39)])
+
+    def test_items(self):
+        outputs = [output for j in range(1, 21) for output in Transaction.from_dict(load('tx{}'.format(j))).body.hh_outputs]
+        indexer = ChainIndexer(self.web3, CONTRACT)
+        indexer.sync()
+        mmr = indexer.pools[int(ERC20, 16)]
+        # The events only have the y coordinates, but the items must keep the x coordinates of the calldata
+        self.assertEqual([mmr.items[position] for position in range(1, mmr.width + 1)], outputs)
+        for position in range(1, mmr.width + 1):
+            proof = mmr.get_inclusion_proof(position)
+            self.assertTrue(PedersenMMR.inclusion_proof(proof.root, position, proof.item, proof.peaks, proof.siblings))
+
+    def test_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoint.json')
+            # Stops between the optimistic roll up and its finalization
+            ChainIndexer(self.web3, CONTRACT, path, batch_size=10).sync(to_block=60)
+            indexer = ChainIndexer(self.web3, CONTRACT, path, batch_size=1000)
+            self.assertEqual(indexer.block, 60)
+            indexer.sync()
+        self.assertEqual(indexer.pools[int(ERC20, 16)].root.n, self.final_root)
+
+    def test_spent_tags(self):
+        erc20 = int(ERC20, 16)
+        tx1 = Transaction.from_dict(load('tx1'))
+        tags = SpentTagStore()
+        # Stops between the optimistic roll up and its finalization
+        indexer = ChainIndexer(self.web3, CONTRACT, tags=tags)
+        indexer.sync(to_block=60)
+        self.assertEqual(tags.states(erc20, [tag.n for tag in tx1.body.hh_input_tags if tag.n != 1]),
+                         [SPENT] * len([tag for tag in tx1.body.hh_input_tags if tag.n != 1]))
+        self.assertEqual(tags.states(erc20, self.optimistic_tags), [SPENDING] * 8)
+        self.assertEqual(tags.state(erc20, 12345), UNSPENT)
+        indexer.sync()
+        self.assertEqual(tags.states(erc20, self.optimistic_tags), [SPENT] * 8)
+
+    def test_wrong_root(self):
+        # RollUp event of the first round with a wrong new root
+        self.web3.eth.logs[4]['data'] = '0x' + encode(['address', 'uint256', 'uint256', 'uint256'],
+                                                      [ERC20, 1, 5, 2]).hex()
+        with self.assertRaises(AssertionError):
+            ChainIndexer(self.web3, CONTRACT).sync()
+
+
+if __name__ == '__main__':
+    unittest.main()
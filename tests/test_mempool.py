@@ -0,0 +1,118 @@
+import unittest
+
+from ethsnarks.field import FQ
+
+from py934.constant import G
+from py934.mempool import Mempool, erc20_of, expiration_of, is_expired
+from py934.mimblewimble import Field, Kernel, Body, Signature, Transaction
+from py934.tags import SpentTagStore
+
+ERC20_A = 0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c
+ERC20_B = 0x1234
+
+
+def make_tx(tags, fee, erc20=ERC20_A, expiration=100):
+    kernel = Kernel(G, Signature(Field(1), G), Field(fee), Field(erc20 + (expiration << 160)))
+    body = Body([FQ(tag) for tag in tags], [G, G])
+    return Transaction(kernel, body, [None, None], [None, None], None)
+
+
+class TestMempool(unittest.TestCase):
+    def setUp(self):
+        self.mempool = Mempool()
+
+    def test_metadata(self):
+        metadata = Field(ERC20_A + (123 << 160))
+        self.assertEqual(erc20_of(metadata), ERC20_A)
+        self.assertEqual(expiration_of(metadata), 123)
+        # Bits above the uint24 expiration are ignored like the contract does
+        self.assertEqual(expiration_of(Field(ERC20_A + ((1 << 24 | 123) << 160))), 123)
+        # The contract also compares with uint24(block.number)
+        self.assertFalse(is_expired(metadata, (1 << 24) + 100))
+        self.assertTrue(is_expired(metadata, 123))
+
+    def test_double_spending(self):
+        tx = make_tx([11, 12], 3)
+        self.assertTrue(self.mempool.add(tx))
+        self.assertFalse(self.mempool.add(make_tx([12, 1], 5)))
+        self.assertTrue(self.mempool.add(make_tx([13, 1], 5)))
+        self.assertTrue(self.mempool.add(make_tx([14, 1], 5)))
+        self.assertIn(12, self.mempool)
+        self.assertIs(self.mempool.get(12), tx)
+        self.assertEqual(len(self.mempool), 3)
+        self.assertEqual(self.mempool.remove_spent([12, 99]), [tx])
+        self.assertNotIn(11, self.mempool)
+        self.assertTrue(self.mempool.add(make_tx([11, 1], 1)))
+        # A tx spending the same tag twice is rejected and leaves nothing behind
+        self.assertFalse(self.mempool.add(make_tx([15, 15], 1)))
+        self.assertNotIn(15, self.mempool)
+        self.assertEqual(len(self.mempool), 3)
+
+    def test_spent_on_chain(self):
+        spent = SpentTagStore()
+        spent.mark_spending(ERC20_A, [21])
+        spent.mark_spent(ERC20_A, [22])
+        mempool = Mempool(spent)
+        self.assertFalse(mempool.add(make_tx([21, 1], 1)))
+        self.assertFalse(mempool.add(make_tx([23, 22], 1)))
+        # Tags are per ERC20 pool
+        self.assertTrue(mempool.add(make_tx([21, 1], 1, erc20=ERC20_B)))
+        self.assertTrue(mempool.add(make_tx([23, 1], 1)))
+        with self.assertRaises(AssertionError):
+            self.mempool.add(make_tx([1, 1], 1))
+
+    def test_fee_priority_per_erc20(self):
+        for tag, fee in enumerate([3, 9, 1, 7]):
+            self.mempool.add(make_tx([100 + tag, 1], fee))
+        self.mempool.add(make_tx([200, 1], 100, ERC20_B))
+        self.assertEqual(set(self.mempool.erc20s), {ERC20_A, ERC20_B})
+        removed = self.mempool.get(101)
+        self.assertTrue(self.mempool.remove(removed))
+        self.assertFalse(self.mempool.remove(removed))
+        best = self.mempool.pop_best(ERC20_A, 2)
+        self.assertEqual([int(tx.kernel.fee) for tx in best], [7, 3])
+        self.assertEqual(self.mempool.size(ERC20_A), 1)
+        self.assertEqual([int(tx.kernel.fee) for tx in self.mempool.pop_best(ERC20_A, 4)], [1])
+        self.assertEqual(self.mempool.erc20s, [ERC20_B])
+
+    def test_expiration(self):
+        self.assertFalse(self.mempool.add(make_tx([10, 1], 1, expiration=5), block_number=5))
+        for tag, expiration in zip([10, 11, 12, 13], [30, 10, 20, 40]):
+            self.mempool.add(make_tx([tag, 1], tag, expiration=expiration))
+        self.assertEqual([int(tx.kernel.fee) for tx in self.mempool.pop_best(ERC20_A, 1)], [13])
+        evicted = self.mempool.evict_expired(20)
+        self.assertEqual([expiration_of(tx.kernel.metadata) for tx in evicted], [10, 20])
+        self.assertEqual(len(self.mempool), 1)
+        self.assertEqual([int(tx.kernel.fee) for tx in self.mempool.evict_expired(1000)], [10])
+        self.assertEqual(len(self.mempool), 0)
+
+    def test_compaction_during_eviction(self):
+        for i in range(3000):
+            self.mempool.add(make_tx([10 + i, 1], 1, expiration=100))
+        for i in range(100):
+            self.mempool.add(make_tx([5000 + i, 1], 1, expiration=200))
+        self.assertEqual(len(self.mempool.evict_expired(150)), 3000)
+        self.assertEqual(len(self.mempool.evict_expired(250)), 100)
+        self.assertEqual(len(self.mempool), 0)
+        # Every dead heap item is counted as stale, so the heaps are compacted later
+        heap_items = sum(len(heap) for heap in self.mempool._fee_heaps.values()) + len(self.mempool._expirations)
+        self.assertEqual(heap_items, self.mempool._stale)
+
+    def test_throughput(self):
+        transactions = [make_tx([10 + i, 1], i % 10, ERC20_A + i % 4, 100 + i % 50) for i in range(20000)]
+        self.assertTrue(all(self.mempool.add(tx) for tx in transactions))
+        self.assertEqual(len(self.mempool.evict_expired(124)), 20000 // 2)
+        remaining = self.mempool.size(ERC20_A)
+        best = self.mempool.pop_best(ERC20_A, 20000)
+        self.assertEqual(len(best), remaining)
+        fees = [int(tx.kernel.fee) for tx in best]
+        self.assertEqual(fees, sorted(fees, reverse=True))
+        self.assertEqual(len(self.mempool), 20000 // 2 - remaining)
+        # Lazily deleted heap items are compacted instead of piling up
+        self.assertLessEqual(self.mempool._stale, 2 * len(self.mempool) + 1024)
+        heap_items = sum(len(heap) for heap in self.mempool._fee_heaps.values()) + len(self.mempool._expirations)
+        self.assertLessEqual(heap_items, 2 * len(self.mempool) + self.mempool._stale)
+
+
+if __name__ == '__main__':
+    unittest.main()
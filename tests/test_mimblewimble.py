@@ -1,13 +1,25 @@
+import json
 import unittest
+from unittest import mock
 from eth_account import Account
+from ethsnarks.field import SNARK_SCALAR_FIELD, FQ
+from ethsnarks.jubjub import Point
 
-from py934.mimblewimble import TxSend, Output, Field, Request, TxReceive
+from py934.constant import G, H
+from py934.jubjub import in_subgroup
+from py934.mimblewimble import TxSend, Output, Field, Request, TxReceive, Kernel, Signature, verify_kernels, \
+    verify_balances, Response, Transaction
 from py934.mmr import PedersenMMR
 import os
 
 BUILD_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset')
 
 
+def load_kernel(name) -> Kernel:
+    with open(os.path.join(BUILD_PATH, 'ethereum934', name)) as f:
+        return Kernel.from_dict(json.load(f)['kernel'])
+
+
 class Secrets:
     pass
 
@@ -84,5 +96,117 @@ class TestMimblewimble(unittest.TestCase):
         self.assertIsNotNone(deposit_proof)
 
 
+class TestTxSendStages(unittest.TestCase):
+    def setUp(self):
+        input_txo = Output.new(Field(1000))
+        change_txo = Output.new(Field(690))
+        change_txo._range_proof = {}
+        self.output_txo = Output.new(Field(300))
+        self.tx_send = TxSend.builder(). \
+            value(300). \
+            fee(10). \
+            input_txo(input_txo). \
+            change_txo(change_txo). \
+            metadata(1, 100). \
+            sig_salt(Field.random()). \
+            build()
+        self.tx_receive = TxReceive.builder(). \
+            request(self.tx_send.request). \
+            output_txo(self.output_txo). \
+            sig_salt(Field.random()). \
+            build()
+        # Skips the range proof of the recipient
+        self.response = Response(self.output_txo.hh, self.output_txo.public_key, self.tx_receive.signature, {})
+
+    def test_stages(self):
+        self.assertEqual(self.tx_send.stage, TxSend.REQUESTED)
+        self.assertIsNone(self.tx_send.merge(self.response, prove=False))
+        self.assertEqual(self.tx_send.stage, TxSend.MERGED)
+        self.assertEqual(self.tx_send.challenge, self.tx_receive.challenge)
+        signature = self.tx_send.sign()
+        self.assertEqual(self.tx_send.stage, TxSend.SIGNED)
+        self.assertIs(self.tx_send.sign(), signature)
+        kernel = Kernel(self.tx_send.request.hh_excess + self.response.hh_excess, signature, self.tx_send.fee,
+                        self.tx_send.metadata)
+        self.assertTrue(kernel.verify_signature())
+
+    def test_prove_only_once(self):
+        with mock.patch.object(Transaction, 'new', return_value=object()) as new:
+            transaction = self.tx_send.merge(self.response)
+            self.assertIs(self.tx_send.transaction, transaction)
+            self.assertIs(self.tx_send.transaction, transaction)
+            self.assertEqual(new.call_count, 1)
+        self.assertEqual(self.tx_send.stage, TxSend.PROVEN)
+
+
+class TestOutput(unittest.TestCase):
+    def test_new_batch(self):
+        values = [0, 1, 100, 12345678]
+        outputs = Output.new_batch(values)
+        self.assertEqual([txo.v for txo in outputs], values)
+        for txo in outputs:
+            self.assertEqual(txo.hh, txo.r * G + txo.v * H)
+            self.assertEqual(txo.public_key, txo.r * G)
+            self.assertEqual(txo.tag, (txo.r * txo.hh).y)
+            self.assertTrue(0 < txo.r.n < SNARK_SCALAR_FIELD)
+        self.assertEqual(len(set(txo.r.n for txo in outputs)), len(outputs))
+
+    def test_new_batch_with_process_pool(self):
+        outputs = Output.new_batch(list(range(8)), processes=2)
+        self.assertEqual([txo.v for txo in outputs], list(range(8)))
+        for txo in outputs:
+            self.assertEqual(txo.hh, Output(txo.r, txo.v).hh)
+
+
+class TestKernel(unittest.TestCase):
+    def setUp(self):
+        self.kernels = [load_kernel('tx{}.json'.format(i)) for i in range(1, 9)]
+
+    def test_verify_kernels(self):
+        self.assertEqual(verify_kernels(self.kernels), [True] * len(self.kernels))
+        self.assertEqual(verify_kernels([]), [])
+
+    def test_verify_kernels_with_bad_signature(self):
+        bad = self.kernels[3]
+        self.kernels[3] = Kernel(bad.hh_excess, Signature(bad.signature.s + 1, bad.signature.R), bad.fee, bad.metadata)
+        verdicts = verify_kernels(self.kernels)
+        self.assertEqual(verdicts, [True, True, True, False, True, True, True, True])
+
+    def test_verify_kernels_with_torsion(self):
+        # R has the order 2 component (0, -1), which an even batch weight would cancel
+        excess, k = Field(5), Field(7)
+        R = k * G + Point(FQ(0), FQ(-1))
+        unsigned = Kernel(excess * G, Signature(Field(0), R), Field(1), Field(0))
+        s = k + unsigned.challenge * excess
+        tampered = Kernel(excess * G, Signature(s, R), Field(1), Field(0))
+        self.assertFalse(tampered.verify_signature())
+        self.assertFalse(in_subgroup(R))
+        self.kernels[2] = tampered
+        for _ in range(8):
+            self.assertEqual(verify_kernels(self.kernels), [True, True, False, True, True, True, True, True])
+
+
+class TestBalance(unittest.TestCase):
+    def setUp(self):
+        self.kernels = []
+        self.inputs = []
+        self.outputs = []
+        for i in range(3):
+            inputs = [Output(10 + i, 1000), Output(20 + i, 500)]
+            outputs = [Output(30 + i, 700), Output(40 + i, 790)]
+            fee = Field(10)
+            hh_excess = (Field(70 + 2 * i) - Field(30 + 2 * i)) * G
+            self.kernels.append(Kernel(hh_excess, None, fee, Field(0)))
+            self.inputs.append([txo.hh for txo in inputs])
+            self.outputs.append([txo.hh for txo in outputs])
+
+    def test_verify_balances(self):
+        self.assertEqual(verify_balances(self.kernels, self.inputs, self.outputs), [True, True, True])
+
+    def test_verify_balances_with_inflation(self):
+        self.outputs[1][0] = Output(31, 701).hh
+        self.assertEqual(verify_balances(self.kernels, self.inputs, self.outputs), [True, False, True])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,13 @@
+import os
+import tempfile
+import threading
 import unittest
 
 from py934.constant import G, H
 from py934.mimblewimble import Field
-from py934.mmr import PedersenMMR
+from ethsnarks.jubjub import Point
+
+from py934.mmr import MMR, PedersenMMR, write_leaves, read_leaves
 
 
 class TestMMR(unittest.TestCase):
@@ -77,6 +82,133 @@ class TestMMR(unittest.TestCase):
             assert proof is not None
             # TODO test with VM
 
+    def test_snapshot(self):
+        snapshot = self.mmr.snapshot()
+        root = self.mmr.root
+        self.mmr.append(Field(7) * G + Field(17) * H)
+        # A pinned snapshot is not changed by the following appends
+        self.assertEqual(snapshot.width, 6)
+        self.assertEqual(snapshot.root, root)
+        self.assertNotEqual(self.mmr.root, root)
+        self.assertEqual(snapshot.get_inclusion_proof(5).root, root)
+        self.assertEqual(self.mmr.get_inclusion_proof(5).root, self.mmr.root)
+
+    def test_append_batch(self):
+        items = [Field(i) * G + Field(i + 10) * H for i in range(7, 12)]
+        mmr = PedersenMMR.from_peaks(16, self.mmr.peaks)
+        mmr.append_batch(items)
+        for item in items:
+            self.mmr.append(item)
+        self.assertEqual(mmr.root, self.mmr.root)
+        self.assertEqual(mmr.snapshot().width, 11)
+
+    def test_concurrent_readers(self):
+        errors = []
+        done = threading.Event()
+
+        def read():
+            try:
+                while not done.is_set():
+                    snapshot = self.mmr.snapshot()
+                    for position in range(1, snapshot.width + 1):
+                        # PedersenMMRProof asserts the inclusion against the snapshot's root
+                        snapshot.get_inclusion_proof(position)
+            except Exception as error:
+                errors.append(error)
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        for i in range(7, 40):
+            self.mmr.append(Field(i) * G + Field(i + 10) * H)
+        done.set()
+        for reader in readers:
+            reader.join()
+        self.assertEqual(errors, [])
+
+    def test_from_leaves(self):
+        items = [Field(i) * G + Field(i + 10) * H for i in range(1, 38)]
+        for item in items[6:]:
+            self.mmr.append(item)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'leaves')
+            write_leaves(path, items)
+            self.assertEqual(list(read_leaves(path, chunk_size=5)), items)
+            mmr = PedersenMMR.from_leaves(path, processes=2, chunk_size=4)
+        self.assertEqual(mmr.width, 37)
+        self.assertEqual(mmr.root, self.mmr.root)
+        self.assertEqual(mmr.peaks, self.mmr.peaks)
+        self.assertEqual(mmr.nodes, self.mmr.nodes)
+        # Old leaves have their inclusion proofs unlike from_peaks
+        self.assertEqual(mmr.get_inclusion_proof(3).root, mmr.root)
+        self.assertEqual(PedersenMMR.from_leaves([], processes=1).root, PedersenMMR().root)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'mmr')
+            self.mmr.save(path, {self.mmr.root.n: self.mmr.width})
+            mmr = PedersenMMR.load(path)
+            self.assertEqual(mmr.root, self.mmr.root)
+            self.assertEqual(mmr.peaks, self.mmr.peaks)
+            self.assertEqual(PedersenMMR.load_roots(path), {self.mmr.root.n: 6})
+            # Widths of MMRs wider than 32 bits fit in the index
+            roots = {self.mmr.root.n: 6, 1234: (1 << 40) + 5}
+            self.mmr.save(path, roots)
+            self.assertEqual(PedersenMMR.load_roots(path), roots)
+            self.assertEqual(PedersenMMR.load(path).root, self.mmr.root)
+            self.mmr.save(path, {self.mmr.root.n: self.mmr.width})
+            mmr = PedersenMMR.load(path)
+            # Only the nodes on the path of the proof are decompressed
+            self.assertEqual(mmr.get_inclusion_proof(3).root, self.mmr.root)
+            self.assertEqual(len(mmr.nodes._points), 2)
+            self.assertEqual(dict(mmr.nodes), self.mmr.nodes)
+            self.assertEqual(dict(mmr.items), self.mmr.items)
+            item = Field(7) * G + Field(17) * H
+            mmr.append(item)
+            self.mmr.append(item)
+            self.assertEqual(mmr.root, self.mmr.root)
+
+            # MMR from the peaks does not have the branch nodes
+            PedersenMMR.from_peaks(16, self.mmr.peaks).save(path)
+            mmr = PedersenMMR.load(path)
+            self.assertEqual(mmr.root, self.mmr.root)
+            self.assertEqual(len(mmr.items), 0)
+            self.assertEqual(len(mmr.nodes), 3)
+
+            with open(path, 'r+b') as f:
+                f.seek(-1, os.SEEK_END)
+                f.write(b'\xff')
+            with self.assertRaises(AssertionError):
+                PedersenMMR.load(path)
+
+    def test_capacity(self):
+        mmr = PedersenMMR(bits=3)
+        mmr.append_batch([Field(i) * G for i in range(1, 8)])
+        with self.assertRaises(AssertionError):
+            mmr.append(G)
+        self.assertEqual(MMR.max_height((1 << 60) - 1), 60)
+
+    def test_larger_bits(self):
+        mmr = PedersenMMR(bits=32)
+        for position in range(1, 7):
+            mmr.append(self.mmr.items[position])
+        self.assertEqual(mmr.root, self.mmr.root)
+        # 16 bits witnesses for the circuits while the width fits
+        self.assertEqual(mmr.witness_peaks(16), self.mmr.peaks)
+        proof = mmr.get_inclusion_proof(3, bits=16)
+        self.assertEqual((len(proof.peaks), len(proof.siblings)), (16, 16))
+        self.assertEqual(proof.siblings, self.mmr.get_siblings(3))
+
+        # A mountain of 2^16 items does not fit in 16 bits
+        peaks = [Point.infinity()] * 20
+        peaks[20 - 17] = G
+        mmr = PedersenMMR.from_peaks(20, peaks)
+        mmr.append(H)
+        self.assertEqual(mmr.width, (1 << 16) + 1)
+        self.assertEqual(mmr.get_inclusion_proof(mmr.width).root, mmr.root)
+        with self.assertRaises(AssertionError):
+            mmr.witness_peaks(16)
+
 
 if __name__ == '__main__':
     unittest.main()
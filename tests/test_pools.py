@@ -0,0 +1,56 @@
+import json
+import os
+import unittest
+
+from py934.constant import G, H
+from py934.mimblewimble import Field, Transaction
+from py934.mmr import PedersenMMR
+from py934.pools import PoolManager
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+ERC20 = 0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c
+
+
+def load(name):
+    with open(os.path.join(DATASET_PATH, name + '.json')) as f:
+        return json.load(f)
+
+
+class TestPoolManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = PoolManager(processes=2)
+        self.items = [Field(i) * G + Field(10 + i) * H for i in range(1, 5)]
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    def test_route(self):
+        self.assertEqual(PoolManager.route(Field(ERC20 + (100 << 160))), ERC20)
+
+    def test_pools_are_separated(self):
+        mmr = PedersenMMR()
+        for item in self.items:
+            mmr.append(item)
+        futures = [self.manager.append(erc20, self.items[:2]) for erc20 in [2, 3, 4]]
+        futures.append(self.manager.append(2, self.items[2:]))
+        self.assertEqual([future.result()[1] for future in futures], [2, 2, 2, 4])
+        self.assertEqual(self.manager.state(2).result()[:2], (mmr.root, 4))
+        self.assertEqual(self.manager.state(5).result()[1], 0)
+        proof = self.manager.inclusion_proof(2, 3).result()
+        self.assertEqual(proof.item, self.items[2])
+        self.assertTrue(PedersenMMR.inclusion_proof(proof.root, 3, proof.item, proof.peaks, proof.siblings))
+
+    def test_transactions_and_roll_up_plan(self):
+        transactions = [Transaction.from_dict(load('tx{}'.format(i))) for i in [1, 2]]
+        roll_up = load('rollUp1')
+        items = [output for tx in transactions for output in tx.body.hh_outputs]
+        root, width, peaks, new_root, new_width = self.manager.plan_roll_up(ERC20, items).result()
+        self.assertEqual((root.n, width, new_root.n, new_width),
+                         (int(roll_up['inputs'][0], 16), 0, int(roll_up['inputs'][-2], 16), 4))
+        futures = self.manager.append_transactions(transactions)
+        self.assertEqual(list(futures), [ERC20])
+        self.assertEqual(futures[ERC20].result(), (new_root, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
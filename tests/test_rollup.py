@@ -0,0 +1,218 @@
+import json
+import os
+import unittest
+
+from ethsnarks.field import FQ
+from ethsnarks.jubjub import Point
+
+from py934.abi import encode_roll_up, encode_optimistic_roll_up
+from py934.constant import G
+from py934.mempool import Mempool
+from py934.mimblewimble import Transaction, Output, Kernel, Body, Field, Signature
+from py934.mmr import PedersenMMR
+from py934.rollup import RollUpBuilder, CutThrough, RollUpValidator, roll_up_size, roll_up_root, appended_mmr
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+ERC20 = 0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c
+
+
+def load(name):
+    with open(os.path.join(DATASET_PATH, name + '.json')) as f:
+        return json.load(f)
+
+
+class TestRollUpBuilder(unittest.TestCase):
+    def setUp(self):
+        self.mmr = PedersenMMR()
+        self.transactions = [Transaction.from_dict(load('tx{}'.format(i))) for i in range(1, 8)]
+        self.roll_up = load('rollUp1')
+
+    def test_roll_up_size(self):
+        self.assertEqual([roll_up_size(n) for n in [0, 1, 3, 4, 7, 31, 32, 100]], [0, 1, 2, 4, 4, 16, 32, 32])
+        self.assertEqual(roll_up_size(100, max_txs=4), 4)
+
+    def test_build(self):
+        # Round 1 of sample.py rolls up tx1 and tx2 on the empty MMR
+        block = RollUpBuilder(self.mmr, ERC20).build(self.transactions[:3])
+        self.assertEqual(block.transactions, self.transactions[:2])
+        inputs = [int(value, 16) for value in self.roll_up['inputs']]
+        self.assertEqual(block.root.n, inputs[0])
+        self.assertEqual(block.width, inputs[1])
+        self.assertEqual(block.new_root.n, inputs[-2])
+        self.assertEqual(self.mmr.width, 0)
+        block.apply(self.mmr)
+        self.assertEqual(self.mmr.root, block.new_root)
+        self.assertEqual(self.mmr.peaks, block.new_peaks)
+        with self.assertRaises(AssertionError):
+            block.apply(self.mmr)
+
+    def test_conflicting_tags(self):
+        builder = RollUpBuilder(self.mmr, ERC20)
+        duplicated = Transaction.from_dict(load('tx1'))
+        selected = builder.select([self.transactions[0], duplicated, self.transactions[1]])
+        self.assertEqual(selected, self.transactions[:2])
+        spent = self.transactions[0].body.hh_input_tags[:1]
+        self.assertEqual(builder.select(self.transactions[:2], spent), self.transactions[1:2])
+        self.assertIsNone(builder.build([]))
+
+    def test_other_pools_and_expired(self):
+        builder = RollUpBuilder(self.mmr, ERC20)
+        other_pool = Transaction.from_dict(load('tx1'))
+        other_pool.kernel.metadata = Field(0x1234 + (100 << 160))
+        selected = builder.select([other_pool] + self.transactions[1:3])
+        self.assertEqual(selected, self.transactions[1:3])
+        # The dataset transactions expire at block 100
+        self.assertEqual(builder.select(self.transactions[:2], block_number=99), self.transactions[:2])
+        self.assertEqual(builder.select(self.transactions[:2], block_number=100), [])
+        self.assertIsNone(builder.build(self.transactions, block_number=100))
+
+    def test_calldata(self):
+        block = RollUpBuilder(self.mmr, ERC20).build(self.transactions[:2])
+        block.proof = self.roll_up
+        expected = encode_roll_up('0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c', block.root.n, block.new_root.n,
+                                  self.transactions[:2], self.roll_up)
+        self.assertEqual(bytes(block.calldata()), bytes(expected))
+
+    def test_optimistic_calldata(self):
+        transactions = self.transactions + [Transaction.from_dict(load('tx8'))]
+        block = RollUpBuilder(self.mmr, ERC20).build(transactions)
+        self.assertEqual(len(block.transactions), 8)
+        block.proof = self.roll_up
+        expected = encode_optimistic_roll_up('0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c', block.root.n,
+                                             block.new_root.n, transactions, self.roll_up)
+        self.assertEqual(bytes(block.calldata()), bytes(expected))
+        with self.assertRaises(AssertionError):
+            block.calldata(optimistic=False)
+
+    def test_from_mempool(self):
+        mempool = Mempool()
+        for tx in self.transactions:
+            mempool.add(tx)
+        block = RollUpBuilder(self.mmr, ERC20, max_txs=4).build_from_mempool(mempool)
+        self.assertEqual([int(tx.kernel.fee) for tx in block.transactions], [9, 8, 7, 7])
+        self.assertEqual(len(mempool), 3)
+
+
+def make_tx(inputs, outputs, fee):
+    hh_excess = (Field(sum(txo.r.n for txo in outputs)) - Field(sum(txo.r.n for txo in inputs))) * G
+    tags = [txo.tag for txo in inputs] + [FQ(1)] * (2 - len(inputs))
+    return Transaction(Kernel(hh_excess, None, Field(fee), Field(ERC20)), Body(tags, [txo.hh for txo in outputs]),
+                       [None, None], [None, None], None)
+
+
+class TestCutThrough(unittest.TestCase):
+    def setUp(self):
+        # a => b, c => b is spent again in the same batch => d, e
+        self.a, self.b, self.c, self.d, self.e = Output(11, 10), Output(12, 6), Output(13, 3), Output(14, 5), \
+                                                 Output(15, 0)
+        self.transactions = [make_tx([self.a], [self.b, self.c], 1), make_tx([self.b], [self.d, self.e], 1)]
+
+    def test_cut_through(self):
+        cut = CutThrough(self.transactions, [self.b, self.c])
+        self.assertEqual(cut.cut, [self.b])
+        self.assertEqual(cut.items, [self.c.hh, self.d.hh, self.e.hh])
+        self.assertEqual(cut.spent_tags, [self.a.tag.n])
+        self.assertEqual(len(cut.kernels), 2)
+        self.assertTrue(cut.verify_balance([self.a.hh]))
+        self.assertFalse(cut.verify_balance([Output(11, 11).hh]))
+
+    def test_without_openings(self):
+        cut = CutThrough(self.transactions)
+        self.assertEqual(len(cut.items), 4)
+        self.assertTrue(cut.verify_balance([self.a.hh, self.b.hh]))
+
+    def test_mmr(self):
+        mmr = PedersenMMR()
+        cut = CutThrough(self.transactions, [self.b])
+        new_root = cut.new_root(mmr)
+        self.assertEqual(mmr.width, 0)
+        cut.apply(mmr)
+        self.assertEqual((mmr.width, mmr.root), (3, new_root))
+
+
+def sign_tx(tx: Transaction, excess: Field, k=Field(7), torsion=None) -> Transaction:
+    kernel = tx.kernel
+    R = k * G if torsion is None else k * G + torsion
+    challenge = Transaction.create_challenge(kernel.hh_excess, R, kernel.fee, kernel.metadata)
+    signature = Signature(k + challenge * excess, R)
+    return Transaction(Kernel(kernel.hh_excess, signature, kernel.fee, kernel.metadata), tx.body, [None, None],
+                       [None, None], None)
+
+
+class TestRollUpValidator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.validator = RollUpValidator(processes=2, chunk_size=3)
+        cls.transactions = [Transaction.from_dict(load('tx{}'.format(i))) for i in range(1, 21)]
+        # Round 1 to 6 of sample.py rolled up tx1 to tx12 before the optimistic roll up of tx13 to tx20
+        cls.mmr = PedersenMMR()
+        cls.mmr.append_batch([hh for tx in cls.transactions[:12] for hh in tx.body.hh_outputs])
+        cls.roll_up = [int(value, 16) for value in load('rollUp7')['inputs']]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.validator.shutdown()
+
+    def validate(self, transactions, **kwargs):
+        return self.validator.validate(self.mmr.root, self.mmr.width, self.mmr.peaks, transactions,
+                                       self.roll_up[-2], **kwargs)
+
+    def test_roll_up_root(self):
+        items = [hh for tx in self.transactions[12:] for hh in tx.body.hh_outputs]
+        self.assertEqual(roll_up_root(self.mmr.width, self.mmr.peaks, items), appended_mmr(self.mmr, items).root)
+
+    def test_valid(self):
+        verdict = self.validate(self.transactions[12:])
+        self.assertTrue(verdict.valid)
+        self.assertEqual(verdict.new_root.n, self.roll_up[-2])
+        self.assertEqual(len(verdict.verdicts), 8)
+        self.assertTrue(all(v.balance is None for v in verdict.verdicts))
+
+    def test_invalid(self):
+        transactions = list(self.transactions[12:])
+        # Wrong signature
+        tx = transactions[4]
+        kernel = tx.kernel
+        transactions[4] = Transaction(Kernel(kernel.hh_excess, transactions[5].kernel.signature, kernel.fee,
+                                             kernel.metadata), tx.body, None, None, None)
+        # Double spending in the batch
+        transactions[7] = transactions[6]
+        verdict = self.validate(transactions)
+        self.assertFalse(verdict.valid)
+        self.assertFalse(verdict.roots)
+        self.assertEqual(verdict.invalid_transactions, [4, 7])
+        self.assertFalse(verdict.verdicts[4].signature)
+        self.assertFalse(verdict.verdicts[7].unique_tags)
+        # Already spent tags
+        spent = self.transactions[13].body.hh_input_tags
+        verdict = self.validate(self.transactions[12:], spent_tags=spent)
+        self.assertEqual(verdict.invalid_transactions, [1])
+
+    def test_balance(self):
+        a, b, c = Output(11, 10), Output(12, 6), Output(13, 3)
+        tx = sign_tx(make_tx([a], [b, c], 1), Field(12 + 13 - 11))
+        mmr = PedersenMMR()
+        new_root = appended_mmr(mmr, [b.hh, c.hh]).root
+        verdict = self.validator.validate(mmr.root, 0, mmr.peaks, [tx], new_root, inputs=[[a.hh]])
+        self.assertTrue(verdict.valid)
+        self.assertTrue(verdict.verdicts[0].balance)
+        verdict = self.validator.validate(mmr.root, 0, mmr.peaks, [tx], new_root, inputs=[[Output(11, 11).hh]])
+        self.assertFalse(verdict.valid)
+        self.assertEqual(verdict.verdicts[0].balance, False)
+
+    def test_torsion_signature(self):
+        # R with the order 2 component (0, -1) passes a batch check with an even weight
+        a, b, c, d, e = Output(11, 10), Output(12, 6), Output(13, 3), Output(14, 10), Output(15, 0)
+        transactions = [sign_tx(make_tx([a], [b, c], 1), Field(12 + 13 - 11)),
+                        sign_tx(make_tx([d], [d, e], 0), Field(15), torsion=Point(FQ(0), FQ(-1)))]
+        mmr = PedersenMMR()
+        new_root = appended_mmr(mmr, [b.hh, c.hh, d.hh, e.hh]).root
+        for _ in range(4):
+            verdict = self.validator.validate(mmr.root, 0, mmr.peaks, transactions, new_root)
+            self.assertTrue(verdict.roots)
+            self.assertEqual(verdict.invalid_transactions, [1])
+            self.assertFalse(verdict.verdicts[1].signature)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from ethsnarks.field import FQ
+
+from py934.codec import point_from_hex
+from py934.constant import G, H
+from py934.mimblewimble import Field
+from py934.mmr import PedersenMMR
+from py934 import service
+from py934.service import ProofService, ProofClient, ProofCache
+
+ERC20 = 0x1234
+
+
+class TestProofCache(unittest.TestCase):
+    def test_lru(self):
+        mmr = PedersenMMR()
+        mmr.append_batch([Field(i) * G + Field(i + 10) * H for i in range(1, 5)])
+        cache = ProofCache(max_entries=2)
+        snapshot = mmr.snapshot()
+        first = cache.get(ERC20, snapshot, 1)
+        cache.get(ERC20, snapshot, 2)
+        self.assertIs(cache.get(ERC20, snapshot, 1), first)
+        cache.get(ERC20, snapshot, 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        # Position 2 was the least recently used one
+        cache.get(ERC20, snapshot, 2)
+        self.assertEqual(cache.misses, 4)
+
+
+class TestProofService(unittest.TestCase):
+    def setUp(self):
+        self.mmr = PedersenMMR()
+        self.mmr.append_batch([Field(i) * G + Field(i + 10) * H for i in range(1, 7)])
+        self.service = ProofService({ERC20: self.mmr})
+
+    async def queries(self, client: ProofClient):
+        state = await client.state(ERC20)
+        self.assertEqual(int(state['root'], 16), self.mmr.root.n)
+        self.assertEqual(state['width'], 6)
+
+        proofs = await client.inclusion_proofs(ERC20, [1, 3, 6])
+        for proof in proofs:
+            self.assertTrue(PedersenMMR.inclusion_proof(FQ(int(proof['root'], 16)),
+                                                        proof['position'],
+                                                        point_from_hex(proof['item']),
+                                                        [point_from_hex(peak) for peak in proof['peaks']],
+                                                        [point_from_hex(sibling) for sibling in proof['siblings']]))
+        siblings = await client.siblings(ERC20, [3])
+        self.assertEqual(siblings['siblings'][0], proofs[1]['siblings'])
+
+        with self.assertRaises(AssertionError):
+            await client.inclusion_proofs(ERC20, [7])
+        with self.assertRaises(AssertionError):
+            await client.state(0x5678)
+
+    def test_tcp(self):
+        async def run():
+            host, port = (await self.service.start())[:2]
+            client = await ProofClient.connect(host, port)
+            await self.queries(client)
+            await self.queries(client)
+            self.assertEqual(self.service.cache.hits, 3)
+            # A new root does not hit the proofs of the old root
+            self.mmr.append(Field(7) * G + Field(17) * H)
+            proof = (await client.inclusion_proofs(ERC20, [1]))[0]
+            self.assertEqual(int(proof['root'], 16), self.mmr.root.n)
+            self.assertEqual(self.service.cache.hits, 3)
+            await client.close()
+            await self.service.close()
+
+        asyncio.run(run())
+
+    def test_malformed_requests(self):
+        async def run():
+            host, port = (await self.service.start())[:2]
+            client = await ProofClient.connect(host, port)
+            for request in [{'method': 'inclusion_proof', 'erc20': hex(ERC20), 'positions': 5},
+                            {'method': 'siblings', 'erc20': hex(ERC20), 'positions': ['1']},
+                            {'method': 'state', 'erc20': ERC20},
+                            [1, 2]]:
+                with self.assertRaises(AssertionError):
+                    await client.call(request)
+            # The connection is still served
+            self.assertEqual((await client.state(ERC20))['width'], 6)
+            await client.close()
+            await self.service.close()
+
+        asyncio.run(run())
+
+    def test_cache_misses_do_not_block(self):
+        started = threading.Event()
+        release = threading.Event()
+        encode = service.encode_inclusion_proof
+
+        def slow_encode(snapshot, position):
+            started.set()
+            release.wait(10)
+            return encode(snapshot, position)
+
+        async def run():
+            host, port = (await self.service.start())[:2]
+            clients = [await ProofClient.connect(host, port) for _ in range(2)]
+            batch = asyncio.ensure_future(clients[0].inclusion_proofs(ERC20, [1, 2, 3]))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 10)
+            # Another client is served while the batch is being encoded
+            self.assertEqual((await clients[1].state(ERC20))['width'], 6)
+            self.assertFalse(batch.done())
+            release.set()
+            self.assertEqual([proof['position'] for proof in await batch], [1, 2, 3])
+            for client in clients:
+                await client.close()
+            await self.service.close()
+
+        with mock.patch.object(service, 'encode_inclusion_proof', slow_encode):
+            asyncio.run(run())
+
+    def test_zk_job(self):
+        async def run():
+            with tempfile.TemporaryDirectory() as directory:
+                path = await self.service.start_unix(os.path.join(directory, 'proof.sock'))
+                client = await ProofClient.connect_unix(path)
+                job_id = await client.zk_inclusion_proof(ERC20, 3, Field(3), Field(13))
+                while True:
+                    job = await client.job(job_id)
+                    if job['status'] != 'pending':
+                        break
+                    await asyncio.sleep(0.01)
+                self.assertEqual(job, {'status': 'done', 'proof': {'inputs': ['0x03']}})
+                with self.assertRaises(AssertionError):
+                    await client.job(job_id)
+                await client.close()
+                await self.service.close()
+
+        with mock.patch.object(PedersenMMR, 'zk_inclusion_proof', return_value={'inputs': ['0x03']}) as prove:
+            asyncio.run(run())
+        self.assertEqual(prove.call_args[0][1], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
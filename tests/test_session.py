@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from py934.mimblewimble import Field, Output, Transaction, TxSend, TxReceive, Request
+from py934.session import SessionServer, SessionClient, SessionStore, read_frame, MAX_FRAME_SIZE, STATUS_ERROR
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSessionStore(unittest.TestCase):
+    def test_ttl(self):
+        clock = FakeClock()
+        store = SessionStore(ttl=10, clock=clock)
+        first = store.open('tx1')
+        clock.now = 5
+        second = store.open('tx2')
+        self.assertEqual(store.get(first), 'tx1')
+        clock.now = 10
+        self.assertIsNone(store.get(first))
+        self.assertEqual(store.get(second), 'tx2')
+        self.assertEqual(store.close(second), 'tx2')
+        self.assertEqual(len(store), 0)
+
+
+class TestSessionServer(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(DATASET_PATH, 'tx1.json')) as f:
+            data = json.load(f)
+        self.transaction = Transaction.from_dict(data)
+        self.range_proofs = data['range_proofs']
+        self.output_txo = Output.new(Field(300))
+        self.output_txo._range_proof = self.range_proofs[0]
+
+    def tx_send(self):
+        change_txo = Output.new(Field(690))
+        change_txo._range_proof = self.range_proofs[1]
+        return TxSend.builder(). \
+            value(300). \
+            fee(10). \
+            input_txo(Output.new(Field(1000))). \
+            change_txo(change_txo). \
+            metadata(1, 100). \
+            sig_salt(Field.random()). \
+            build()
+
+    def receiver(self, request):
+        return TxReceive.builder(). \
+            request(request). \
+            output_txo(self.output_txo). \
+            sig_salt(Field.random()). \
+            build()
+
+    async def exchange(self, server, client):
+        tx_send = self.tx_send()
+        session_id, serialized_request = server.open(tx_send)
+        # Recipient gets the request through the relay and replies with the response
+        response = await client.request(session_id, Request.deserialize(serialized_request))
+        self.assertEqual(response.hh_output, self.output_txo.hh)
+        transaction = await client.respond(session_id, response)
+        self.assertEqual(transaction.to_dict(), self.transaction.to_dict())
+        self.assertEqual(tx_send.stage, TxSend.PROVEN)
+        self.assertIsNone(server.sessions.get(session_id))
+        with self.assertRaises(AssertionError):
+            await client.respond(session_id, response)
+
+    def test_tcp(self):
+        async def run():
+            server = SessionServer(self.receiver)
+            host, port = (await server.start())[:2]
+            client = await SessionClient.connect(host, port)
+            await self.exchange(server, client)
+            await client.close()
+            await server.close()
+
+        with mock.patch.object(Transaction, 'new', return_value=self.transaction):
+            asyncio.run(run())
+
+    def test_unix_socket(self):
+        async def run():
+            with tempfile.TemporaryDirectory() as directory:
+                server = SessionServer(self.receiver)
+                path = await server.start_unix(os.path.join(directory, 'session.sock'))
+                clients = [await SessionClient.connect_unix(path) for _ in range(2)]
+                await asyncio.gather(*[self.exchange(server, client) for client in clients])
+                self.assertEqual(len(server.sessions), 0)
+                for client in clients:
+                    await client.close()
+                await server.close()
+
+        with mock.patch.object(Transaction, 'new', return_value=self.transaction):
+            asyncio.run(run())
+
+    def test_concurrent_responses(self):
+        async def run():
+            server = SessionServer(self.receiver)
+            host, port = (await server.start())[:2]
+            clients = [await SessionClient.connect(host, port) for _ in range(2)]
+            session_id, serialized_request = server.open(self.tx_send())
+            response = await clients[0].request(session_id, Request.deserialize(serialized_request))
+            # Only one of the responses merges the TxSend
+            results = await asyncio.gather(*[client.respond(session_id, response) for client in clients],
+                                           return_exceptions=True)
+            self.assertEqual(sorted(type(result).__name__ for result in results), ['AssertionError', 'Transaction'])
+            for client in clients:
+                await client.close()
+            await server.close()
+
+        with mock.patch.object(Transaction, 'new', return_value=self.transaction):
+            asyncio.run(run())
+
+    def test_errors(self):
+        def failing_receiver(request):
+            raise RuntimeError("receiver failed")
+
+        async def run():
+            server = SessionServer(failing_receiver)
+            host, port = (await server.start())[:2]
+            client = await SessionClient.connect(host, port)
+            session_id, serialized_request = server.open(self.tx_send())
+            with self.assertRaises(AssertionError):
+                await client.request(session_id, Request.deserialize(serialized_request))
+            # The connection is still open
+            with self.assertRaises(AssertionError):
+                await client.call(session_id, b'\x00')
+            client.writer.write((MAX_FRAME_SIZE + 1).to_bytes(4, 'little') + session_id)
+            await client.writer.drain()
+            replied_id, reply = await read_frame(client.reader)
+            self.assertEqual((replied_id, reply[0]), (session_id, STATUS_ERROR))
+            await client.close()
+            await server.close()
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
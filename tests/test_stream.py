@@ -0,0 +1,70 @@
+import glob
+import json
+import os
+import tempfile
+import unittest
+
+from py934.constant import G, H
+from py934.mimblewimble import Field, Transaction
+from py934.mmr import PedersenMMR
+from py934.stream import RecordWriter, MMRDelta, read_records, read_transactions, RECORD_TRANSACTION, \
+    RECORD_ROLL_UP, RECORD_MMR_DELTA
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+
+
+class TestRecordLog(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'records.log')
+        self.transactions = []
+        for path in sorted(glob.glob(os.path.join(DATASET_PATH, 'tx*.json')))[:8]:
+            with open(path) as f:
+                self.transactions.append(json.load(f))
+        with open(os.path.join(DATASET_PATH, 'rollUp1.json')) as f:
+            self.roll_up = json.load(f)
+        mmr = PedersenMMR()
+        items = [Field(1) * G + Field(11) * H, Field(2) * G + Field(12) * H]
+        root, width = mmr.root, mmr.width
+        for item in items:
+            mmr.append(item)
+        self.delta = MMRDelta(root, width, items, mmr.root)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_round_trip(self):
+        with RecordWriter(self.path) as writer:
+            for data in self.transactions:
+                writer.append_transaction(Transaction.from_dict(data))
+            writer.append_roll_up(self.roll_up)
+            writer.append_mmr_delta(self.delta)
+        records = list(read_records(self.path))
+        self.assertEqual([kind for kind, _ in records],
+                         [RECORD_TRANSACTION] * len(self.transactions) + [RECORD_ROLL_UP, RECORD_MMR_DELTA])
+        self.assertEqual([tx.to_dict() for _, tx in records[:-2]], self.transactions)
+        self.assertEqual(records[-2][1], self.roll_up)
+        delta = records[-1][1]
+        self.assertEqual((delta.root, delta.width, delta.items, delta.new_root),
+                         (self.delta.root, self.delta.width, self.delta.items, self.delta.new_root))
+
+    def test_append_and_filter(self):
+        with RecordWriter(self.path) as writer:
+            writer.append_transaction(Transaction.from_dict(self.transactions[0]))
+            writer.append_roll_up(self.roll_up)
+        with RecordWriter(self.path) as writer:
+            writer.append_transaction(Transaction.from_dict(self.transactions[1]))
+        self.assertEqual([tx.to_dict() for tx in read_transactions(self.path)], self.transactions[:2])
+        self.assertEqual([kind for kind, _ in read_records(self.path, kinds=(RECORD_ROLL_UP,))], [RECORD_ROLL_UP])
+
+    def test_truncated(self):
+        with RecordWriter(self.path) as writer:
+            writer.append_roll_up(self.roll_up)
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        with self.assertRaises(AssertionError):
+            list(read_records(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from py934.tags import BloomFilter, SpentTagStore, UNSPENT, SPENDING, SPENT, TAG_RECORD_SIZE, \
+    TAG_TABLE_HEADER_SIZE
+
+ERC20_A = 0xACa6BFcc686ED93b5aa5820d5A7B7B82513c106c
+ERC20_B = 0x1234
+
+
+class TestBloomFilter(unittest.TestCase):
+    def test_false_positives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        tags = [random.getrandbits(254) for _ in range(1000)]
+        for tag in tags:
+            bloom.add(tag)
+        self.assertTrue(all(tag in bloom for tag in tags))
+        false_positives = sum(random.getrandbits(254) in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestSpentTagStore(unittest.TestCase):
+    def test_transitions(self):
+        store = SpentTagStore(capacity=100)
+        store.mark_spending(ERC20_A, [11, 12])
+        store.mark_spent(ERC20_A, [12, 13])
+        # A tag never goes back to Spending
+        store.mark_spending(ERC20_A, [13])
+        self.assertEqual(store.states(ERC20_A, [11, 12, 13, 14]), [SPENDING, SPENT, SPENT, UNSPENT])
+        self.assertEqual(store.is_spent(ERC20_B, [11, 12]), [False, False])
+        self.assertTrue(store.any_spent(ERC20_A, [14, 11]))
+        self.assertFalse(store.any_spent(ERC20_A, [14, 15]))
+        self.assertEqual(len(store), 3)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tags')
+            with SpentTagStore(path, capacity=100, slots=16) as store:
+                store.mark_spending(ERC20_A, [11, 12])
+                store.mark_spent(ERC20_A, [12])
+                store.mark_spent(ERC20_B, [11])
+                store.mark_spent(ERC20_B, [11])
+            self.assertEqual(os.path.getsize(path), TAG_TABLE_HEADER_SIZE + 16 * TAG_RECORD_SIZE)
+            # A slot cut by a crash before its state byte stays empty
+            with open(path, 'r+b') as f:
+                data = f.read()
+                empty = next(offset for offset in range(TAG_TABLE_HEADER_SIZE, len(data), TAG_RECORD_SIZE)
+                             if data[offset + TAG_RECORD_SIZE - 1] == UNSPENT)
+                f.seek(empty)
+                f.write(ERC20_A.to_bytes(20, 'big') + (13).to_bytes(32, 'little'))
+            with SpentTagStore(path, capacity=100) as store:
+                self.assertEqual(len(store), 3)
+                self.assertEqual(store.states(ERC20_A, [11, 12, 13]), [SPENDING, SPENT, UNSPENT])
+                self.assertEqual(store.states(ERC20_B, [11, 12]), [SPENT, UNSPENT])
+                store.mark_spent(ERC20_A, [11, 13])
+            with SpentTagStore(path, capacity=100) as store:
+                self.assertEqual(store.states(ERC20_A, [11, 13]), [SPENT, SPENT])
+
+    def test_growth(self):
+        tags = [random.getrandbits(254) for _ in range(100)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tags')
+            with SpentTagStore(path, capacity=100, slots=4) as store:
+                store.mark_spending(ERC20_A, tags)
+                store.mark_spent(ERC20_A, tags[::2])
+                self.assertEqual(store.slots, 256)
+            self.assertEqual(os.listdir(directory), ['tags'])
+            with SpentTagStore(path, capacity=100) as store:
+                self.assertEqual(len(store), 100)
+                self.assertEqual(store.states(ERC20_A, tags), [SPENT, SPENDING] * 50)
+
+    def test_bloom_front(self):
+        store = SpentTagStore(capacity=100, error_rate=1e-9)
+        store.mark_spent(ERC20_A, [11])
+        # Unspent tags are answered without reading the table
+        with mock.patch.object(store, '_find', side_effect=AssertionError):
+            self.assertEqual(store.states(ERC20_A, range(100, 200)), [UNSPENT] * 100)
+            self.assertFalse(store.any_spent(ERC20_B, [11]))
+        self.assertEqual(store.state(ERC20_A, 11), SPENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import timeit
+import unittest
+
+from ethsnarks.field import FQ
+
+from py934.codec import encode_scalar
+from py934.constant import G
+from py934.mimblewimble import Output, Field
+from py934.wallet import Wallet
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'dataset', 'ethereum934')
+
+
+def fake_output(value, tag):
+    # Skips the point arithmetics
+    return Output._from_trusted(Field(tag), Field(value), G, tag=FQ(tag))
+
+
+class TestWallet(unittest.TestCase):
+    def setUp(self):
+        self.wallet = Wallet()
+        for tag, value in enumerate([50, 10, 30, 20, 40], 2):
+            self.wallet.add(fake_output(value, tag), position=tag)
+
+    def values(self, entries):
+        return None if entries is None else [entry.value for entry in entries]
+
+    def test_select(self):
+        self.assertEqual(self.values(self.wallet.select(25, 3)), [30])
+        self.assertEqual(self.values(self.wallet.select(40, 10)), [50])
+        self.assertEqual(self.values(self.wallet.select(60, 5)), [50, 20])
+        self.assertEqual(self.values(self.wallet.select(89, 1)), [50, 40])
+        self.assertIsNone(self.wallet.select(90, 1))
+        self.assertEqual(self.wallet.balance, 150)
+
+    def test_spend(self):
+        self.assertEqual(self.values(self.wallet.spend([FQ(2), FQ(99)])), [50])
+        self.assertNotIn(2, self.wallet)
+        self.assertEqual(self.values(self.wallet.select(45, 5)), [40, 10])
+        self.assertIsNone(self.wallet.select(70, 1))
+        self.assertEqual(self.wallet.balance, 100)
+        self.assertEqual([entry.value for entry in self.wallet], [10, 20, 30, 40])
+
+    def test_persistence(self):
+        with open(os.path.join(DATASET_PATH, 'tx3.json')) as f:
+            inclusion_proof = json.load(f)['inclusion_proofs'][0]
+        wallet = Wallet()
+        outputs = Output.new_batch([7, 3, 5])
+        wallet.add(outputs[0], position=6)
+        wallet.add(outputs[2], position=8)
+        tag = outputs[1].tag
+        inclusion_proof['inputs'][1] = format(tag.n, '#066x')
+        wallet.add(outputs[1])
+        wallet.update(tag, position=7, inclusion_proof=inclusion_proof)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'wallet.bin')
+            wallet.save(path)
+            wallet.save(path)
+            self.assertEqual(os.listdir(directory), ['wallet.bin'])
+            loaded = Wallet.load(path)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(loaded.balance, wallet.balance)
+        entry = loaded.get(tag)
+        self.assertEqual((entry.position, entry.inclusion_proof), (7, inclusion_proof))
+        self.assertEqual((entry.output.r, entry.output.v, entry.output.hh), (outputs[1].r, outputs[1].v, outputs[1].hh))
+        self.assertEqual(entry.output.tag, tag)
+        self.assertEqual(loaded.to_bytes(), wallet.to_bytes())
+
+    def test_tampered_file(self):
+        wallet = Wallet()
+        output = Output.new_batch([7])[0]
+        wallet.add(output, position=1)
+        data = bytearray(wallet.to_bytes())
+        # The value of the only entry, right after r
+        offset = data.index(encode_scalar(output.r)) + 32
+        data[offset:offset + 32] = encode_scalar(Field(700))
+        with self.assertRaises(AssertionError):
+            Wallet.from_bytes(bytes(data))
+        # A fake output whose commitment does not match its opening
+        wallet.add(fake_output(7, 2))
+        with self.assertRaises(AssertionError):
+            Wallet.from_bytes(wallet.to_bytes())
+
+    def test_selection_speed(self):
+        wallet = Wallet()
+        for i in range(20000):
+            wallet.add(fake_output(i * 7 % 10007 + 1, i + 2))
+        self.assertEqual(self.values(wallet.select(10006, 1)), [10007])
+        self.assertEqual(self.values(wallet.select(15000, 10)), [10007, 5003])
+        self.assertLess(timeit.timeit(lambda: wallet.select(15000, 10), number=1000), 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
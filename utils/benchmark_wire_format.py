@@ -0,0 +1,50 @@
+"""
+Round trip benchmark of the binary wire format. Run it from the project root:
+
+    PYTHONPATH=. python utils/benchmark_wire_format.py
+"""
+import glob
+import json
+import os
+import timeit
+
+from py934.constant import G
+from py934.mimblewimble import Transaction, Request, Response, Field
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'tests', 'dataset', 'ethereum934')
+
+
+def report(name, number, encode, decode, size, legacy_size):
+    print("{:<12} {:>6} bytes (legacy {:>6}) encode {:>8.1f} us decode {:>8.1f} us".format(
+        name, size, legacy_size, timeit.timeit(encode, number=number) / number * 1e6,
+        timeit.timeit(decode, number=number) / number * 1e6))
+
+
+if __name__ == "__main__":
+    number = 1000
+    dataset = []
+    for path in sorted(glob.glob(os.path.join(DATASET_PATH, 'tx*.json'))):
+        with open(path) as f:
+            dataset.append(json.load(f))
+    data = dataset[0]
+    tx = Transaction.from_dict(data)
+    request = Request(Field(30), tx.kernel.fee, Field(3) * G, Field(4) * G, tx.kernel.metadata)
+    response = Response(tx.body.hh_outputs[0], Field(5) * G, tx.kernel.signature, data['range_proofs'][0])
+
+    serialized = request.serialize()
+    report('Request', number, request.serialize, lambda: Request.deserialize(serialized), len(serialized),
+           len(serialized) - 2)
+    serialized = response.serialize()
+    report('Response', number, response.serialize, lambda: Response.deserialize(serialized).range_proof,
+           len(serialized), len(json.dumps(response.range_proof)) + 128)
+    responses = [response] * 64
+    serialized = Response.serialize_batch(responses)
+    report('Response*64', number // 10, lambda: Response.serialize_batch(responses),
+           lambda: Response.deserialize_batch(serialized), len(serialized),
+           64 * (len(json.dumps(response.range_proof)) + 128))
+    serialized = tx.to_bytes()
+    report('Transaction', number, tx.to_bytes, lambda: Transaction.from_bytes(serialized), len(serialized),
+           len(json.dumps(data)))
+    serialized = json.dumps(data)
+    report('Tx (json)', number, lambda: json.dumps(tx.to_dict()),
+           lambda: Transaction.from_dict(json.loads(serialized)), len(serialized), len(serialized))